@@ -17,6 +17,7 @@ from .serializers import (
     AIAssistantTaskSerializer,
 )
 from workspace.models import Office, Membership, Room, OfficeCity, cityLobby
+from communications.providers import get_http_session
 
 User = get_user_model()
 
@@ -135,9 +136,13 @@ class VerifyPaymentView(APIView):
 
         # Verify with Paystack API
         headers = {"Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}"}
-        url = f"https://api.paystack.co/transaction/verify/{reference}"
-        r = requests.get(url, headers=headers)
-        res_data = r.json()
+        base_url = getattr(settings, "PAYSTACK_API_BASE_URL", "https://api.paystack.co").rstrip("/")
+        url = f"{base_url}/transaction/verify/{reference}"
+        try:
+            r = get_http_session().get(url, headers=headers, timeout=getattr(settings, "PROVIDER_HTTP_TIMEOUT", 10))
+            res_data = r.json()
+        except (requests.RequestException, ValueError):
+            return Response({"error": "Payment provider unavailable"}, status=status.HTTP_502_BAD_GATEWAY)
 
         if not res_data.get("status"):
             return Response({"error": "Verification failed"}, status=400)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aistaff', '0013_alter_saleslead_org'),
+        ('workspace', '0019_supportticket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntentRouterStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('channel', models.CharField(max_length=20)),
+                ('intent', models.CharField(max_length=30)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('router_ms', models.FloatField(default=0)),
+                ('llm_ms', models.FloatField(default=0)),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='intent_stats', to='workspace.office')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('office', 'date', 'channel', 'intent'), name='uniq_intent_router_stat')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aistaff', '0014_intent_router_stat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meeting',
+            name='recurrence',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='meeting',
+            name='recurrence_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='MeetingException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_start', models.DateTimeField()),
+                ('start_time', models.DateTimeField(blank=True, null=True)),
+                ('end_time', models.DateTimeField(blank=True, null=True)),
+                ('series', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='aistaff.meeting')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('series', 'original_start'), name='meetingexception_unique')],
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
+from workspace.recurrence import series_until
 
 User = settings.AUTH_USER_MODEL
 
@@ -16,6 +17,28 @@ class ReceptionistLog(models.Model):
         return f"[{self.created_at}] {self.visitor or 'Unknown'}"
 
 
+class IntentRouterStat(models.Model):
+    """
+    Daily per-office counters for the local intent router. ``intent`` is the
+    intent answered locally, or "llm" for messages escalated to the model.
+    """
+    office = models.ForeignKey("workspace.Office", on_delete=models.CASCADE, related_name="intent_stats")
+    date = models.DateField()
+    channel = models.CharField(max_length=20)  # sms, email, receptionist
+    intent = models.CharField(max_length=30)
+    count = models.PositiveIntegerField(default=0)
+    router_ms = models.FloatField(default=0)  # total time spent in the router
+    llm_ms = models.FloatField(default=0)  # total model time ("llm" rows only)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["office", "date", "channel", "intent"], name="uniq_intent_router_stat"),
+        ]
+
+    def __str__(self):
+        return f"{self.office_id} {self.date} {self.channel}/{self.intent}: {self.count}"
+
+
 #---- AI SECRETARY----
 
 class Task(models.Model):
@@ -33,6 +56,23 @@ class Meeting(models.Model):
     participants = models.JSONField(default=list)  # list of emails
     created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     created_at = models.DateTimeField(auto_now_add=True)
+    # RRULE, expanded lazily (see workspace.recurrence); start/end_time are the first occurrence.
+    recurrence = models.CharField(max_length=255, blank=True, default="")
+    recurrence_until = models.DateTimeField(null=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        self.recurrence_until = series_until(self.recurrence, self.start_time, self.end_time)
+        super().save(*args, **kwargs)
+
+class MeetingException(models.Model):
+    """One occurrence of a recurring meeting cancelled (no times) or moved."""
+    series = models.ForeignKey(Meeting, on_delete=models.CASCADE, related_name="exceptions")
+    original_start = models.DateTimeField()
+    start_time = models.DateTimeField(null=True, blank=True)
+    end_time = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["series", "original_start"], name="meetingexception_unique")]
 
 class Note(models.Model):
     content = models.TextField()
@@ -2,23 +2,28 @@ from openai import OpenAI
 from django.conf import settings
 import json
 from workspace.models import RoomBooking, Room, SupportTicket
+from workspace import booking as booking_engine
 from django.utils.dateparse import parse_datetime
 from django.utils.timezone import now
 from aistaff.services.pay_per_success import pay_per_success
 from django.utils import timezone
-from django.core.mail import send_mail
+from communications.notifications import notify_staff, office_staff
+import time
+from datetime import timedelta
+from aistaff.services.intent_router import LLM, get_intent_router, record_route
 
 client = "OpenAI(api_key=settings.OPENAI_API_KEY)"
 
 
 class AIReceptionist:
-    def __init__(self, org, city, staff_user=None, faqs=None, bookings=None, session=None):
+    def __init__(self, org, city, staff_user=None, faqs=None, bookings=None, session=None, office=None):
         self.org = org
         self.city = city
         self.staff = staff_user
         self.faqs = faqs or {}
         self.bookings = bookings or {}
         self.session = session or {}
+        self.office = office  # enables local intent answers and per-office stats
 
     # ---------------- CONTEXT ----------------
     def build_context(self):
@@ -44,7 +49,8 @@ class AIReceptionist:
         {remembered}
 
         JSON-only actions:
-        - Book a room → "action": "book_room"
+        - Book a room → "action": "book_room" (add an RRULE "recurrence", e.g. "FREQ=WEEKLY;COUNT=4", for repeats)
+        - Check free rooms/times → "action": "check_availability" (with "start_time", "end_time", optional "duration_minutes")
         - Recall bookings → "action": "recall_bookings"
         - Cancel booking → "action": "cancel_booking"
         - Reschedule booking → "action": "reschedule_booking"
@@ -59,7 +65,15 @@ class AIReceptionist:
         if self.session.get("pending_action"):
             return self.handle_followup(message)
 
+        # Stock questions (hours, directions, ...) are answered from office data
+        route = get_intent_router().route(message, office=self.office, channel="receptionist")
+        office_id = getattr(self.office, "id", None)
+        if route.action == "reply":
+            record_route(office_id, "receptionist", route.intent, route.elapsed_ms)
+            return route.reply
+
         context = self.build_context()
+        started = time.perf_counter()
         resp = client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
@@ -69,6 +83,7 @@ class AIReceptionist:
             max_tokens=500,
         )
         reply = resp.choices[0].message.content.strip()
+        record_route(office_id, "receptionist", LLM, route.elapsed_ms, (time.perf_counter() - started) * 1000)
 
         # Detect JSON actions
         if reply.startswith("{") and "action" in reply:
@@ -83,6 +98,9 @@ class AIReceptionist:
                         self.session["visitor_email"] = data["visitor_email"]
                     return self.handle_booking(data)
 
+                elif action == "check_availability":
+                    return self.check_availability(data)
+
                 elif action == "recall_bookings":
                     return self.recall_bookings()
 
@@ -135,12 +153,51 @@ class AIReceptionist:
             if email:
                 self.session["visitor_email"] = email[0]
 
+    # ---------------- BOOKINGS ----------------
+    def _alternatives(self, start_time, end_time):
+        """Sentence listing free alternatives to a taken slot, or "" when none fit."""
+        if self.office is None:
+            return ""
+        try:
+            options = booking_engine.suggest(self.office, start_time, end_time)
+        except booking_engine.BookingError:
+            return ""
+        if not options:
+            return ""
+        return " Free instead: " + ", ".join(
+            f"{room['name']} at {start.strftime('%Y-%m-%d %H:%M')}" for room, start, _ in options
+        ) + "."
+
+    def check_availability(self, data):
+        if self.office is None:
+            return "ℹ️ Please open an office page first so I know where to look."
+        start_time = parse_datetime(data.get("start_time") or "")
+        end_time = parse_datetime(data.get("end_time") or "")
+        try:
+            minutes = int(data.get("duration_minutes") or 0)
+            rooms = booking_engine.free_slots(
+                self.office, start_time, end_time, duration=timedelta(minutes=minutes),
+            )
+        except (TypeError, ValueError, booking_engine.BookingError) as exc:
+            return f"⚠️ {exc}"
+        lines = [
+            f"- {entry['room']['name']}: " + ", ".join(
+                f"{start.strftime('%H:%M')}–{end.strftime('%H:%M')}" for start, end in entry["slots"]
+            )
+            for entry in rooms if entry["slots"]
+        ]
+        if not lines:
+            return "❌ Sorry, no room is free in that period."
+        return {"status": "success", "message": "🗓️ Free rooms:\n" + "\n".join(lines), "rooms": len(lines)}
+
     # ---------------- BOOKINGS ----------------
     @pay_per_success(task_type="book_room")
     def handle_booking(self, data):
-        try:
-            room = Room.objects.get(name=data["room"])
-        except Room.DoesNotExist:
+        rooms = Room.objects.filter(name=data["room"])
+        if self.office is not None:
+            rooms = rooms.filter(office=self.office)
+        room = rooms.first()
+        if room is None:
             return f"❌ Sorry, I couldn’t find the room '{data['room']}'."
 
         start_time = parse_datetime(data["start_time"])
@@ -151,22 +208,20 @@ class AIReceptionist:
         if start_time < now():
             return "⚠️ You cannot book a room in the past."
 
-        conflict = RoomBooking.objects.filter(
-            room=room,
-            start_time__lt=end_time,
-            end_time__gt=start_time
-        ).exists()
-        if conflict:
-            return f"❌ Sorry, {room.name} is already booked at that time."
-
-        booking = RoomBooking.objects.create(
-            room=room,
-            visitor_name=data.get("visitor_name", self.session.get("visitor_name", "Guest")),
-            visitor_email=data.get("visitor_email", self.session.get("visitor_email", "unknown@example.com")),
-            start_time=start_time,
-            end_time=end_time,
-            confirmed=True,
-        )
+        try:
+            booking = booking_engine.book(
+                room,
+                start_time,
+                end_time,
+                recurrence=data.get("recurrence") or "",
+                visitor_name=data.get("visitor_name", self.session.get("visitor_name", "Guest")),
+                visitor_email=data.get("visitor_email", self.session.get("visitor_email", "unknown@example.com")),
+                confirmed=True,
+            )
+        except booking_engine.BookingConflict:
+            return f"❌ Sorry, {room.name} is already booked at that time." + self._alternatives(start_time, end_time)
+        except booking_engine.BookingError as exc:
+            return f"⚠️ {exc}"
         return{"status": "success", "message": f"✅ Booking confirmed: {booking.room.name} on {start_time.strftime('%Y-%m-%d %H:%M')}.", "booking_id": booking.id}
     
     # -------------------------------------------------
@@ -185,7 +240,7 @@ class AIReceptionist:
 
         # Find existing booking
         try:
-            booking = RoomBooking.objects.get(visitor_email=visitor_email, start_time=old_start)
+            booking = RoomBooking.objects.select_related("room").get(visitor_email=visitor_email, start_time=old_start)
         except RoomBooking.DoesNotExist:
             return {"status": "failed", "error": "No booking found for that time."}
 
@@ -197,19 +252,15 @@ class AIReceptionist:
         if new_start < now():
             return {"status": "failed", "error": "You cannot reschedule to a past time."}
 
-        # Check conflicts
-        conflict = RoomBooking.objects.filter(
-            room=booking.room,
-            start_time__lt=new_end,
-            end_time__gt=new_start
-        ).exclude(id=booking.id).exists()
-        if conflict:
-            return {"status": "failed", "error": f"{booking.room.name} is already booked at that time."}
-
-        # Update booking
-        booking.start_time = new_start
-        booking.end_time = new_end
-        booking.save(update_fields=["start_time", "end_time"])
+        try:
+            booking_engine.reschedule(booking, new_start, new_end)
+        except booking_engine.BookingConflict:
+            return {
+                "status": "failed",
+                "error": f"{booking.room.name} is already booked at that time." + self._alternatives(new_start, new_end),
+            }
+        except booking_engine.BookingError as exc:
+            return {"status": "failed", "error": str(exc)}
 
         return {
             "status": "success",
@@ -277,13 +328,16 @@ class AIReceptionist:
             status="open",
         )
 
-        # Optionally notify staff (e.g., via email or Slack)
-        send_mail(
-             subject=f"[AI Escalation] New ticket from {visitor_name}",
-             message=ticket.message,
-             from_email="noreply@yourapp.com",
-             recipient_list=["support@yourcompany.com"],
-         )
+        # Staff are notified after commit by a worker; the visitor's reply
+        # never waits on SMTP.
+        notify_staff(
+            list(office_staff(self.office)) or [user],
+            "ticket_created",
+            f"[AI Escalation] New ticket from {visitor_name}",
+            ticket.message,
+            office=self.office,
+            data={"ticket_id": ticket.id},
+        )
 
         return {
             "status": "success",
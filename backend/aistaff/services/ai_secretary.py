@@ -1,16 +1,27 @@
 import json
 from django.conf import settings
 from django.utils.dateparse import parse_datetime
-from datetime import datetime
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from workspace.recurrence import expand, load_exceptions, occurs_at, series_until, window_q
 from openai import OpenAI
 import requests
-from aistaff.models import Task, Meeting, Note, Resource, FileRecord, EmailDraft, AssistantLog, AssistantActionType, AssistantActionSubtype
+from aistaff.models import Task, Meeting, MeetingException, Note, Resource, FileRecord, EmailDraft, AssistantLog, AssistantActionType, AssistantActionSubtype
 from aistaff.services.pay_per_success import pay_per_success
+from aistaff.services.llm import get_llm_backend
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
 client = "OpenAI(api_key=settings.OPENAI_API_KEY)"
+
+MEETING_DEFAULT_LENGTH = timedelta(minutes=30)  # for meetings without an end time
+
+
+def _aware(value):
+    if value is not None and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
  
 #def safe_json(obj):
 #    def default(o):
@@ -34,9 +45,53 @@ class AIOfficeAssistant:
             "You may return plain text replies or a JSON action. When returning a JSON action the top-level "
             "object must contain an 'action' field. Supported actions: create_task, list_tasks, schedule_meeting, get_agenda, "
             "draft_email, file_search, resource_check, note_taking, recall_notes, cancel_task, cancel_meeting, reschedule_meeting.\n"
-            "When providing dates use ISO 8601 (YYYY-MM-DDTHH:MM:SS)."
+            "When providing dates use ISO 8601 (YYYY-MM-DDTHH:MM:SS).\n"
+            "For a recurring meeting add an RFC 5545 'recurrence' rule (e.g. FREQ=WEEKLY;BYDAY=MO). To cancel or move a "
+            "single occurrence pass its original start as 'occurrence_start'."
         )
     
+    def build_classifier_context(self):
+        return (
+            f"You are an office assistant for {self.org.get('name','the organization')}.\n"
+            "You triage inbound SMS and email. The user message is JSON: {\"messages\": [{\"id\", \"channel\", \"text\"}]}.\n"
+            "Answer with JSON {\"results\": [{\"id\", \"action\", \"text\"}]}, one result per message id. "
+            "action is 'reply' (text is the reply to send on the same channel) or 'ignore' (spam, "
+            "auto-responders, nothing to answer). Keep replies short and polite."
+        )
+
+    def classify_batch(self, messages: list):
+        """
+        Classify many inbound messages with a single model call.
+
+        ``messages`` is a list of {"id", "channel", "text"}; returns
+        {id: {"action", "text"}}. Ids the model skipped are absent, and all
+        are when AI replies are disabled.
+        """
+        if not messages:
+            return {}
+        backend = get_llm_backend()
+        if backend is None:
+            return {}
+        ids = {m["id"] for m in messages}
+        try:
+            data = backend.complete_json(
+                self.build_classifier_context(),
+                json.dumps({"messages": messages}),
+            )
+        except Exception as e:
+            return {i: {"action": "error", "text": "", "error": str(e)} for i in ids}
+
+        results = data.get("results") if isinstance(data, dict) else data
+        decisions = {}
+        for item in results or []:
+            if isinstance(item, dict) and item.get("id") in ids:
+                decisions[item["id"]] = {"action": item.get("action"), "text": item.get("text") or ""}
+        return decisions
+
+    def classify_or_reply(self, message: str):
+        """Single-message classify_batch."""
+        return self.classify_batch([{"id": 0, "channel": "", "text": message}]).get(0, {})
+
     def respond(self, message: str):
         system = self.build_context()
         reply, parsed = None, {}
@@ -204,7 +259,18 @@ class AIOfficeAssistant:
         #start = parse_datetime(data.get("start_time") or data.get("start_time"))
         end_time = parse_datetime(data.get("end_time")) if data.get("end_time") else None
         participants = data.get("participants") or data.get("emails") or "abav@mail"
-        meeting = Meeting.objects.create(topic=topic, start_time=start_time, end_time=end_time, participants=participants, created_by=self.staff)
+        rule = data.get("recurrence") or ""
+        if rule:
+            # Recurring meetings need a real, timezone-aware first occurrence.
+            start_time = _aware(parse_datetime(start_time) if isinstance(start_time, str) else start_time)
+            try:
+                series_until(rule, start_time, end_time)
+            except (TypeError, ValueError) as exc:
+                return {"text": f"Invalid recurrence: {exc}"}
+        meeting = Meeting.objects.create(
+            topic=topic, start_time=start_time, end_time=end_time, participants=participants,
+            created_by=self.staff, recurrence=rule,
+        )
         self._add_to_history({"type": "meeting", "id": meeting.id})
         result = {"status": "success", "meeting": meeting,}
         
@@ -214,8 +280,25 @@ class AIOfficeAssistant:
     @pay_per_success(task_type="get_agenda")
     def action_get_agenda(self, data):
         date = parse_datetime(data.get("date")) if data.get("date") else datetime.now()
-        meetings = Meeting.objects.filter(start_time__date=date.date(), created_by=self.staff)
-        out = [{"id": m.id, "topic": m.topic, "start": m.start_time.isoformat()} for m in meetings]
+        day_start = _aware(datetime.combine(date.date(), time.min))
+        day_end = day_start + timedelta(days=1)
+        # One row per series; occurrences are generated for this day only.
+        rows = list(
+            Meeting.objects.filter(created_by=self.staff)
+            .filter(window_q(day_start, day_end, default_length=MEETING_DEFAULT_LENGTH))
+            .only("id", "topic", "start_time", "end_time", "recurrence")
+        )
+        exceptions = load_exceptions(MeetingException, [m.pk for m in rows if m.recurrence], day_start, day_end)
+        occurrences = sorted(
+            expand(rows, day_start, day_end, exceptions, default_length=MEETING_DEFAULT_LENGTH),
+            key=lambda o: (o.start, o.series.pk),
+        )
+        out = []
+        for o in occurrences:
+            item = {"id": o.series.id, "topic": o.series.topic, "start": o.start.isoformat()}
+            if o.series.recurrence:
+                item["occurrence"] = o.original_start.isoformat()
+            out.append(item)
         return {"agenda": out}
     
     @pay_per_success(task_type="draft_email")
@@ -271,6 +354,14 @@ class AIOfficeAssistant:
         m = Meeting.objects.filter(id=mid).first()
         if not m:
             return {"text": "Meeting not found."}
+        occurrence = parse_datetime(data.get("occurrence_start") or "")
+        if m.recurrence and occurrence:
+            if not occurs_at(m, occurrence):
+                return {"text": "That meeting does not take place then."}
+            MeetingException.objects.update_or_create(
+                series=m, original_start=occurrence, defaults={"start_time": None, "end_time": None},
+            )
+            return {"text": f"Meeting '{m.topic}' on {occurrence.strftime('%Y-%m-%d %H:%M')} cancelled."}
         m.delete()
         return {"text": f"Meeting '{m.topic}' cancelled."}
 
@@ -280,6 +371,18 @@ class AIOfficeAssistant:
         m = Meeting.objects.filter(id=mid).first()
         if not m:
             return {"text": "Meeting not found."}
+        occurrence = parse_datetime(data.get("occurrence_start") or "")
+        if m.recurrence and occurrence:
+            # Move just this occurrence; the rest of the series stays put.
+            if not occurs_at(m, occurrence):
+                return {"text": "That meeting does not take place then."}
+            length = (m.end_time - m.start_time) if m.end_time else MEETING_DEFAULT_LENGTH
+            s = parse_datetime(data.get("start_time") or "") or occurrence
+            e = parse_datetime(data.get("end_time")) if data.get("end_time") else s + length
+            MeetingException.objects.update_or_create(
+                series=m, original_start=occurrence, defaults={"start_time": s, "end_time": e},
+            )
+            return {"text": f"Meeting '{m.topic}' on {occurrence.strftime('%Y-%m-%d %H:%M')} rescheduled."}
         s = parse_datetime(data.get("start_time")) or m.start_time
         e = parse_datetime(data.get("end_time")) if data.get("end_time") else m.end_time
         m.start_time = s
@@ -0,0 +1,315 @@
+"""
+Local intent router that runs before any LLM call.
+
+Stock requests (opening hours, directions, booking, cancellations,
+STOP/START and "talk to a human") are recognised with regex rules, backed
+by an optional naive Bayes classifier trained on a handful of examples.
+When the intent is clear and the office has the data to answer, the reply
+is built here; anything ambiguous is left to the LLM.
+"""
+import math
+import re
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+HOURS = "hours"
+DIRECTIONS = "directions"
+BOOKING = "booking"
+CANCEL = "cancel"
+STOP = "stop"
+START = "start"
+HUMAN = "human"
+LLM = "llm"  # stats bucket for messages escalated to the model
+
+# Carrier opt-out keywords only count when they are the whole message.
+KEYWORD_RULES = {
+    STOP: re.compile(r"^\s*(stop|stopall|unsubscribe|end|quit|opt[\s-]?out)\s*[.!]*\s*$", re.I),
+    START: re.compile(r"^\s*(start|unstop|subscribe|opt[\s-]?in)\s*[.!]*\s*$", re.I),
+}
+
+
+def opt_keyword(text):
+    """True for a carrier opt-out keyword (STOP), False for opt-in (START), else None."""
+    if KEYWORD_RULES[STOP].match(text or ""):
+        return True
+    if KEYWORD_RULES[START].match(text or ""):
+        return False
+    return None
+
+
+PATTERN_RULES = {
+    HOURS: re.compile(
+        r"\b(opening hours|business hours|office hours|what time do you (open|close)|when (are|do) you (open|close)"
+        r"|are you open|hours of operation|open (today|tomorrow|on (mon|tues|wednes|thurs|fri|satur|sun)day))\b",
+        re.I,
+    ),
+    DIRECTIONS: re.compile(
+        r"\b(where are you( located)?|where is (the|your) office|(your|the office|office) (address|location)"
+        r"|directions?( to)?|how (do|can) i (get|find)|(send|share) (me )?(the|your) location)\b",
+        re.I,
+    ),
+    CANCEL: re.compile(r"\bcancel\w*\b.*\b(booking|appointment|reservation|meeting|visit)\b", re.I),
+    BOOKING: re.compile(r"\b(book|reserve|schedule)\b.*\b(room|desk|appointment|meeting|visit|slot)\b", re.I),
+    HUMAN: re.compile(r"\b(speak|talk|chat) (to|with) (a )?(human|person|someone|staff|agent|representative)\b", re.I),
+}
+
+# Seed data for the optional classifier; "other" keeps it from forcing a label.
+TRAINING_EXAMPLES = [
+    (HOURS, "what are your hours"),
+    (HOURS, "are you open on saturday"),
+    (HOURS, "what time does the office open"),
+    (HOURS, "until what time are you open today"),
+    (HOURS, "opening times please"),
+    (DIRECTIONS, "where is your office"),
+    (DIRECTIONS, "how do i get to you"),
+    (DIRECTIONS, "what is the address"),
+    (DIRECTIONS, "send me the location"),
+    (DIRECTIONS, "which street are you on"),
+    (BOOKING, "i want to book a room"),
+    (BOOKING, "can i reserve a desk tomorrow"),
+    (BOOKING, "i would like an appointment"),
+    (BOOKING, "is there a free slot next week"),
+    (CANCEL, "please cancel my booking"),
+    (CANCEL, "i cannot make it to my appointment"),
+    (CANCEL, "cancel my reservation for friday"),
+    (HUMAN, "can i talk to a person"),
+    (HUMAN, "connect me to your staff"),
+    (HUMAN, "i need a real human"),
+    ("other", "can you send me the daily sales report"),
+    ("other", "thanks for the update"),
+    ("other", "i have a question about my invoice"),
+    ("other", "please call me back about the contract"),
+    ("other", "hello how are you"),
+    ("other", "the payment did not go through"),
+]
+
+TOKEN_RE = re.compile(r"[a-z']+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+class NaiveBayesIntentClassifier:
+    """Tiny multinomial naive Bayes with Laplace smoothing; no dependencies."""
+
+    def __init__(self, examples=TRAINING_EXAMPLES):
+        self.word_counts = defaultdict(Counter)
+        self.class_counts = Counter()
+        for label, text in examples:
+            self.class_counts[label] += 1
+            self.word_counts[label].update(tokenize(text))
+        self.vocabulary = {w for counts in self.word_counts.values() for w in counts}
+        self.totals = {label: sum(counts.values()) for label, counts in self.word_counts.items()}
+        self.n_examples = sum(self.class_counts.values())
+
+    def predict(self, text):
+        """Return (label, probability) of the most likely class."""
+        tokens = [t for t in tokenize(text) if t in self.vocabulary]
+        if not tokens:
+            return "other", 1.0
+        vocab = len(self.vocabulary)
+        scores = {}
+        for label, count in self.class_counts.items():
+            score = math.log(count / self.n_examples)
+            for token in tokens:
+                score += math.log((self.word_counts[label][token] + 1) / (self.totals[label] + vocab))
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1 / norm
+
+
+@dataclass
+class Route:
+    intent: str  # one of the intents above, or LLM
+    action: str  # "reply", "opt_out", "opt_in" or "llm"
+    reply: str = ""
+    confidence: float = 0.0
+    source: str = ""  # "keyword", "pattern" or "classifier"
+    elapsed_ms: float = 0.0
+
+    @property
+    def handled(self):
+        return self.action != "llm"
+
+
+class IntentRouter:
+    def __init__(self, classifier=None, threshold=0.8):
+        self.classifier = classifier
+        self.threshold = threshold
+
+    def detect(self, text):
+        """Return (intent, confidence, source), or (None, 0, "") when unclear."""
+        for intent, rule in KEYWORD_RULES.items():
+            if rule.match(text or ""):
+                return intent, 1.0, "keyword"
+
+        matched = [intent for intent, rule in PATTERN_RULES.items() if rule.search(text or "")]
+        if len(matched) == 1:
+            return matched[0], 0.95, "pattern"
+        if len(matched) > 1:
+            return None, 0.0, ""  # e.g. hours *and* booking: let the model decide
+
+        if self.classifier:
+            label, probability = self.classifier.predict(text)
+            if label != "other" and probability >= self.threshold:
+                return label, probability, "classifier"
+        return None, 0.0, ""
+
+    def route(self, text, office=None, channel="sms"):
+        started = time.perf_counter()
+        intent, confidence, source = self.detect(text)
+        action, reply = "llm", ""
+
+        if intent == STOP:
+            action = "opt_out"
+        elif intent == START:
+            action = "opt_in"
+        elif intent:
+            reply = answer_intent(intent, office, channel)
+            if reply:
+                action = "reply"
+
+        return Route(
+            intent=intent if action != "llm" else LLM,
+            action=action,
+            reply=reply,
+            confidence=confidence,
+            source=source,
+            elapsed_ms=(time.perf_counter() - started) * 1000,
+        )
+
+
+# ---------------------------------------------------------------------
+# Answers from office data
+# ---------------------------------------------------------------------
+FAQ_KEYWORDS = {
+    HOURS: ("hour", "open", "close", "time"),
+    DIRECTIONS: ("address", "where", "direction", "location", "find us", "parking"),
+    BOOKING: ("book", "reserv", "appointment"),
+    CANCEL: ("cancel",),
+}
+
+
+def _faq_answer(office, intent):
+    faqs = office.faqs or []
+    if isinstance(faqs, dict):
+        faqs = [{"question": q, "answer": a} for q, a in faqs.items()]
+    for faq in faqs:
+        if not isinstance(faq, dict):
+            continue
+        question = str(faq.get("question") or faq.get("q") or "").lower()
+        answer = faq.get("answer") or faq.get("a")
+        if answer and any(k in question for k in FAQ_KEYWORDS.get(intent, ())):
+            return str(answer)
+    return ""
+
+
+def _service(office, *keys):
+    services = office.services if isinstance(office.services, dict) else {}
+    for key in keys:
+        if services.get(key):
+            return services[key]
+    return None
+
+
+def answer_intent(intent, office, channel="sms"):
+    """
+    Reply text for ``intent`` built from the office's own data, or "" when
+    the office has nothing to answer with (the caller then asks the LLM).
+    """
+    if office is None:
+        return ""
+
+    if intent == HUMAN:
+        return f"Thanks, a member of the {office.name} team will get back to you shortly."
+
+    # The receptionist's own LLM flow extracts booking details; only the
+    # channels without that flow get canned booking/cancel instructions.
+    if channel == "receptionist" and intent in (BOOKING, CANCEL):
+        return ""
+
+    faq = _faq_answer(office, intent)
+    if faq:
+        return faq
+
+    if intent == HOURS:
+        hours = _service(office, "opening_hours", "hours")
+        if isinstance(hours, dict):
+            hours = "; ".join(f"{day}: {value}" for day, value in hours.items())
+        return f"{office.name} is open {hours}." if hours else ""
+
+    if intent == DIRECTIONS:
+        address = _service(office, "address", "location")
+        lat, lng = office.lat, office.lng
+        parts = []
+        if address:
+            parts.append(f"{office.name} is at {address}.")
+        elif office.city_id:
+            parts.append(f"{office.name} is in {office.city.city}.")
+        if lat is not None and lng is not None:
+            parts.append(f"Map: https://maps.google.com/?q={lat},{lng}")
+        return " ".join(parts) if (address or lat is not None) else ""
+
+    if intent == BOOKING:
+        if office.public and office.public_slug:
+            link = f"{getattr(settings, 'FRONTEND_URL', '').rstrip('/')}/public/offices/{office.public_slug}"
+            return f"You can book a room at {office.name} here: {link}"
+        rules = office.booking_rules or []
+        if rules:
+            return "To book, reply with the room, date and time. " + " ".join(str(r) for r in rules[:3])
+        return ""
+
+    if intent == CANCEL:
+        return "To cancel, reply with the email you booked with and the date of the booking."
+
+    return ""
+
+
+_router = None
+
+
+def get_intent_router():
+    global _router
+    if _router is None:
+        use_classifier = getattr(settings, "AI_INTENT_CLASSIFIER", True)
+        _router = IntentRouter(
+            classifier=NaiveBayesIntentClassifier() if use_classifier else None,
+            threshold=getattr(settings, "AI_INTENT_CLASSIFIER_THRESHOLD", 0.8),
+        )
+    return _router
+
+
+# ---------------------------------------------------------------------
+# Per-office stats
+# ---------------------------------------------------------------------
+def record_route(office_id, channel, intent, router_ms, llm_ms=0.0):
+    """Add one routed message to today's IntentRouterStat row."""
+    from aistaff.models import IntentRouterStat
+
+    if not office_id:
+        return
+    key = {"office_id": office_id, "date": timezone.localdate(), "channel": channel, "intent": intent}
+    updated = IntentRouterStat.objects.filter(**key).update(
+        count=F("count") + 1,
+        router_ms=F("router_ms") + router_ms,
+        llm_ms=F("llm_ms") + llm_ms,
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            IntentRouterStat.objects.create(**key, count=1, router_ms=router_ms, llm_ms=llm_ms)
+    except IntegrityError:
+        # Another worker created today's row first.
+        IntentRouterStat.objects.filter(**key).update(
+            count=F("count") + 1,
+            router_ms=F("router_ms") + router_ms,
+            llm_ms=F("llm_ms") + llm_ms,
+        )
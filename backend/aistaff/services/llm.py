@@ -0,0 +1,92 @@
+import abc
+import json
+import re
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+class LLMBackend(abc.ABC):
+    """Minimal chat backend: one system prompt + one user message in, parsed JSON out."""
+
+    @abc.abstractmethod
+    def complete_json(self, system: str, user: str):
+        ...
+
+
+class OpenAIBackend(LLMBackend):
+    def __init__(self, api_key=None, model=None):
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=api_key or settings.OPENAI_API_KEY)
+        self.model = model or getattr(settings, "AI_LLM_MODEL", "gpt-4o-mini")
+
+    def complete_json(self, system, user):
+        resp = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            response_format={"type": "json_object"},
+        )
+        return json.loads(resp.choices[0].message.content)
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Deterministic local stand-in for tests; opt in with AI_LLM_BACKEND="fake".
+
+    Understands the batch classification prompt: replies to every message
+    that has text, ignores the rest. Each call is recorded in ``calls``.
+    """
+    REPLY = "Thanks for your message. Someone from {office} will get back to you shortly."
+
+    def __init__(self):
+        self.calls = []
+
+    def complete_json(self, system, user):
+        self.calls.append({"system": system, "user": user})
+        office = re.search(r"office assistant for (.+?)\.\n", system)
+        office = office.group(1) if office else "the office"
+        try:
+            messages = json.loads(user).get("messages", [])
+        except (ValueError, AttributeError):
+            return {"results": []}
+        return {
+            "results": [
+                {
+                    "id": m.get("id"),
+                    "action": "reply" if (m.get("text") or "").strip() else "ignore",
+                    "text": self.REPLY.format(office=office) if (m.get("text") or "").strip() else "",
+                }
+                for m in messages
+            ]
+        }
+
+
+BACKENDS = {"openai": OpenAIBackend, "fake": FakeLLMBackend}
+DISABLED = "disabled"
+
+_backend = None
+
+
+def get_llm_backend():
+    """
+    Process-wide backend chosen by AI_LLM_BACKEND ("openai" or "fake"), or
+    None when it is "disabled": callers then send no AI replies.
+    """
+    global _backend
+    if _backend is None:
+        name = getattr(settings, "AI_LLM_BACKEND", DISABLED)
+        if name == DISABLED:
+            return None
+        if name not in BACKENDS:
+            raise ImproperlyConfigured(f"AI_LLM_BACKEND must be one of {sorted(BACKENDS)} or {DISABLED!r}")
+        _backend = BACKENDS[name]()
+    return _backend
+
+
+def set_llm_backend(backend):
+    """Swap the process-wide backend (tests); pass None to rebuild from settings."""
+    global _backend
+    _backend = backend
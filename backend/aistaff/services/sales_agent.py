@@ -4,15 +4,14 @@ from django.utils import timezone
 from .pay_per_success import pay_per_success
 from aistaff.models import SalesLead, SalesLeadFollowUp, LeadsFollowUpRule, SalesAgentLog
 from workspace.models import SupportTicket
-from twilio.rest import Client
-from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
+from communications.providers import get_twilio_client, get_sendgrid_client
+from communications.notifications import notify_staff
 from aistaff.tasks import send_delayed_follow_up
 from decimal import Decimal
 import json
 
 client = "OpenAI(api_key=settings.OPENAI_API_KEY)"
-twilio_client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
 
 
 class AISalesAgent:
@@ -188,6 +187,13 @@ class AISalesAgent:
             message=f"{visitor_name} ({visitor_email}) → {message}",
             status="open",
         )
+        notify_staff(
+            [self.staff],
+            "lead_escalated",
+            f"Sales escalation from {visitor_name}",
+            ticket.message,
+            data={"ticket_id": ticket.id, "lead_email": visitor_email},
+        )
         return f"🙋 Escalation logged. Ticket #{ticket.id} created."
 
     # ---------------- HELPERS ----------------
@@ -198,7 +204,7 @@ class AISalesAgent:
 
         if lead.phone:
             try:
-                twilio_client.messages.create(
+                get_twilio_client().messages.create(
                     from_=settings.TWILIO_PHONE_NUMBER,
                     to=lead.phone,
                     body=message,
@@ -210,7 +216,7 @@ class AISalesAgent:
 
         if not sent and lead.email:
             try:
-                sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
+                sg = get_sendgrid_client()
                 mail = Mail(
                     from_email=settings.DEFAULT_FROM_EMAIL,
                     to_emails=lead.email,
@@ -1,3 +1,104 @@
 from django.test import TestCase
+from unittest.mock import patch
 
-# Create your tests here.
+from aistaff.models import IntentRouterStat
+from aistaff.services.intent_router import IntentRouter, NaiveBayesIntentClassifier
+
+
+class TestIntentRouter(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from workspace.models import Office, Membership
+
+        self.user = get_user_model().objects.create_user(username="owner", password="pw")
+        self.office = Office.objects.create(
+            name="HQ",
+            owner=self.user,
+            services={"opening_hours": "Mon-Fri 9am-6pm", "address": "12 Ring Road"},
+        )
+        Membership.objects.create(user=self.user, office=self.office, role="OWNER")
+        self.router = IntentRouter(classifier=NaiveBayesIntentClassifier())
+
+    def test_detects_stock_intents_and_leaves_ambiguous_text(self):
+        self.assertEqual(self.router.detect("STOP")[0], "stop")
+        self.assertEqual(self.router.detect("What are your opening hours?")[0], "hours")
+        self.assertEqual(self.router.detect("where is your office")[0], "directions")
+        self.assertEqual(self.router.detect("please cancel my booking on friday")[0], "cancel")
+        self.assertEqual(self.router.detect("what time does it open")[::2], ("hours", "classifier"))
+        self.assertIsNone(self.router.detect("Can you send me the daily sales report?")[0])
+        self.assertNotEqual(self.router.detect("is the event located online?")[0], "directions")
+        # Hours *and* booking: let the model decide.
+        self.assertIsNone(self.router.detect("are you open tomorrow, I want to book a room")[0])
+
+    def test_answers_from_office_data_only(self):
+        route = self.router.route("What are your opening hours?", office=self.office)
+        self.assertEqual(route.action, "reply")
+        self.assertIn("Mon-Fri 9am-6pm", route.reply)
+
+        self.assertEqual(self.router.route("What are your opening hours?", office=None).action, "llm")
+        self.assertEqual(self.router.route("I want to book a room", office=self.office).action, "llm")
+
+    @patch("communications.tasks.send_sms_task.delay")
+    def test_inbound_sms_routed_without_llm_and_reported(self, mock_send_sms):
+        from rest_framework.test import APIClient
+        from aistaff.services.llm import FakeLLMBackend, set_llm_backend
+        from communications.models import CommunicationLog, Conversation, SMSMessage
+        from communications.campaigns import resolve_recipients
+        from communications.tasks import classify_and_autoreply
+        from communications.threads import attach_to_conversation
+
+        llm = FakeLLMBackend()
+        set_llm_backend(llm)
+        self.addCleanup(set_llm_backend, None)
+
+        def inbound(body):
+            log = CommunicationLog.objects.create(office=self.office, type="sms", direction="inbound")
+            SMSMessage.objects.create(log=log, from_number="+15550001111", body=body)
+            attach_to_conversation(log, "+15550001111", body)
+            classify_and_autoreply(log.id)
+            return log
+
+        inbound("where is your office?")
+        inbound("Can I pay by card?")
+        inbound("STOP")
+
+        self.assertEqual(len(llm.calls), 1)
+        self.assertIn("12 Ring Road", mock_send_sms.call_args_list[0].args[2])
+        self.assertTrue(Conversation.objects.get(counterpart="+15550001111").opted_out)
+        self.assertEqual(resolve_recipients(self.office, "sms", ["+15550001111", "+15550002222"]),
+                         [{"to": "+15550002222"}])
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        report = client.get("/api/intent-router/stats/", {"office_id": self.office.id}).data
+        self.assertEqual(report["hit_rate"], round(2 / 3, 3))
+        self.assertEqual(report["intents"], {"directions": 1, "stop": 1})
+        self.assertEqual(IntentRouterStat.objects.get(office=self.office, intent="llm").count, 1)
+        huge = client.get("/api/intent-router/stats/", {"office_id": self.office.id, "days": "9" * 12})
+        self.assertEqual(huge.status_code, 200)
+
+
+class TestRecurringMeetings(TestCase):
+    def test_agenda_expands_series_for_the_day(self):
+        from datetime import datetime, timedelta, timezone as dt_timezone
+        from django.contrib.auth import get_user_model
+        from aistaff.models import Meeting, MeetingException
+        from aistaff.services.ai_secretary import AIOfficeAssistant
+
+        user = get_user_model().objects.create_user(username="staff")
+        assistant = AIOfficeAssistant({"name": "HQ"}, staff_user=user)
+        first = datetime(2030, 1, 7, 9, tzinfo=dt_timezone.utc)
+        standup = Meeting.objects.create(
+            topic="Stand-up", start_time=first, end_time=first + timedelta(minutes=15),
+            created_by=user, recurrence="FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR",
+        )
+        Meeting.objects.create(topic="Review", start_time=first + timedelta(days=8, hours=3), created_by=user)
+        MeetingException.objects.create(
+            series=standup, original_start=first + timedelta(days=8),
+            start_time=first + timedelta(days=8, hours=1), end_time=first + timedelta(days=8, hours=1, minutes=15),
+        )
+        agenda = AIOfficeAssistant.action_get_agenda.__wrapped__
+        tuesday = agenda(assistant, {"date": "2030-01-15T00:00:00"})["agenda"]
+        self.assertEqual([(m["topic"], m["start"][11:16]) for m in tuesday], [("Stand-up", "10:00"), ("Review", "12:00")])
+        self.assertEqual(tuesday[0]["occurrence"], (first + timedelta(days=8)).isoformat())
+        self.assertEqual(agenda(assistant, {"date": "2030-01-12T00:00:00"})["agenda"], [])
@@ -8,6 +8,7 @@ from .views import (
     AssistantLogListView,
     ReceptionistRespondView,
     SalesAgentViewSet,
+    IntentRouterStatsView,
 )
 
 # DRF router for ViewSets
@@ -26,6 +27,7 @@ urlpatterns = [
     # --- AI Receptionist ---
     path("receptionist/office/", GetCurrentOffice.as_view(), name="office"),
     path("receptionist/respond/", ReceptionistRespondView.as_view(), name="receptionist-respond"),
+    path("intent-router/stats/", IntentRouterStatsView.as_view(), name="intent-router-stats"),
 
     # --- AI Sales Agent (with router actions) ---
     path("", include(router.urls)),
@@ -7,6 +7,7 @@ from rest_framework import status, generics, viewsets, permissions, filters
 from .services.ai_receptionist import AIReceptionist
 from .models import ReceptionistLog
 from workspace.models import Office
+from workspace import office_context
 from .services.ai_secretary import AIOfficeAssistant
 from .services.sales_agent import AISalesAgent
 import json
@@ -21,6 +22,7 @@ from .serializers import (
     SalesAgentLogSerializer
 )
 from .models import (
+IntentRouterStat,
 AssistantLog, 
 AssistantActionType, 
 Meeting, 
@@ -29,6 +31,8 @@ SalesLeadFollowUp,
 SalesAgentLog
 )
 from django.utils.dateparse import parse_datetime
+from django.conf import settings
+from .services.intent_router import LLM
 
 class AIAssistantRespondView(APIView):
     permission_classes = []  # restrict as you need
@@ -38,8 +42,8 @@ class AIAssistantRespondView(APIView):
         if not message:
             return Response({"error": "message required"}, status=400)
 
-        # discover org/office id from session (or pass office in body)
-        office_id = request.session.get("current_office_id") or request.data.get("office_id")
+        # discover org/office id from the office context (or pass office in body)
+        office_id = office_context.get_office_id(request) or request.data.get("office_id")
         office = None
         if office_id:
             office = get_object_or_404(Office, pk=office_id)
@@ -161,7 +165,7 @@ class ReceptionistRespondView(APIView):
     
     def post(self, request):
         message = request.data.get("message")
-        office_id = request.session.get("current_office_id")
+        office_id = office_context.get_office_id(request) or request.data.get("office_id")
 
         if not message or not office_id:
             return Response({"error": "Message and office_id are required"}, status=status.HTTP_400_BAD_REQUEST)
@@ -181,6 +185,7 @@ class ReceptionistRespondView(APIView):
             city=office.city,
             faqs=office.faqs,
             bookings=office.booking_rules,
+            office=office,
         )
         response = ai.respond(message)
   
@@ -200,3 +205,59 @@ class ReceptionistRespondView(APIView):
         return Response({"response": response})
         
         
+
+
+class IntentRouterStatsView(APIView):
+    """
+    Intent router report for one office: per-day hit rate (messages answered
+    without the LLM), router and model latency, and the model time saved.
+    Query params: office_id (required), days (default 7, max 90).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        office = get_object_or_404(
+            Office.objects.filter(models.Q(owner=request.user) | models.Q(memberships__user=request.user)).distinct(),
+            pk=request.query_params.get("office_id") or 0,
+        )
+        days = request.query_params.get("days", "7")
+        days = min(max(int(days), 1), 90) if days.isdigit() else 7
+        stats = IntentRouterStat.objects.filter(office=office, date__gt=now().date() - timedelta(days=days))
+
+        llm = stats.filter(intent=LLM).aggregate(count=models.Sum("count"), ms=models.Sum("llm_ms"))
+        avg_llm_ms = (
+            llm["ms"] / llm["count"] if llm["count"] else getattr(settings, "AI_LLM_EXPECTED_LATENCY_MS", 1500)
+        )
+
+        by_day = {}
+        intents = {}
+        for row in stats.values("date", "intent").annotate(count=models.Sum("count"), router_ms=models.Sum("router_ms")):
+            day = by_day.setdefault(row["date"], {"total": 0, "handled": 0, "router_ms": 0.0})
+            day["total"] += row["count"]
+            day["router_ms"] += row["router_ms"]
+            if row["intent"] != LLM:
+                day["handled"] += row["count"]
+                intents[row["intent"]] = intents.get(row["intent"], 0) + row["count"]
+
+        report = []
+        for date in sorted(by_day):
+            day = by_day[date]
+            report.append({
+                "date": date.isoformat(),
+                "total": day["total"],
+                "handled_locally": day["handled"],
+                "hit_rate": round(day["handled"] / day["total"], 3) if day["total"] else 0,
+                "avg_router_ms": round(day["router_ms"] / day["total"], 3) if day["total"] else 0,
+                "estimated_saved_ms": round(day["handled"] * avg_llm_ms),
+            })
+
+        total = sum(d["total"] for d in by_day.values())
+        handled = sum(d["handled"] for d in by_day.values())
+        return Response({
+            "office_id": office.id,
+            "avg_llm_ms": round(avg_llm_ms, 1),
+            "hit_rate": round(handled / total, 3) if total else 0,
+            "estimated_saved_ms": round(handled * avg_llm_ms),
+            "intents": intents,
+            "days": report,
+        })
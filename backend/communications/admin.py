@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import OfficeAddress
 
-# Register your models here.
+
+@admin.register(OfficeAddress)
+class OfficeAddressAdmin(admin.ModelAdmin):
+    list_display = ("address", "kind", "office")
+    search_fields = ("address",)
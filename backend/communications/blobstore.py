@@ -0,0 +1,169 @@
+"""
+Content-addressed storage for MMS media and email attachments.
+
+Bytes are streamed to a temporary file in fixed-size chunks while being
+hashed, then moved to ``<root>/<sha[:2]>/<sha[2:4]>/<sha>``. A file that is
+already stored is not written twice: the temporary copy is discarded and
+the existing Blob row is returned.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import IntegrityError, transaction
+from .models import Blob
+
+
+class BlobTooLarge(ValueError):
+    pass
+
+
+def store_root():
+    return Path(getattr(settings, "BLOB_STORE_ROOT", Path(settings.BASE_DIR) / "blobstore"))
+
+
+def max_bytes():
+    return getattr(settings, "BLOB_MAX_BYTES", 25 * 1024 * 1024)
+
+
+def max_files():
+    return getattr(settings, "BLOB_MAX_FILES_PER_REQUEST", 20)
+
+
+def chunk_size():
+    return getattr(settings, "BLOB_CHUNK_SIZE", 64 * 1024)
+
+
+def blob_path(sha256):
+    return store_root() / sha256[:2] / sha256[2:4] / sha256
+
+
+class BlobWriter:
+    """Hash and spool a stream chunk by chunk, then commit it to the store."""
+
+    def __init__(self, limit=None):
+        self.limit = max_bytes() if limit is None else limit
+        self.size = 0
+        self._hash = hashlib.sha256()
+        tmp_dir = store_root() / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False)
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.limit and self.size > self.limit:
+            self.abort()
+            raise BlobTooLarge(f"Blob exceeds {self.limit} bytes")
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._file.name):
+            os.unlink(self._file.name)
+
+    def commit(self, content_type=""):
+        self._file.close()
+        sha256 = self._hash.hexdigest()
+        target = blob_path(sha256)
+        if target.exists():
+            os.unlink(self._file.name)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self._file.name, target)
+
+        blob = Blob.objects.filter(sha256=sha256).first()
+        if blob:
+            return blob
+        try:
+            with transaction.atomic():
+                return Blob.objects.create(sha256=sha256, size=self.size, content_type=content_type or "")
+        except IntegrityError:
+            return Blob.objects.get(sha256=sha256)
+
+
+def ingest_stream(chunks, content_type="", limit=None):
+    """Store an iterable of byte chunks; raises BlobTooLarge past the limit."""
+    writer = BlobWriter(limit)
+    try:
+        for chunk in chunks:
+            if chunk:
+                writer.write(chunk)
+    except BlobTooLarge:
+        raise
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.commit(content_type)
+
+
+def ingest_url(session, url, auth=None, timeout=None, limit=None):
+    """Download ``url`` into the store without holding the body in memory."""
+    limit = max_bytes() if limit is None else limit
+    with session.get(url, auth=auth, timeout=timeout, stream=True) as resp:
+        resp.raise_for_status()
+        declared = int(resp.headers.get("Content-Length") or 0)
+        if limit and declared > limit:
+            raise BlobTooLarge(f"Blob exceeds {limit} bytes")
+        content_type = (resp.headers.get("Content-Type") or "").split(";")[0].strip()
+        return ingest_stream(resp.iter_content(chunk_size=chunk_size()), content_type, limit)
+
+
+def blob_ref(blob, **extra):
+    """JSON reference stored in SMSMessage.media / EmailMessage.attachments."""
+    return {**extra, "blob_id": blob.id, "sha256": blob.sha256, "size": blob.size, "content_type": blob.content_type}
+
+
+class BlobUploadedFile(UploadedFile):
+    """Result of BlobUploadHandler: the upload is already in the store."""
+
+    def __init__(self, blob, name, content_type, size, charset=None, content_type_extra=None):
+        super().__init__(None, name, content_type, size, charset, content_type_extra)
+        self.blob = blob
+
+
+class BlobUploadHandler(FileUploadHandler):
+    """
+    Multipart upload handler that writes each file part straight into the
+    blob store, so large attachments never sit in memory or in a second
+    temporary file. Parts over the size limit, and parts beyond
+    BLOB_MAX_FILES_PER_REQUEST, are skipped and listed in ``skipped``.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.chunk_size = chunk_size()
+        self.skipped = []
+        self.writer = None
+        self.files = 0
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.writer = None
+        self.files += 1
+        if self.files > max_files():
+            self.skipped.append({"field": self.field_name, "filename": self.file_name, "error": "too_many_files"})
+            raise SkipFile()
+        self.writer = BlobWriter()
+
+    def receive_data_chunk(self, raw_data, start):
+        try:
+            self.writer.write(raw_data)
+        except BlobTooLarge:
+            self.skipped.append({"field": self.field_name, "filename": self.file_name, "error": "too_large"})
+            raise SkipFile()
+        return None
+
+    def file_complete(self, file_size):
+        blob = self.writer.commit(self.content_type)
+        return BlobUploadedFile(
+            blob, self.file_name, self.content_type, file_size, self.charset, self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        if self.writer:
+            self.writer.abort()
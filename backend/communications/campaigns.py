@@ -0,0 +1,194 @@
+from string import Template
+from celery import group
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from workspace.models import RoomBooking, VisitorAccessSubmission
+from .models import Campaign, CommunicationLog, Conversation
+from .params import parse_bound
+from .threads import attach_many_to_conversations, normalize_counterpart
+
+
+def _max_recipients():
+    return getattr(settings, "COMMS_CAMPAIGN_MAX_RECIPIENTS", 10000)
+
+
+def _chunk_size():
+    return getattr(settings, "COMMS_CAMPAIGN_CHUNK_SIZE", 100)
+
+
+def render(template, variables):
+    """Render a ``$name`` / ``${name}`` template; unknown keys are left as-is."""
+    return Template(template or "").safe_substitute(variables)
+
+
+def _query_recipients(office, query, channel):
+    """Recipients from the office's own visitor data (access forms or bookings)."""
+    source = query.get("source")
+    if source == "visitor_submissions":
+        qs = VisitorAccessSubmission.objects.filter(room__office=office, revoked=False)
+        if query.get("approved_only"):
+            qs = qs.filter(approved=True)
+        field = "phone" if channel == "sms" else "email"
+        time_field = "created_at"
+        rows = qs.exclude(**{f"{field}__isnull": True}).exclude(**{field: ""})
+        values = ("name", field)
+    elif source == "bookings":
+        if channel != "email":
+            raise ValidationError({"query": "Bookings only hold visitor emails."})
+        qs = RoomBooking.objects.filter(room__office=office)
+        if query.get("confirmed_only"):
+            qs = qs.filter(confirmed=True)
+        field = "visitor_email"
+        time_field = "start_time"
+        rows = qs
+        values = ("visitor_name", field)
+    else:
+        raise ValidationError({"query": "source must be 'visitor_submissions' or 'bookings'."})
+
+    if query.get("room"):
+        if not str(query["room"]).isdigit():
+            raise ValidationError({"query": "room must be a room id."})
+        rows = rows.filter(room_id=query["room"])
+    since = parse_bound(query.get("since"), "since")
+    until = parse_bound(query.get("until"), "until", end=True)
+    if since:
+        rows = rows.filter(**{f"{time_field}__gte": since})
+    if until:
+        rows = rows.filter(**{f"{time_field}__lt": until})
+
+    return [{"to": to, "name": name or ""} for name, to in rows.values_list(*values).iterator()]
+
+
+def resolve_recipients(office, channel, recipients=None, query=None):
+    """
+    Normalise an explicit recipient list and/or a query into unique recipients.
+
+    Each recipient is a string (phone number or email) or a dict with ``to``
+    plus optional template variables. Duplicates (by normalised counterpart)
+    keep the first occurrence; counterparts who opted out (STOP) are dropped.
+    """
+    rows = []
+    for item in recipients or []:
+        if isinstance(item, str):
+            rows.append({"to": item})
+        elif isinstance(item, dict) and item.get("to"):
+            rows.append(dict(item))
+        else:
+            raise ValidationError({"recipients": "Each recipient must be a string or an object with 'to'."})
+    if query:
+        rows.extend(_query_recipients(office, query, channel))
+
+    expected_kind = "phone" if channel == "sms" else "email"
+    seen = set()
+    unique = []
+    for row in rows:
+        kind, key = normalize_counterpart(str(row["to"]))
+        if kind != expected_kind or not key or key in seen:
+            continue
+        seen.add(key)
+        row["to"] = key
+        unique.append(row)
+
+    # An opt-out that could not be attributed to an office applies to all of them.
+    opted_out = set(
+        Conversation.objects.filter(Q(office=office) | Q(office__isnull=True), opted_out=True, counterpart__in=seen)
+        .values_list("counterpart", flat=True)
+    )
+    if opted_out:
+        unique = [row for row in unique if row["to"] not in opted_out]
+
+    if len(unique) > _max_recipients():
+        raise ValidationError({"recipients": f"At most {_max_recipients()} recipients per campaign."})
+    return unique
+
+
+def set_opted_out(conversation_id, opted_out):
+    """
+    Record a STOP (``opted_out``) or START from the conversation's counterpart.
+    An unattributed STOP (office-less thread) holds for every office, so a
+    START to any office lifts it as well.
+    """
+    target = Q(pk=conversation_id)
+    if not opted_out:
+        counterpart = Conversation.objects.filter(pk=conversation_id).values_list("counterpart", flat=True).first()
+        target |= Q(office__isnull=True, counterpart=counterpart, opted_out=True)
+    Conversation.objects.filter(target).update(
+        opted_out=opted_out,
+        opted_out_at=timezone.now() if opted_out else None,
+    )
+
+
+def _variables(office, row):
+    variables = {key: "" if value is None else str(value) for key, value in row.items()}
+    variables.setdefault("name", "")
+    variables["office"] = office.name
+    return variables
+
+
+def create_campaign(office, channel, body_template, recipients, subject_template="", html_template="", name="", user=None):
+    """
+    Create a campaign with one queued CommunicationLog per recipient and
+    dispatch its sends as a Celery group of chunks once committed.
+    """
+    from .tasks import send_campaign_chunk
+
+    if not recipients:
+        raise ValidationError({"recipients": "No deliverable recipients."})
+
+    with transaction.atomic():
+        campaign = Campaign.objects.create(
+            office=office,
+            channel=channel,
+            name=name,
+            subject_template=subject_template,
+            body_template=body_template,
+            html_template=html_template,
+            created_by=user,
+            total_count=len(recipients),
+        )
+        logs = CommunicationLog.objects.bulk_create(
+            [
+                CommunicationLog(
+                    office=office,
+                    type=channel,
+                    direction="outbound",
+                    status="queued",
+                    campaign=campaign,
+                    payload={"to": row["to"], "vars": _variables(office, row)},
+                )
+                for row in recipients
+            ],
+            batch_size=500,
+        )
+        if logs and logs[0].pk is None:
+            # Backends without RETURNING on bulk insert: reload the ids.
+            logs = list(CommunicationLog.objects.filter(campaign=campaign).order_by("id"))
+
+        preview = subject_template if channel == "email" else body_template
+        attach_many_to_conversations(office.id, [
+            (log, log.payload["to"], render(preview, log.payload["vars"])) for log in logs
+        ])
+
+        size = _chunk_size()
+        ids = [log.id for log in logs]
+        chunks = [ids[i:i + size] for i in range(0, len(ids), size)]
+        transaction.on_commit(
+            lambda: group(send_campaign_chunk.s(campaign.id, chunk) for chunk in chunks).apply_async()
+        )
+    return campaign
+
+
+def record_chunk_result(campaign_id, sent, failed):
+    """Add one chunk's outcome to the campaign counters; close it when all are accounted for."""
+    Campaign.objects.filter(pk=campaign_id).update(
+        sent_count=F("sent_count") + sent,
+        failed_count=F("failed_count") + failed,
+    )
+    Campaign.objects.filter(
+        pk=campaign_id,
+        status="sending",
+        total_count__lte=F("sent_count") + F("failed_count"),
+    ).update(status="completed", completed_at=timezone.now())
@@ -0,0 +1,110 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import CommunicationLog
+
+KEY_PREFIX = "comms:classify"
+
+
+def batch_size():
+    return getattr(settings, "COMMS_CLASSIFY_BATCH_SIZE", 20)
+
+
+def max_delay():
+    return getattr(settings, "COMMS_CLASSIFY_MAX_DELAY", 2)
+
+
+def claim_timeout():
+    return getattr(settings, "COMMS_CLASSIFY_CLAIM_TIMEOUT", 300)
+
+
+def _office_key(office_id):
+    return office_id if office_id is not None else "none"
+
+
+def queue_for_classification(log):
+    """
+    Mark an inbound log for AI classification and make sure a batch is due.
+
+    The first pending log of an office schedules a batch ``max_delay``
+    seconds out; reaching ``batch_size`` pending logs flushes one right away.
+    So a burst costs one model call per batch and a lone message waits at
+    most ``max_delay``.
+    """
+    CommunicationLog.objects.filter(pk=log.pk).update(ai_status="pending")
+    log.ai_status = "pending"
+    office_id = log.office_id
+    transaction.on_commit(lambda: _schedule(office_id))
+
+
+def _schedule(office_id):
+    from .tasks import classify_pending_batch
+
+    office = _office_key(office_id)
+    counter = f"{KEY_PREFIX}:{office}:pending"
+    cache.add(counter, 0, timeout=max_delay() * 10 + 60)
+    try:
+        pending = cache.incr(counter)
+    except ValueError:
+        pending = 1
+
+    if cache.add(f"{KEY_PREFIX}:{office}:scheduled", 1, timeout=max_delay() + 30):
+        classify_pending_batch.apply_async((office_id,), countdown=max_delay())
+    elif pending >= batch_size():
+        cache.delete(counter)
+        classify_pending_batch.delay(office_id)
+
+
+def release_schedule(office_id):
+    """Called when a batch starts: logs arriving from now on schedule the next one."""
+    office = _office_key(office_id)
+    cache.delete_many([f"{KEY_PREFIX}:{office}:scheduled", f"{KEY_PREFIX}:{office}:pending"])
+
+
+def _stuck():
+    """Processing past the claim timeout, or pending that long with no batch picking it up."""
+    cutoff = timezone.now() - timedelta(seconds=claim_timeout())
+    return Q(ai_status="processing", ai_claimed_at__lt=cutoff) | Q(ai_status="pending", created_at__lt=cutoff)
+
+
+def reschedule_stuck():
+    """
+    Start a batch for every office with stuck logs, so they do not wait for
+    that office's next inbound message. Run periodically (see
+    virtual_office.celery). Returns the office ids.
+    """
+    from .tasks import classify_pending_batch
+
+    office_ids = set(CommunicationLog.objects.filter(_stuck()).values_list("office_id", flat=True).distinct())
+    for office_id in office_ids:
+        classify_pending_batch.delay(office_id)
+    return office_ids
+
+
+def claim_pending_logs(office_id, limit):
+    """
+    Atomically move up to ``limit`` pending logs of an office to processing.
+
+    Logs left in processing for longer than COMMS_CLASSIFY_CLAIM_TIMEOUT
+    seconds (their worker died mid-batch) are claimed again. On PostgreSQL
+    concurrent batches skip each other's rows instead of waiting on them.
+    """
+    now = timezone.now()
+    stale = Q(ai_status="processing", ai_claimed_at__lt=now - timedelta(seconds=claim_timeout()))
+    with transaction.atomic():
+        ids = list(
+            CommunicationLog.objects.select_for_update(skip_locked=True)
+            .filter(Q(ai_status="pending") | stale, office_id=office_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:limit]
+        )
+        CommunicationLog.objects.filter(pk__in=ids).update(ai_status="processing", ai_claimed_at=now)
+    return list(
+        CommunicationLog.objects.filter(pk__in=ids)
+        .select_related("office", "staff")
+        .prefetch_related("sms_messages", "emails")
+        .order_by("id")
+    )
@@ -228,15 +228,15 @@ class PublicPresenceConsumer(AsyncJsonWebsocketConsumer):
         # Send snapshot of all workers currently present
         presences = await sync_to_async(list)(
             WorkerPresence.objects.filter(worker__office=office, is_presence=True)
-            .select_related("worker")
+            .select_related("worker").prefetch_related("worker__rooms")
         )
         workers_data = [
             {
                 "id": p.worker.id,
                 "worker_id": p.worker.worker_id,
                 "name": p.worker.name,
-                "rooms": list(p.worker.rooms.values_list("id", flat=True)),
-                "last_login": p.last_login.isoformat() if p.last_login else None,
+                "rooms": [room.id for room in p.worker.rooms.all()],
+                "last_login": p.last_login_time.isoformat() if p.last_login_time else None,
             }
             for p in presences
         ]
@@ -251,3 +251,97 @@ class PublicPresenceConsumer(AsyncJsonWebsocketConsumer):
 
     async def presence_broadcast(self, event):
         await self.send_json(event["payload"])
+
+
+# ------------------------------------
+# STAFF NOTIFICATIONS CONSUMER
+# ------------------------------------
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        user = self.scope.get("user")
+        if not user or not getattr(user, "is_authenticated", False):
+            await self.close(code=4401)
+            return
+
+        self.group_name = f"notifications_user_{user.id}"
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send_json({"type": "notification.unread", "count": await self.unread_count(user.id)})
+
+    async def disconnect(self, code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def notification_digest(self, event):
+        await self.send_json({"type": "notification.digest", "notifications": event["notifications"]})
+
+    @database_sync_to_async
+    def unread_count(self, user_id):
+        from .models import StaffNotification
+
+        return StaffNotification.objects.filter(recipient_id=user_id, read_at__isnull=True).count()
+
+
+# ------------------------------------
+# APPROVAL QUEUE CONSUMER (staff)
+# ------------------------------------
+class ApprovalQueueConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pending visitor submissions of one office, live. Sends the queue on
+    connect, then ``approval.pending`` / ``approval.decided`` events; staff
+    may send ``{"action": "approve" | "revoke", "ids": [...]}``.
+    """
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if not user or not getattr(user, "is_authenticated", False):
+            await self.close(code=4401)
+            return
+        self.office = await self.get_office(user, int(self.scope["url_route"]["kwargs"]["office_id"]))
+        if self.office is None:
+            await self.close(code=4403)
+            return
+
+        from workspace.approvals import queue_group
+
+        self.group_name = queue_group(self.office.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send_json({"type": "approval.queue", "submissions": await self.get_pending()})
+
+    async def disconnect(self, code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        from workspace.approvals import ApprovalError
+
+        if not isinstance(content, dict):
+            await self.send_json({"type": "approval.error", "error": "Expected a JSON object"})
+            return
+        try:
+            await self.decide(content.get("ids"), content.get("action"))
+        except ApprovalError as exc:
+            await self.send_json({"type": "approval.error", "error": str(exc)})
+
+    async def approval_event(self, event):
+        await self.send_json(event["payload"])
+
+    @database_sync_to_async
+    def get_office(self, user, office_id):
+        from workspace.approvals import is_staff
+
+        office = Office.objects.filter(pk=office_id).first()
+        return office if office and is_staff(user, office) else None
+
+    @database_sync_to_async
+    def get_pending(self):
+        from workspace.approvals import pending
+
+        return pending(self.office)
+
+    @database_sync_to_async
+    def decide(self, ids, action):
+        from workspace.approvals import decide
+
+        return decide(self.office, ids, action, self.scope["user"])
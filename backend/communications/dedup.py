@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import ProviderEvent
+
+
+class RecentKeyCache:
+    """Bounded, thread-safe LRU of recently seen event keys (per process)."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                return True
+            return False
+
+    def add(self, key):
+        with self._lock:
+            self._keys[key] = None
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+recent_events = RecentKeyCache(getattr(settings, "COMMS_DEDUP_CACHE_SIZE", 10000))
+
+
+def is_duplicate_event(provider, provider_id, event_type):
+    """
+    Record a provider webhook event and report whether it was already seen.
+
+    The in-memory cache absorbs fast retries without touching the database;
+    the unique index on ProviderEvent is the source of truth across workers.
+    Callers should run this inside the same transaction that stores the event
+    so a failed ingest rolls the marker back. Events without a provider id
+    cannot be deduplicated and are never reported as duplicates.
+    """
+    if not provider_id:
+        return False
+
+    key = (provider, provider_id, event_type or "")
+    if key in recent_events:
+        return True
+
+    try:
+        with transaction.atomic():
+            ProviderEvent.objects.create(
+                provider=provider,
+                provider_id=provider_id,
+                event_type=event_type or "",
+            )
+    except IntegrityError:
+        recent_events.add(key)
+        return True
+
+    # Only remember the key once the caller's transaction has committed, so a
+    # failed ingest can be retried by the provider.
+    transaction.on_commit(lambda: recent_events.add(key))
+    return False
+
+
+def retention():
+    return timedelta(seconds=getattr(settings, "COMMS_PROVIDER_EVENT_RETENTION", 3 * 24 * 3600))
+
+
+def prune_provider_events(batch=5000):
+    """
+    Delete dedup markers older than the provider retry window, ``batch`` rows
+    per statement so the table is never locked for long. Returns the count.
+    """
+    cutoff = timezone.now() - retention()
+    deleted = 0
+    while True:
+        ids = list(ProviderEvent.objects.filter(received_at__lt=cutoff).values_list("pk", flat=True)[:batch])
+        if not ids:
+            return deleted
+        deleted += ProviderEvent.objects.filter(pk__in=ids).delete()[0]
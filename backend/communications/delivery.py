@@ -0,0 +1,240 @@
+"""
+Ingestion of provider delivery-status callbacks (Twilio MessageStatus,
+SendGrid event webhook).
+
+Each callback becomes a MessageStatusEvent, moves its CommunicationLog
+forward (never backwards when callbacks arrive out of order) and bumps the
+hourly DeliveryStatRollup counters the dashboard reads.
+"""
+import base64
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .dedup import is_duplicate_event
+from .models import CommunicationLog, DeliveryStatRollup, MessageStatusEvent
+
+TWILIO_STATUSES = {
+    "accepted": "queued",
+    "scheduled": "queued",
+    "queued": "queued",
+    "sending": "sent",
+    "sent": "sent",
+    "delivered": "delivered",
+    "undelivered": "undelivered",
+    "failed": "failed",
+    "canceled": "failed",
+    "read": "opened",
+}
+
+SENDGRID_STATUSES = {
+    "processed": "sent",
+    "deferred": "deferred",
+    "delivered": "delivered",
+    "bounce": "bounced",
+    "blocked": "bounced",
+    "dropped": "dropped",
+    "open": "opened",
+    "click": "clicked",
+    "spamreport": "spam",
+    "unsubscribe": "unsubscribed",
+    "group_unsubscribe": "unsubscribed",
+}
+
+# Delivery outcome order; engagement statuses (opened, clicked, ...) are
+# recorded and counted but do not change CommunicationLog.status.
+STATUS_RANK = {
+    "queued": 0,
+    "sent": 1,
+    "deferred": 1,
+    "delivered": 2,
+    "undelivered": 2,
+    "failed": 2,
+    "bounced": 2,
+    "dropped": 2,
+}
+
+FAILED_STATUSES = ("undelivered", "failed", "bounced", "dropped")
+
+
+def status_callback_url():
+    """Twilio StatusCallback for outbound messages, or None when not configured."""
+    base = getattr(settings, "COMMS_STATUS_CALLBACK_BASE_URL", None)
+    return f"{base.rstrip('/')}/api/comms/webhook/twilio/status/" if base else None
+
+
+def bucket_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def verify_sendgrid_signature(body, signature, timestamp, public_key=None):
+    """
+    Check SendGrid's signed event webhook (ECDSA P-256 over timestamp+body).
+    Without SENDGRID_EVENT_WEBHOOK_PUBLIC_KEY only DEBUG accepts events.
+    """
+    public_key = public_key or getattr(settings, "SENDGRID_EVENT_WEBHOOK_PUBLIC_KEY", None)
+    if not public_key:
+        return settings.DEBUG
+    if not signature or not timestamp:
+        return False
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.serialization import load_der_public_key
+
+    try:
+        key = load_der_public_key(base64.b64decode(public_key))
+        key.verify(base64.b64decode(signature), timestamp.encode() + body, ec.ECDSA(hashes.SHA256()))
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+
+def twilio_event(data):
+    """Normalize one Twilio MessageStatus callback (form fields)."""
+    raw = (data.get("MessageStatus") or data.get("SmsStatus") or "").lower()
+    sid = data.get("MessageSid") or data.get("SmsSid") or ""
+    return {
+        "dedup_id": sid,
+        "dedup_type": f"sms.status.{raw}",
+        "provider_id": sid,
+        "log_id": None,
+        "raw_status": raw,
+        "status": TWILIO_STATUSES.get(raw, raw),
+        "error_code": data.get("ErrorCode") or "",
+        "occurred_at": timezone.now(),
+    }
+
+
+def sendgrid_event(data):
+    """Normalize one item of a SendGrid event webhook batch."""
+    raw = (data.get("event") or "").lower()
+    if raw == "bounce" and data.get("type") == "blocked":
+        raw = "blocked"
+    message_id = (data.get("sg_message_id") or "").split(".")[0]
+    try:
+        occurred_at = datetime.fromtimestamp(int(data["timestamp"]), tz=dt_timezone.utc)
+    except (KeyError, TypeError, ValueError):
+        occurred_at = timezone.now()
+    try:
+        log_id = int(data.get("log_id"))
+    except (TypeError, ValueError):
+        log_id = None
+    return {
+        "dedup_id": data.get("sg_event_id") or f"{message_id}:{data.get('email', '')}",
+        "dedup_type": f"email.{raw}",
+        "provider_id": message_id,
+        "log_id": log_id,
+        "raw_status": raw,
+        "status": SENDGRID_STATUSES.get(raw, raw),
+        "error_code": str(data.get("status") or "")[:50],
+        "occurred_at": occurred_at,
+    }
+
+
+def _match_logs(events):
+    log_ids = {e["log_id"] for e in events if e["log_id"]}
+    provider_ids = {e["provider_id"] for e in events if not e["log_id"] and e["provider_id"]}
+    by_id = CommunicationLog.objects.in_bulk(log_ids) if log_ids else {}
+    by_provider_id = {}
+    if provider_ids:
+        for log in CommunicationLog.objects.filter(provider_id__in=provider_ids, direction="outbound"):
+            by_provider_id.setdefault(log.provider_id, log)
+    return lambda e: by_id.get(e["log_id"]) if e["log_id"] else by_provider_id.get(e["provider_id"])
+
+
+def record_status_events(provider, events):
+    """
+    Store normalized status events (see twilio_event / sendgrid_event).
+    Events already seen are skipped. Returns the number recorded.
+    """
+    with transaction.atomic():
+        fresh = [e for e in events if e["status"] and not is_duplicate_event(provider, e["dedup_id"], e["dedup_type"])]
+        if not fresh:
+            return 0
+        find_log = _match_logs(fresh)
+
+        rows, rollups, advanced = [], Counter(), {}
+        for e in fresh:
+            log = find_log(e)
+            rows.append(MessageStatusEvent(
+                log=log,
+                provider=provider,
+                provider_id=e["provider_id"][:200],
+                status=e["status"][:20],
+                raw_status=e["raw_status"][:50],
+                error_code=e["error_code"],
+                occurred_at=e["occurred_at"],
+            ))
+            if log is None:
+                continue
+            if log.office_id:
+                rollups[(log.office_id, provider, log.type, e["status"][:20], bucket_start(e["occurred_at"]))] += 1
+            if _advances(e["status"], advanced.get(log.pk, log.status)):
+                advanced[log.pk] = e["status"]
+
+        MessageStatusEvent.objects.bulk_create(rows)
+        for status in set(advanced.values()):
+            ids = [pk for pk, s in advanced.items() if s == status]
+            CommunicationLog.objects.filter(pk__in=ids).update(status=status)
+        bump_rollups(rollups)
+    return len(fresh)
+
+
+def _advances(status, current):
+    rank = STATUS_RANK.get(status)
+    return rank is not None and rank > STATUS_RANK.get(current, 1 if current == "error" else -1)
+
+
+def attach_orphan_events(provider, logs):
+    """
+    Attach status callbacks that arrived before their log's provider id was
+    saved (Twilio can call back before the send task stores the MessageSid).
+    Call right after saving provider ids. Returns the number attached.
+    """
+    counts = Counter(log.provider_id for log in logs if log.provider_id)
+    # A provider id shared by several logs (one SendGrid request) is ambiguous.
+    by_provider_id = {log.provider_id: log for log in logs if counts[log.provider_id] == 1}
+    if not by_provider_id:
+        return 0
+    with transaction.atomic():
+        orphans = list(
+            MessageStatusEvent.objects.select_for_update()
+            .filter(log__isnull=True, provider=provider, provider_id__in=by_provider_id)
+            .order_by("occurred_at", "id")
+        )
+        if not orphans:
+            return 0
+        rollups, advanced = Counter(), {}
+        for event in orphans:
+            log = event.log = by_provider_id[event.provider_id]
+            if log.office_id:
+                rollups[(log.office_id, provider, log.type, event.status, bucket_start(event.occurred_at))] += 1
+            if _advances(event.status, advanced.get(log.pk, log.status)):
+                advanced[log.pk] = event.status
+        MessageStatusEvent.objects.bulk_update(orphans, ["log"])
+        for log in by_provider_id.values():
+            if log.pk in advanced:
+                log.status = advanced[log.pk]
+                CommunicationLog.objects.filter(pk=log.pk).update(status=log.status)
+        bump_rollups(rollups)
+    return len(orphans)
+
+
+def bump_rollups(counts):
+    """Add ``{(office_id, provider, channel, status, bucket_start): n}`` to the rollup table."""
+    for (office_id, provider, channel, status, bucket), n in counts.items():
+        key = {
+            "office_id": office_id, "provider": provider, "channel": channel,
+            "status": status, "bucket_start": bucket,
+        }
+        if DeliveryStatRollup.objects.filter(**key).update(count=F("count") + n):
+            continue
+        try:
+            with transaction.atomic():
+                DeliveryStatRollup.objects.create(**key, count=n)
+        except IntegrityError:
+            # Another worker created the bucket first.
+            DeliveryStatRollup.objects.filter(**key).update(count=F("count") + n)
@@ -0,0 +1,63 @@
+import time
+from django.core.management.base import BaseCommand
+from sendgrid import SendGridAPIClient
+from sendgrid.helpers.mail import Mail
+from twilio.rest import Client
+from communications.providers import PooledTwilioHttpClient, SendGridSession
+from communications.standin import ProviderStandIn, StandInConfig
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure send throughput (messages/second) with a new provider client per message "
+        "versus the pooled per-process clients, against a local HTTP stand-in. "
+        "The stand-in is plain HTTP, so real-world gains are larger (no TLS handshakes here)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=300)
+        parser.add_argument("--base-url", help="Use an already running stand-in instead of starting one")
+        parser.add_argument("--latency", type=float, default=0.0, help="Stand-in response latency in seconds")
+
+    def handle(self, *args, **options):
+        n = options["messages"]
+        standin = None
+        base_url = options.get("base_url")
+        if not base_url:
+            standin = ProviderStandIn(StandInConfig(latency=options["latency"], status_callbacks=[])).start()
+            base_url = standin.base_url
+
+        mail = lambda: Mail(from_email="bench@example.com", to_emails="to@example.com", subject="hi", plain_text_content="hi")
+
+        def twilio_per_call():
+            client = Client("ACbench", "token", http_client=PooledTwilioHttpClient(timeout=10, base_url=base_url))
+            client.messages.create(from_="+15550000000", to="+15550000001", body="hi")
+
+        pooled_twilio = Client("ACbench", "token", http_client=PooledTwilioHttpClient(timeout=10, base_url=base_url))
+
+        def twilio_pooled():
+            pooled_twilio.messages.create(from_="+15550000000", to="+15550000001", body="hi")
+
+        def sendgrid_per_call():
+            SendGridAPIClient("key", host=base_url).send(mail())
+
+        pooled_sendgrid = SendGridSession("key", timeout=10, base_url=base_url)
+
+        def sendgrid_pooled():
+            pooled_sendgrid.send(mail())
+
+        try:
+            for label, fn in [
+                ("twilio  per-call client", twilio_per_call),
+                ("twilio  pooled client  ", twilio_pooled),
+                ("sendgrid per-call client", sendgrid_per_call),
+                ("sendgrid pooled client  ", sendgrid_pooled),
+            ]:
+                start = time.perf_counter()
+                for _ in range(n):
+                    fn()
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"{label}: {n / elapsed:8.1f} msg/s ({n} messages in {elapsed:.2f}s)")
+        finally:
+            if standin:
+                standin.stop()
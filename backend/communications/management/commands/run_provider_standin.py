@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from communications.standin import ProviderStandIn, StandInConfig
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local stand-in for the Twilio Messages, SendGrid Mail Send and Paystack verify APIs. "
+        "Point TWILIO_API_BASE_URL, SENDGRID_API_BASE_URL and PAYSTACK_API_BASE_URL at it to load-test offline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8099)
+        parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+        parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of uniform jitter")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 500")
+        parser.add_argument("--rate-limit", type=float, default=0.0, help="Requests/second per provider before 429s")
+        parser.add_argument("--retry-after", type=int, default=1)
+        parser.add_argument("--paystack-status", default="success")
+        parser.add_argument(
+            "--status-callbacks", default="sent,delivered",
+            help="Twilio MessageStatus values posted (signed) to each StatusCallback; empty to disable",
+        )
+        parser.add_argument("--callback-delay", type=float, default=0.0)
+        parser.add_argument("--sendgrid-event-url", help="Post signed SendGrid event webhooks here")
+        parser.add_argument("--seed", type=int)
+
+    def handle(self, *args, **options):
+        config = StandInConfig(
+            latency=options["latency"],
+            jitter=options["jitter"],
+            error_rate=options["error_rate"],
+            rate_limit=options["rate_limit"],
+            retry_after=options["retry_after"],
+            paystack_status=options["paystack_status"],
+            status_callbacks=[s for s in options["status_callbacks"].split(",") if s],
+            callback_delay=options["callback_delay"],
+            sendgrid_event_url=options["sendgrid_event_url"],
+            seed=options["seed"],
+        )
+        standin = ProviderStandIn(config, host=options["host"], port=options["port"])
+        base_url = f"http://{options['host']}:{options['port']}"
+        self.stdout.write(f"Provider stand-in listening on {base_url}")
+        for name in ("TWILIO_API_BASE_URL", "SENDGRID_API_BASE_URL", "PAYSTACK_API_BASE_URL"):
+            self.stdout.write(f"  export {name}={base_url}")
+        if config.sendgrid_event_url:
+            self.stdout.write(f"  export SENDGRID_EVENT_WEBHOOK_PUBLIC_KEY={standin.sendgrid_public_key}")
+        try:
+            standin.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        for (provider, status), count in sorted(standin.counts.items()):
+            self.stdout.write(f"{provider:10} {status}: {count}")
@@ -0,0 +1,67 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from communications.models import CommunicationLog, CommunicationLogPayload
+from communications.payloads import detect_source, offload_row, split_payload
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply COMMS_PAYLOAD_POLICY to existing inbound CommunicationLog rows: keep the whitelisted "
+        "summary inline and move the raw payload to compressed side storage. Runs in id-ordered chunks, "
+        "one transaction each, and can be resumed with --start-id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--start-id", type=int, default=0, help="Resume after this log id")
+        parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between chunks")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_id = options["start_id"]
+        dry_run = options["dry_run"]
+        scanned = slimmed = bytes_before = bytes_after = 0
+
+        while True:
+            logs = list(
+                CommunicationLog.objects.filter(pk__gt=last_id, direction="inbound")
+                .order_by("pk")
+                .only("id", "type", "direction", "payload")[:chunk_size]
+            )
+            if not logs:
+                break
+            last_id = logs[-1].pk
+            scanned += len(logs)
+
+            rows, updated = [], []
+            for log in logs:
+                source = detect_source(log)
+                if not source:
+                    continue
+                inline, raw = split_payload(source, log.payload)
+                if inline is log.payload:  # policy keeps this source inline
+                    continue
+                bytes_before += len(json.dumps(log.payload))
+                bytes_after += len(json.dumps(inline))
+                if raw is not None:
+                    rows.append(offload_row(log, source, raw))
+                log.payload = inline
+                updated.append(log)
+
+            if updated and not dry_run:
+                with transaction.atomic():
+                    CommunicationLogPayload.objects.bulk_create(rows, ignore_conflicts=True)
+                    CommunicationLog.objects.bulk_update(updated, ["payload"])
+            slimmed += len(updated)
+            self.stdout.write(f"up to id {last_id}: {len(updated)}/{len(logs)} slimmed")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        verb = "would slim" if dry_run else "slimmed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} inbound logs, {verb} {slimmed}; "
+            f"inline payload {bytes_before} -> {bytes_after} bytes."
+        ))
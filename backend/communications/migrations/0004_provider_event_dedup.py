@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0003_communicationlog_emailmessage_smsmessage_voicecall'),
+        ('workspace', '0019_supportticket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=20)),
+                ('provider_id', models.CharField(max_length=200)),
+                ('event_type', models.CharField(max_length=50)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='voicecall',
+            name='call_sid',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='communicationlog',
+            name='provider_id',
+            field=models.CharField(blank=True, db_index=True, max_length=200, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='communicationlog',
+            constraint=models.UniqueConstraint(condition=models.Q(('type', 'voice')), fields=('provider_id',), name='uniq_voice_log_provider_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='providerevent',
+            constraint=models.UniqueConstraint(fields=('provider', 'provider_id', 'event_type'), name='uniq_provider_event'),
+        ),
+    ]
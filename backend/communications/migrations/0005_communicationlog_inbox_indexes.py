@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0004_provider_event_dedup'),
+        ('workspace', '0019_supportticket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='communicationlog',
+            index=models.Index(fields=['office', 'created_at'], name='commlog_office_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='communicationlog',
+            index=models.Index(fields=['office', 'type', 'created_at'], name='commlog_office_type_idx'),
+        ),
+    ]
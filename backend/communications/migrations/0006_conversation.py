@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0005_communicationlog_inbox_indexes'),
+        ('workspace', '0019_supportticket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counterpart', models.CharField(max_length=254)),
+                ('kind', models.CharField(choices=[('phone', 'phone'), ('email', 'email')], max_length=10)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('last_message_preview', models.CharField(blank=True, max_length=200)),
+                ('last_direction', models.CharField(blank=True, max_length=10)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_log', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='communications.communicationlog')),
+                ('office', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to='workspace.office')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='communicationlog',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='logs', to='communications.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='communicationlog',
+            index=models.Index(fields=['conversation', 'created_at'], name='commlog_conversation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['office', 'last_message_at'], name='conversation_recent_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('office', 'counterpart'), name='uniq_conversation_counterpart'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0006_conversation'),
+        ('workspace', '0019_supportticket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Campaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('sms', 'sms'), ('email', 'email')], max_length=10)),
+                ('name', models.CharField(blank=True, max_length=200)),
+                ('subject_template', models.CharField(blank=True, max_length=400)),
+                ('body_template', models.TextField()),
+                ('html_template', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('sending', 'Sending'), ('completed', 'Completed')], default='sending', max_length=20)),
+                ('total_count', models.PositiveIntegerField(default=0)),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaigns', to='workspace.office')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='communicationlog',
+            name='campaign',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='logs', to='communications.campaign'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0007_campaign'),
+        ('workspace', '0019_supportticket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='communicationlog',
+            name='ai_status',
+            field=models.CharField(blank=True, choices=[('', 'Not queued'), ('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done')], default='', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='communicationlog',
+            index=models.Index(condition=models.Q(('ai_status', 'pending')), fields=['office', 'id'], name='commlog_ai_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0008_communicationlog_ai_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='opted_out',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='opted_out_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
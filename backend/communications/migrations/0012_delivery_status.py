@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0011_staff_notifications'),
+        ('workspace', '0019_supportticket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryStatRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=20)),
+                ('channel', models.CharField(max_length=10)),
+                ('status', models.CharField(max_length=20)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_rollups', to='workspace.office')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('office', 'bucket_start', 'provider', 'channel', 'status'), name='uniq_delivery_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MessageStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=20)),
+                ('provider_id', models.CharField(blank=True, max_length=200)),
+                ('status', models.CharField(max_length=20)),
+                ('raw_status', models.CharField(blank=True, max_length=50)),
+                ('error_code', models.CharField(blank=True, max_length=50)),
+                ('occurred_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('log', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='communications.communicationlog')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['log', 'occurred_at'], name='statusevent_log_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0012_delivery_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommunicationLogPayload',
+            fields=[
+                ('log', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='raw_payload', serialize=False, to='communications.communicationlog')),
+                ('source', models.CharField(blank=True, max_length=50)),
+                ('data', models.BinaryField()),
+                ('raw_size', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0013_log_payload_offload'),
+        ('workspace', '0029_approval_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfficeAddress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('phone', 'phone'), ('email', 'email')], max_length=10)),
+                ('address', models.CharField(max_length=254, unique=True)),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comm_addresses', to='workspace.office')),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0014_office_address'),
+        ('workspace', '0029_approval_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='communicationlog',
+            name='commlog_ai_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='communicationlog',
+            name='ai_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='communicationlog',
+            index=models.Index(condition=models.Q(('ai_status__in', ['pending', 'processing'])), fields=['office', 'id'], name='commlog_ai_pending_idx'),
+        ),
+    ]
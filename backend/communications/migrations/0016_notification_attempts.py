@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0015_classification_claims'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='staffnotification',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='staffnotification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('delivered', 'Delivered'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0016_notification_attempts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messagestatusevent',
+            index=models.Index(condition=models.Q(('log__isnull', True)), fields=['provider_id'], name='statusevent_orphan_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0017_status_event_orphans'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='providerevent',
+            name='received_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+from django.db.models import Count
+
+# VoiceCall.STATUS_RANK at the time of writing; historical models have no class attributes.
+STATUS_RANK = {
+    "queued": 0, "initiated": 1, "ringing": 2, "in-progress": 3,
+    "completed": 4, "busy": 4, "no-answer": 4, "canceled": 4, "failed": 4,
+}
+
+
+def merge_voice_calls(apps, schema_editor):
+    """
+    Before 0004 every status callback appended a VoiceCall to the call's log.
+    Fold each log's rows into one that carries the log's CallSid, the most
+    advanced status and the earliest start / latest end.
+    """
+    CommunicationLog = apps.get_model("communications", "CommunicationLog")
+    VoiceCall = apps.get_model("communications", "VoiceCall")
+
+    log_ids = (
+        VoiceCall.objects.values("log_id").annotate(rows=Count("id"))
+        .filter(rows__gt=1).values_list("log_id", flat=True)
+    )
+    for log_id in list(log_ids):
+        calls = list(VoiceCall.objects.filter(log_id=log_id).order_by("id"))
+        keep = next((call for call in calls if call.call_sid), calls[-1])
+        for call in calls:
+            if STATUS_RANK.get(call.status or "", -1) > STATUS_RANK.get(keep.status or "", -1):
+                keep.status = call.status
+            if call.started_at and (not keep.started_at or call.started_at < keep.started_at):
+                keep.started_at = call.started_at
+            if call.ended_at and (not keep.ended_at or call.ended_at > keep.ended_at):
+                keep.ended_at = call.ended_at
+            keep.recording_url = call.recording_url or keep.recording_url
+        VoiceCall.objects.filter(log_id=log_id).exclude(pk=keep.pk).delete()
+        keep.save()
+
+    # Old single rows never got a CallSid; later callbacks find them by it.
+    for call in VoiceCall.objects.filter(call_sid__isnull=True).iterator():
+        call_sid = CommunicationLog.objects.filter(pk=call.log_id).values_list("provider_id", flat=True).first()
+        if call_sid and not VoiceCall.objects.filter(call_sid=call_sid).exists():
+            VoiceCall.objects.filter(pk=call.pk).update(call_sid=call_sid)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0018_provider_event_retention'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_voice_calls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:45
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_unassigned_conversations(apps, schema_editor):
+    """Fold duplicate office-less threads per counterpart into the oldest one."""
+    Conversation = apps.get_model("communications", "Conversation")
+    CommunicationLog = apps.get_model("communications", "CommunicationLog")
+
+    unassigned = Conversation.objects.filter(office__isnull=True)
+    counterparts = (
+        unassigned.values("counterpart").annotate(rows=Count("id")).filter(rows__gt=1).values_list("counterpart", flat=True)
+    )
+    for counterpart in list(counterparts):
+        threads = list(unassigned.filter(counterpart=counterpart).order_by("created_at", "id"))
+        keep, duplicates = threads[0], threads[1:]
+        totals = unassigned.filter(counterpart=counterpart).aggregate(
+            messages=Sum("message_count"), unread=Sum("unread_count"),
+        )
+        keep.message_count, keep.unread_count = totals["messages"] or 0, totals["unread"] or 0
+        for thread in duplicates:
+            if thread.last_message_at and (not keep.last_message_at or thread.last_message_at > keep.last_message_at):
+                keep.last_message_at = thread.last_message_at
+                keep.last_message_preview = thread.last_message_preview
+                keep.last_direction = thread.last_direction
+                keep.last_log_id = thread.last_log_id
+            if thread.opted_out and not keep.opted_out:
+                keep.opted_out, keep.opted_out_at = True, thread.opted_out_at
+        ids = [thread.pk for thread in duplicates]
+        CommunicationLog.objects.filter(conversation_id__in=ids).update(conversation_id=keep.pk)
+        Conversation.objects.filter(pk__in=ids).delete()
+        keep.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0019_merge_duplicate_voice_calls'),
+        ('workspace', '0029_approval_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_unassigned_conversations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(condition=models.Q(('office__isnull', True)), fields=('counterpart',), name='uniq_unassigned_conversation'),
+        ),
+    ]
@@ -31,6 +31,110 @@ class CityLobbyChatMessage(models.Model):
         return f"[CityLobby: {self.city_lobby.city.city}] {self.user.username}: {self.content[:20]}"
 
 
+class Conversation(models.Model):
+    """
+    Thread of communications between an office and one external counterpart,
+    keyed by the normalized phone number (E.164) or lowercased email address.
+    Last-message and unread summaries are denormalized at ingest time so the
+    inbox list is a single index scan.
+    """
+    KIND_CHOICES = [("phone", "phone"), ("email", "email")]
+
+    office = models.ForeignKey("workspace.Office", on_delete=models.CASCADE, null=True, blank=True, related_name="conversations")
+    counterpart = models.CharField(max_length=254)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=200, blank=True)
+    last_direction = models.CharField(max_length=10, blank=True)
+    last_log = models.ForeignKey("CommunicationLog", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    message_count = models.PositiveIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+    opted_out = models.BooleanField(default=False)  # counterpart sent STOP; excluded from campaigns
+    opted_out_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["office", "counterpart"], name="uniq_conversation_counterpart"),
+            # NULLs never collide in the constraint above; unassigned threads need their own.
+            models.UniqueConstraint(
+                fields=["counterpart"], condition=models.Q(office__isnull=True), name="uniq_unassigned_conversation",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["office", "last_message_at"], name="conversation_recent_idx"),
+        ]
+
+    def __str__(self):
+        return f"Conversation({self.counterpart})"
+
+
+class OfficeAddress(models.Model):
+    """
+    A phone number or email address an office receives messages on.
+    Inbound webhooks look up the To number/address here to attribute the
+    message (and its conversation) to the office; see threads.resolve_office.
+    """
+    office = models.ForeignKey("workspace.Office", on_delete=models.CASCADE, related_name="comm_addresses")
+    kind = models.CharField(max_length=10, choices=Conversation.KIND_CHOICES)
+    address = models.CharField(max_length=254, unique=True)  # normalized like Conversation.counterpart
+
+    def save(self, *args, **kwargs):
+        from .threads import normalize_counterpart
+
+        kind, key = normalize_counterpart(self.address)
+        if key:
+            self.kind, self.address = kind, key
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.address} -> {self.office_id}"
+
+
+class Campaign(models.Model):
+    """
+    Bulk SMS/email send. Progress is tracked with aggregate counters updated
+    once per sent chunk, so polling a campaign is a single-row read.
+    """
+    CHANNEL_CHOICES = [("sms", "sms"), ("email", "email")]
+    STATUS_CHOICES = [
+        ("sending", "Sending"),
+        ("completed", "Completed"),
+    ]
+
+    office = models.ForeignKey("workspace.Office", on_delete=models.CASCADE, related_name="campaigns")
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    name = models.CharField(max_length=200, blank=True)
+    subject_template = models.CharField(max_length=400, blank=True)
+    body_template = models.TextField()
+    html_template = models.TextField(blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="sending")
+    total_count = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Campaign #{self.id} ({self.channel}, {self.sent_count}/{self.total_count})"
+
+
+class Blob(models.Model):
+    """
+    Stored media/attachment bytes, addressed by SHA-256. The file lives in
+    the blob store (see communications.blobstore); identical files are kept
+    once no matter how many messages reference them.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Blob {self.sha256[:12]} ({self.size} bytes)"
+
+
 class CommunicationLog(models.Model):
     OFFICE = "office"
     COMM_TYPES = [
@@ -38,26 +142,90 @@ class CommunicationLog(models.Model):
       ("sms","sms"),
       ("email","email"),
     ]
+    AI_STATUS_CHOICES = [
+        ("", "Not queued"),
+        ("pending", "Pending"),
+        ("processing", "Processing"),
+        ("done", "Done"),
+    ]
     office = models.ForeignKey("workspace.Office", on_delete=models.CASCADE, null=True, blank=True)
     type = models.CharField(max_length=10, choices=COMM_TYPES)
     direction = models.CharField(max_length=10, choices=[("inbound","inbound"),("outbound","outbound")])
-    provider_id = models.CharField(max_length=200, blank=True, null=True)
+    provider_id = models.CharField(max_length=200, blank=True, null=True, db_index=True)
     status = models.CharField(max_length=50, blank=True, null=True)
     payload = models.JSONField(default=dict)  # raw provider payload
     created_at = models.DateTimeField(auto_now_add=True)
     staff = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     visitor_identifier = models.CharField(max_length=200, blank=True, null=True)
+    conversation = models.ForeignKey(Conversation, on_delete=models.SET_NULL, null=True, blank=True, related_name="logs")
+    campaign = models.ForeignKey(Campaign, on_delete=models.SET_NULL, null=True, blank=True, related_name="logs")
+    ai_status = models.CharField(max_length=20, choices=AI_STATUS_CHOICES, blank=True, default="")
+    ai_claimed_at = models.DateTimeField(null=True, blank=True)  # when a batch moved it to processing
+    blobs = models.ManyToManyField(Blob, blank=True, related_name="logs")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["office", "created_at"], name="commlog_office_created_idx"),
+            models.Index(fields=["office", "type", "created_at"], name="commlog_office_type_idx"),
+            models.Index(fields=["conversation", "created_at"], name="commlog_conversation_idx"),
+            # Only the small set of logs waiting for (or in) AI classification.
+            models.Index(
+                fields=["office", "id"],
+                condition=models.Q(ai_status__in=["pending", "processing"]),
+                name="commlog_ai_pending_idx",
+            ),
+        ]
+        constraints = [
+            # Twilio sends several callbacks per CallSid; they must share one log.
+            models.UniqueConstraint(
+                fields=["provider_id"],
+                condition=models.Q(type="voice"),
+                name="uniq_voice_log_provider_id",
+            ),
+        ]
+
+class CommunicationLogPayload(models.Model):
+    """
+    Raw provider payload of a log, zlib-compressed JSON, kept out of the
+    log table so list queries and backups only carry the inline summary.
+    See communications.payloads.
+    """
+    log = models.OneToOneField(CommunicationLog, on_delete=models.CASCADE, primary_key=True, related_name="raw_payload")
+    source = models.CharField(max_length=50, blank=True)  # policy key, e.g. "twilio.sms"
+    data = models.BinaryField()
+    raw_size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Payload of log {self.log_id} ({len(self.data)}/{self.raw_size} bytes)"
+
 
 class SMSMessage(models.Model):
     log = models.ForeignKey(CommunicationLog, on_delete=models.CASCADE, related_name="sms_messages")
     from_number = models.CharField(max_length=100)
     to_number = models.CharField(max_length=100)
     body = models.TextField(blank=True)
-    media = models.JSONField(default=list)  # list of urls
+    media = models.JSONField(default=list)  # [{"url", "content_type", "blob_id", "sha256", "size"}]
     received_at = models.DateTimeField(auto_now_add=True)
 
 class VoiceCall(models.Model):
+    # Twilio call lifecycle; callbacks may arrive out of order, so a call only
+    # ever moves forward through these ranks.
+    STATUS_RANK = {
+        "queued": 0,
+        "initiated": 1,
+        "ringing": 2,
+        "in-progress": 3,
+        "completed": 4,
+        "busy": 4,
+        "no-answer": 4,
+        "canceled": 4,
+        "failed": 4,
+    }
+    TERMINAL_STATUSES = {"completed", "busy", "no-answer", "canceled", "failed"}
+
     log = models.ForeignKey(CommunicationLog, on_delete=models.CASCADE, related_name="voice_calls")
+    call_sid = models.CharField(max_length=64, unique=True, null=True, blank=True)
     from_number = models.CharField(max_length=100)
     to_number = models.CharField(max_length=100)
     status = models.CharField(max_length=50, blank=True, null=True)
@@ -65,6 +233,10 @@ class VoiceCall(models.Model):
     started_at = models.DateTimeField(null=True, blank=True)
     ended_at = models.DateTimeField(null=True, blank=True)
 
+    def can_transition_to(self, status):
+        current = self.STATUS_RANK.get(self.status or "", -1)
+        return self.STATUS_RANK.get(status, -1) > current
+
 class EmailMessage(models.Model):
     log = models.ForeignKey(CommunicationLog, on_delete=models.CASCADE, related_name="emails")
     from_email = models.CharField(max_length=200)
@@ -72,5 +244,134 @@ class EmailMessage(models.Model):
     subject = models.CharField(max_length=400, blank=True)
     body_text = models.TextField(blank=True)
     body_html = models.TextField(blank=True)
-    attachments = models.JSONField(default=list)
+    attachments = models.JSONField(default=list)  # [{"filename", "content_type", "blob_id", "sha256", "size"}]
+    received_at = models.DateTimeField(auto_now_add=True)
+
+
+class ProviderEvent(models.Model):
+    """
+    One row per webhook delivery we have already processed, keyed by the
+    provider's message/call id and the event type. The unique constraint is
+    what makes retried or duplicated callbacks idempotent.
+    """
+    provider = models.CharField(max_length=20)
+    provider_id = models.CharField(max_length=200)
+    event_type = models.CharField(max_length=50)
+    received_at = models.DateTimeField(auto_now_add=True, db_index=True)  # pruned after COMMS_PROVIDER_EVENT_RETENTION
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["provider", "provider_id", "event_type"],
+                name="uniq_provider_event",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.provider}:{self.provider_id}:{self.event_type}"
+
+
+class MessageStatusEvent(models.Model):
+    """
+    Delivery/engagement history of an outbound message, one compact row per
+    provider status callback (the raw callback body is not kept).
+    """
+    log = models.ForeignKey(CommunicationLog, on_delete=models.CASCADE, null=True, blank=True, related_name="status_events")
+    provider = models.CharField(max_length=20)
+    provider_id = models.CharField(max_length=200, blank=True)  # MessageSid / sg_message_id
+    status = models.CharField(max_length=20)  # normalized, see communications.delivery
+    raw_status = models.CharField(max_length=50, blank=True)
+    error_code = models.CharField(max_length=50, blank=True)
+    occurred_at = models.DateTimeField()
     received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["log", "occurred_at"], name="statusevent_log_idx"),
+            # Callbacks that beat the send task to saving the provider id.
+            models.Index(fields=["provider_id"], condition=models.Q(log__isnull=True), name="statusevent_orphan_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.provider}:{self.provider_id} {self.status}"
+
+
+class DeliveryStatRollup(models.Model):
+    """
+    Hourly count of status events per office, provider, channel and status,
+    bumped as callbacks arrive so dashboards never scan the logs.
+    """
+    office = models.ForeignKey("workspace.Office", on_delete=models.CASCADE, related_name="delivery_rollups")
+    provider = models.CharField(max_length=20)
+    channel = models.CharField(max_length=10)
+    status = models.CharField(max_length=20)
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["office", "bucket_start", "provider", "channel", "status"],
+                name="uniq_delivery_rollup",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.office_id} {self.bucket_start:%Y-%m-%d %H}:00 {self.provider}/{self.status}={self.count}"
+
+
+class NotificationPreference(models.Model):
+    """
+    How a staff member wants to be told about office events. WebSocket
+    delivery is always on; email and SMS are opt-in per user. Notifications
+    raised within ``digest_window`` seconds of each other are sent as one
+    digest.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notification_preference")
+    email_enabled = models.BooleanField(default=True)
+    sms_enabled = models.BooleanField(default=False)
+    phone = models.CharField(max_length=50, blank=True)
+    digest_window = models.PositiveIntegerField(null=True, blank=True)  # seconds; None = NOTIFY_DIGEST_WINDOW
+
+    def __str__(self):
+        return f"NotificationPreference({self.user_id})"
+
+
+class StaffNotification(models.Model):
+    EVENT_CHOICES = [
+        ("ticket_created", "Support ticket created"),
+        ("approval_pending", "Visitor approval pending"),
+        ("lead_escalated", "Sales lead escalated"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sending", "Sending"),
+        ("delivered", "Delivered"),
+        ("failed", "Failed"),  # NOTIFY_MAX_ATTEMPTS deliveries never got through
+    ]
+
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="staff_notifications")
+    office = models.ForeignKey("workspace.Office", on_delete=models.CASCADE, null=True, blank=True, related_name="staff_notifications")
+    event = models.CharField(max_length=30, choices=EVENT_CHOICES)
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    channels = models.JSONField(default=list, blank=True)  # channels the digest went out on
+    errors = models.JSONField(default=dict, blank=True)  # {channel: error}
+    digest_size = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)  # deliveries that reached no email/SMS (or no channel at all)
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)  # created_at -> delivered_at
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["recipient", "status", "id"], name="staffnotif_pending_idx"),
+            models.Index(fields=["recipient", "created_at"], name="staffnotif_recent_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.event} -> {self.recipient_id} ({self.status})"
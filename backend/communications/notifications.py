@@ -0,0 +1,230 @@
+"""
+Staff notifications (ticket created, visitor approval pending, lead
+escalated) delivered over WebSocket, email and SMS outside the request.
+
+``notify_staff`` only inserts rows; delivery is queued on commit. The first
+event for a recipient goes out right away and opens a digest window: events
+raised while the window is open are sent together when it closes, so a
+burst costs one email/SMS instead of one per event. The WebSocket push
+"succeeds" even with nobody listening, so a delivery only counts once an
+email or SMS went out (or the user has neither). Otherwise the
+notifications go back to pending and the channels that failed are retried
+with backoff, up to NOTIFY_MAX_ATTEMPTS deliveries, then marked failed.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import NotificationPreference, StaffNotification
+from .providers import get_twilio_client
+from .ratelimit import acquire_send_slot, backoff_delay
+
+KEY_PREFIX = "comms:notify"
+
+
+def digest_window(preference=None):
+    if preference and preference.digest_window is not None:
+        return preference.digest_window
+    return getattr(settings, "NOTIFY_DIGEST_WINDOW", 60)
+
+
+def max_attempts():
+    return getattr(settings, "NOTIFY_MAX_ATTEMPTS", 5)
+
+
+def user_group(user_id):
+    return f"notifications_user_{user_id}"
+
+
+def office_staff(office):
+    """Owner plus OWNER/MEMBER members of ``office`` (guests are not staff)."""
+    if office is None:
+        return get_user_model().objects.none()
+    return get_user_model().objects.filter(
+        Q(pk=office.owner_id) | Q(membership__office=office, membership__role__in=["OWNER", "MEMBER"]),
+        is_active=True,
+    ).distinct()
+
+
+def notify_staff(recipients, event, title, body="", office=None, data=None):
+    """
+    Record a notification for each recipient and queue delivery once the
+    surrounding transaction commits. Returns the created rows.
+    """
+    recipient_ids = {getattr(r, "pk", r) for r in recipients if r is not None}
+    if not recipient_ids:
+        return []
+    rows = StaffNotification.objects.bulk_create([
+        StaffNotification(
+            recipient_id=user_id, office=office, event=event, title=title[:200], body=body, data=data or {},
+        )
+        for user_id in sorted(recipient_ids)
+    ])
+    transaction.on_commit(lambda: [_schedule(user_id) for user_id in sorted(recipient_ids)])
+    return rows
+
+
+def _schedule(user_id):
+    from .tasks import deliver_staff_notifications
+
+    preference = NotificationPreference.objects.filter(user_id=user_id).first()
+    window = digest_window(preference)
+    if window <= 0 or cache.add(f"{KEY_PREFIX}:{user_id}:cooldown", 1, timeout=window):
+        deliver_staff_notifications.delay(user_id)
+    elif cache.add(f"{KEY_PREFIX}:{user_id}:scheduled", 1, timeout=window + 30):
+        deliver_staff_notifications.apply_async((user_id,), countdown=window)
+
+
+def release_schedule(user_id, window):
+    """Called when a delivery starts: reopen the window for the next burst."""
+    cache.delete(f"{KEY_PREFIX}:{user_id}:scheduled")
+    if window > 0:
+        cache.set(f"{KEY_PREFIX}:{user_id}:cooldown", 1, timeout=window)
+
+
+def claim_pending(user_id):
+    with transaction.atomic():
+        ids = list(
+            StaffNotification.objects.select_for_update(skip_locked=True)
+            .filter(recipient_id=user_id, status="pending")
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        StaffNotification.objects.filter(pk__in=ids).update(status="sending")
+    return list(StaffNotification.objects.filter(pk__in=ids).select_related("office").order_by("id"))
+
+
+def serialize(notification):
+    return {
+        "id": notification.id,
+        "event": notification.event,
+        "title": notification.title,
+        "body": notification.body,
+        "office_id": notification.office_id,
+        "data": notification.data,
+        "created_at": notification.created_at.isoformat(),
+    }
+
+
+def render_digest(notifications):
+    """(subject, text) for one notification or a digest of several."""
+    if len(notifications) == 1:
+        n = notifications[0]
+        return n.title, n.body or n.title
+    subject = f"{len(notifications)} new notifications"
+    lines = [f"- {n.title}" for n in notifications]
+    return subject, "\n".join([subject + ":", *lines])
+
+
+def _send_websocket(user, notifications):
+    async_to_sync(get_channel_layer().group_send)(
+        user_group(user.id),
+        {"type": "notification.digest", "notifications": [serialize(n) for n in notifications]},
+    )
+
+
+def _send_email(user, subject, text):
+    send_mail(
+        subject=subject,
+        message=text,
+        from_email=getattr(settings, "NOTIFY_FROM_EMAIL", settings.DEFAULT_FROM_EMAIL),
+        recipient_list=[user.email],
+    )
+
+
+def _send_sms(phone, subject, text):
+    sender = settings.TWILIO_PHONE_NUMBER
+    if acquire_send_slot("twilio", sender):
+        raise RuntimeError("throttled")
+    get_twilio_client().messages.create(from_=sender, to=phone, body=text[:1600])
+
+
+def deliver(user_id):
+    """Send every pending notification of ``user_id`` as one digest."""
+    user = get_user_model().objects.filter(pk=user_id).first()
+    preference = NotificationPreference.objects.filter(user_id=user_id).first()
+    release_schedule(user_id, digest_window(preference))
+    notifications = claim_pending(user_id)
+    if not notifications or user is None:
+        return 0
+
+    subject, text = render_digest(notifications)
+    senders = [("websocket", lambda: _send_websocket(user, notifications))]
+    if user.email and (preference is None or preference.email_enabled):
+        senders.append(("email", lambda: _send_email(user, subject, text)))
+    if preference and preference.sms_enabled and preference.phone:
+        senders.append(("sms", lambda: _send_sms(preference.phone, subject, text)))
+    # A retry only repeats the channels that failed for every notification in it.
+    reached = set.intersection(*(set(n.channels) for n in notifications))
+    senders = [(channel, send) for channel, send in senders if channel not in reached]
+
+    channels, errors = [], {}
+    for channel, send in senders:
+        try:
+            send()
+            channels.append(channel)
+        except Exception as e:
+            errors[channel] = str(e)
+
+    out_of_band = {channel for channel, _ in senders} - {"websocket"}
+    if (senders and not channels) or (out_of_band and not out_of_band & set(channels)):
+        return _failed(user_id, notifications, channels, errors)
+
+    delivered_at = timezone.now()
+    for n in notifications:
+        n.status = "delivered"
+        n.channels = [*n.channels, *(c for c in channels if c not in n.channels)]
+        n.errors = errors
+        n.digest_size = len(notifications)
+        n.delivered_at = delivered_at
+        n.latency_ms = max(int((delivered_at - n.created_at).total_seconds() * 1000), 0)
+    StaffNotification.objects.bulk_update(
+        notifications, ["status", "channels", "errors", "digest_size", "delivered_at", "latency_ms"],
+    )
+    return len(notifications)
+
+
+def _failed(user_id, notifications, channels, errors):
+    """
+    Nothing reached the user: remember the channels that did work, then
+    retry later or give up after max_attempts() deliveries.
+    """
+    from .tasks import deliver_staff_notifications
+
+    attempt = max(n.attempts for n in notifications) + 1
+    status = "failed" if attempt >= max_attempts() else "pending"
+    for n in notifications:
+        n.status = status
+        n.channels = [*n.channels, *(c for c in channels if c not in n.channels)]
+        n.errors = errors
+        n.attempts = attempt
+    StaffNotification.objects.bulk_update(notifications, ["status", "channels", "errors", "attempts"])
+    if status == "pending":
+        deliver_staff_notifications.apply_async((user_id,), countdown=backoff_delay(attempt))
+    return 0
+
+
+def latency_stats(queryset):
+    """count/avg/p50/p95/max delivery latency (ms) of delivered notifications."""
+    values = sorted(
+        queryset.filter(status="delivered", latency_ms__isnull=False)
+        .order_by("-id").values_list("latency_ms", flat=True)[:1000]
+    )
+    if not values:
+        return {"count": 0, "avg_ms": None, "p50_ms": None, "p95_ms": None, "max_ms": None}
+
+    def pct(p):
+        return values[min(len(values) - 1, int(p * len(values)))]
+
+    return {
+        "count": len(values),
+        "avg_ms": round(sum(values) / len(values), 1),
+        "p50_ms": pct(0.5),
+        "p95_ms": pct(0.95),
+        "max_ms": values[-1],
+    }
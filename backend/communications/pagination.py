@@ -0,0 +1,75 @@
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first keyset pagination on (<timestamp_field>, id).
+
+    The cursor encodes the position of the last row of the previous page, so
+    every page is one range scan on the (…, timestamp) index no matter how
+    deep the client has scrolled, and rows inserted meanwhile never shift
+    the pages already served.
+    """
+    timestamp_field = "created_at"
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        field = self.timestamp_field
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(f"-{field}", "-id")
+        position = self.decode_cursor(request)
+        if position:
+            ts, pk = position
+            queryset = queryset.filter(Q(**{f"{field}__lt": ts}) | Q(**{field: ts, "id__lt": pk}))
+
+        rows = list(queryset[: page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_position = (getattr(rows[-1], field), rows[-1].pk) if self.has_next else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.next_position:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def encode_cursor(self, position):
+        ts, pk = position
+        raw = f"{ts.isoformat()}|{pk}".encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            ts, pk = base64.urlsafe_b64decode(encoded.encode("ascii")).decode("utf-8").split("|")
+            ts = parse_datetime(ts)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound("Invalid cursor")
+        if ts is None:
+            raise NotFound("Invalid cursor")
+        return ts, pk
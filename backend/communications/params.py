@@ -0,0 +1,23 @@
+"""Query-parameter parsing shared by the comms API views and campaign queries."""
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def parse_bound(value, param, end=False):
+    """Parse an ISO datetime or date query param into an aware datetime.
+
+    A bare date used as an upper bound means "through the end of that day".
+    """
+    if not value:
+        return None
+    dt = parse_datetime(value)
+    if dt is None:
+        d = parse_date(value)
+        if d is None:
+            raise ValidationError({param: "Expected an ISO 8601 date or datetime."})
+        dt = datetime.combine(d + timedelta(days=1) if end else d, time.min)
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
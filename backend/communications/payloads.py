@@ -0,0 +1,95 @@
+"""
+Payload policy for CommunicationLog.
+
+Webhooks used to store the whole provider POST (for SendGrid including the
+full MIME headers) in ``CommunicationLog.payload``. Now each source has a
+policy in COMMS_PAYLOAD_POLICY: the whitelisted ``keep`` fields stay inline
+and the raw payload is either offloaded zlib-compressed to
+CommunicationLogPayload, dropped, or (legacy) kept inline.
+"""
+import json
+import zlib
+from django.conf import settings
+from .models import CommunicationLogPayload
+
+DEFAULT_POLICY = {
+    "twilio.sms": {
+        "keep": [
+            "MessageSid", "AccountSid", "MessagingServiceSid", "From", "To", "NumMedia", "NumSegments",
+            "SmsStatus", "FromCountry", "FromCity",
+        ],
+        "raw": "offload",
+    },
+    "sendgrid.inbound": {
+        "keep": ["from", "to", "cc", "subject", "spam_score", "SPF", "dkim", "sender_ip", "attachments"],
+        "raw": "offload",
+    },
+}
+
+RAW_MODES = ("offload", "drop", "inline")
+OFFLOADED = "_raw"  # inline marker: "offloaded" or "dropped"
+
+
+def get_policy(source):
+    policies = {**DEFAULT_POLICY, **getattr(settings, "COMMS_PAYLOAD_POLICY", {})}
+    policy = policies.get(source) or policies.get("default") or {"keep": None, "raw": "inline"}
+    if policy.get("raw", "offload") not in RAW_MODES:
+        raise ValueError(f"COMMS_PAYLOAD_POLICY[{source!r}]['raw'] must be one of {RAW_MODES}")
+    return policy
+
+
+def split_payload(source, raw):
+    """
+    Apply the policy for ``source`` to a raw payload dict.
+
+    Returns (inline, offload): the dict to store in CommunicationLog.payload
+    and the raw payload to compress into the side table (or None).
+    """
+    raw = raw or {}
+    policy = get_policy(source)
+    mode = policy.get("raw", "offload")
+    if mode == "inline":
+        return raw, None
+    keep = policy.get("keep") or []
+    inline = {k: raw[k] for k in keep if k in raw}
+    inline[OFFLOADED] = "offloaded" if mode == "offload" else "dropped"
+    return inline, (raw if mode == "offload" else None)
+
+
+def compress(raw):
+    data = json.dumps(raw, separators=(",", ":"), default=str).encode("utf-8")
+    return zlib.compress(data, getattr(settings, "COMMS_PAYLOAD_COMPRESSION_LEVEL", 6)), len(data)
+
+
+def offload_row(log, source, raw):
+    """Unsaved CommunicationLogPayload for ``log`` (for bulk_create)."""
+    data, size = compress(raw)
+    return CommunicationLogPayload(log=log, source=source, data=data, raw_size=size)
+
+
+def store_raw_payload(log, source, raw):
+    if raw is None:
+        return None
+    row = offload_row(log, source, raw)
+    row.save()
+    return row
+
+
+def load_raw_payload(log):
+    """The full provider payload of ``log``, wherever the policy put it."""
+    row = CommunicationLogPayload.objects.filter(log_id=log.pk).only("data").first()
+    if row is None:
+        return log.payload
+    return json.loads(zlib.decompress(bytes(row.data)))
+
+
+def detect_source(log):
+    """Policy key of a legacy log, from its type and the shape of its payload."""
+    payload = log.payload if isinstance(log.payload, dict) else {}
+    if log.direction != "inbound" or not payload or OFFLOADED in payload:
+        return None
+    if log.type == "sms" and "MessageSid" in payload:
+        return "twilio.sms"
+    if log.type == "email" and ("headers" in payload or "envelope" in payload):
+        return "sendgrid.inbound"
+    return None
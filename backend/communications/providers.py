@@ -0,0 +1,159 @@
+import os
+import threading
+from urllib.parse import urlsplit, urlunsplit
+import requests
+from requests.adapters import HTTPAdapter
+from celery.signals import worker_process_init
+from django.conf import settings
+from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+
+SENDGRID_DEFAULT_BASE_URL = "https://api.sendgrid.com"
+
+
+class ProviderHTTPError(Exception):
+    """Non-2xx answer from a provider API, with the response kept for inspection."""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.body = response.text
+        super().__init__(f"HTTP {response.status_code}: {response.text[:200]}")
+
+
+def build_session(pool_maxsize=None, max_retries=0):
+    """requests.Session with a bounded keep-alive pool for http and https."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=pool_maxsize or getattr(settings, "PROVIDER_HTTP_POOL_SIZE", 10),
+        max_retries=max_retries,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def rebase_url(url, base_url):
+    """Point an absolute provider URL at another host (e.g. a local stand-in)."""
+    if not base_url:
+        return url
+    base = urlsplit(base_url)
+    parts = urlsplit(url)
+    return urlunsplit((base.scheme, base.netloc, base.path.rstrip("/") + parts.path, parts.query, parts.fragment))
+
+
+class PooledTwilioHttpClient(TwilioHttpClient):
+    """TwilioHttpClient on a bounded keep-alive pool, optionally re-based to another host."""
+
+    def __init__(self, timeout=None, pool_maxsize=None, base_url=None):
+        super().__init__(pool_connections=True, timeout=timeout)
+        self.session = build_session(pool_maxsize)
+        self.base_url = base_url
+
+    def request(self, method, url, *args, **kwargs):
+        return super().request(method, rebase_url(url, self.base_url), *args, **kwargs)
+
+    @property
+    def last_response(self):
+        return self._test_only_last_response
+
+
+class SendGridSession:
+    """
+    Minimal SendGrid v3 Mail Send client on a pooled session.
+
+    SendGridAPIClient opens a new urllib connection (and TLS handshake) per
+    request; this posts the same ``Mail.get()`` body over keep-alive instead.
+    """
+
+    def __init__(self, api_key, timeout=None, pool_maxsize=None, base_url=None):
+        self.base_url = (base_url or SENDGRID_DEFAULT_BASE_URL).rstrip("/")
+        self.timeout = timeout
+        self.session = build_session(pool_maxsize)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        })
+
+    def send(self, message):
+        body = message.get() if hasattr(message, "get") else message
+        response = self.session.post(f"{self.base_url}/v3/mail/send", json=body, timeout=self.timeout)
+        if response.status_code >= 400:
+            raise ProviderHTTPError(response)
+        return response
+
+
+class ProviderClientRegistry:
+    """
+    Per-process registry of long-lived provider clients.
+
+    Clients are built lazily on first use and keyed by PID, so a Celery
+    prefork child never reuses sockets inherited from its parent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._clients = {}
+
+    def get(self, name, factory):
+        pid = os.getpid()
+        client = self._clients.get(name) if self._pid == pid else None
+        if client is not None:
+            return client
+        with self._lock:
+            if self._pid != pid:
+                self._clients = {}
+                self._pid = pid
+            client = self._clients.get(name)
+            if client is None:
+                client = self._clients[name] = factory()
+        return client
+
+    def reset(self):
+        with self._lock:
+            self._clients = {}
+            self._pid = None
+
+
+registry = ProviderClientRegistry()
+
+
+def _timeout():
+    return getattr(settings, "PROVIDER_HTTP_TIMEOUT", 10)
+
+
+def _build_twilio_client():
+    http_client = PooledTwilioHttpClient(
+        timeout=_timeout(),
+        base_url=getattr(settings, "TWILIO_API_BASE_URL", None),
+    )
+    return Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=http_client)
+
+
+def _build_sendgrid_client():
+    return SendGridSession(
+        settings.SENDGRID_API_KEY,
+        timeout=_timeout(),
+        base_url=getattr(settings, "SENDGRID_API_BASE_URL", None),
+    )
+
+
+def get_twilio_client():
+    return registry.get("twilio", _build_twilio_client)
+
+
+def get_sendgrid_client():
+    return registry.get("sendgrid", _build_sendgrid_client)
+
+
+def get_http_session():
+    """Shared pooled session for other provider calls (Paystack, media downloads)."""
+    return registry.get("http", build_session)
+
+
+@worker_process_init.connect
+def _reset_after_fork(**kwargs):
+    registry.reset()
@@ -0,0 +1,213 @@
+import random
+import time
+from django.conf import settings
+from django.core.cache import caches
+from twilio.base.exceptions import TwilioRestException
+from .providers import ProviderHTTPError
+
+# Sliding-window limits: each limit keeps a counter per window of ``per``
+# seconds and weighs the previous window by how much of it still overlaps
+# the last ``per`` seconds, so no burst across a window edge exceeds
+# ``rate``. With a shared cache (Redis in production) every worker counts
+# against the same windows; add/incr/decr are atomic there.
+DEFAULT_RATE_LIMITS = {
+    "twilio": {"rate": 100, "per": 1},
+    "twilio_sender": {"rate": 1, "per": 1},  # long-code numbers: ~1 msg/s each
+    "sendgrid": {"rate": 50, "per": 1},
+}
+
+KEY_PREFIX = "comms:ratelimit"
+
+
+def _cache():
+    return caches[getattr(settings, "COMMS_RATE_LIMIT_CACHE", "default")]
+
+
+def _limits(name):
+    limits = {**DEFAULT_RATE_LIMITS, **getattr(settings, "COMMS_RATE_LIMITS", {})}
+    return limits.get(name)
+
+
+def _incr(key, delta=1, timeout=None):
+    cache = _cache()
+    cache.add(key, 0, timeout=timeout)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Expired between add() and incr(): start a fresh window.
+        cache.add(key, delta, timeout=timeout)
+        return delta
+
+
+def _window(name, limits, now):
+    """(current window key, previous window key, elapsed fraction of the current window)."""
+    per = limits["per"]
+    position = now / per
+    window = int(position)
+    return f"{KEY_PREFIX}:{name}:{window}", f"{KEY_PREFIX}:{name}:{window - 1}", position - window
+
+
+def _wait(limits, used, previous, elapsed):
+    """0 if one more request fits in the sliding window, else seconds until it does."""
+    rate, per = limits["rate"], limits["per"]
+    if previous * (1 - elapsed) + used + 1 <= rate:
+        return 0
+    if used + 1 > rate or not previous:
+        return (1 - elapsed) * per  # wait for the next window
+    # The previous window's weight must drop to (rate - 1 - used) / previous.
+    return max((1 - (rate - 1 - used) / previous - elapsed) * per, 0.001)
+
+
+def acquire_send_slot(provider, sender=None):
+    """
+    Reserve capacity for one provider request.
+
+    Returns 0 when the request may go out now, otherwise the number of
+    seconds to wait. Every limit that applies (the sender's, then the
+    provider-wide one) is checked before any is counted, so a request held
+    back by a busy number does not use up the provider-wide budget.
+    """
+    cache = _cache()
+    now = time.time()
+    paused_until = cache.get(f"{KEY_PREFIX}:{provider}:paused_until")
+    if paused_until and paused_until > now:
+        return paused_until - now
+
+    checks = []
+    if sender and _limits(f"{provider}_sender"):
+        checks.append((f"{provider}_sender:{sender}", _limits(f"{provider}_sender")))
+    if _limits(provider):
+        checks.append((provider, _limits(provider)))
+    windows = [(limits, *_window(name, limits, now)) for name, limits in checks]
+    counts = cache.get_many([key for _, current, previous, _ in windows for key in (current, previous)])
+    for limits, current, previous, elapsed in windows:
+        wait = _wait(limits, counts.get(current, 0), counts.get(previous, 0), elapsed)
+        if wait:
+            record_throttle(provider, wait)
+            return wait
+
+    taken = []
+    for limits, current, previous, elapsed in windows:
+        used = _incr(current, timeout=int(2 * limits["per"]) + 1)
+        taken.append(current)
+        if counts.get(previous, 0) * (1 - elapsed) + used > limits["rate"]:
+            # Another worker got there first: give back what this request took.
+            for key in taken:
+                try:
+                    cache.decr(key)
+                except ValueError:
+                    pass
+            wait = _wait(limits, used - 1, counts.get(previous, 0), elapsed)
+            record_throttle(provider, wait)
+            return wait
+    return 0
+
+
+def pause_provider(provider, seconds):
+    """Stop all workers from calling ``provider`` for ``seconds`` (e.g. after a 429)."""
+    if seconds > 0:
+        _cache().set(f"{KEY_PREFIX}:{provider}:paused_until", time.time() + seconds, timeout=int(seconds) + 1)
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))."""
+    base = getattr(settings, "COMMS_RETRY_BASE_DELAY", 5)
+    cap = getattr(settings, "COMMS_RETRY_MAX_DELAY", 600)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _parse_retry_after(value):
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def throttled_retry_after(exc, http_client=None):
+    """
+    For a provider 429, the seconds asked for by ``Retry-After`` (0 if absent).
+    Returns None when ``exc`` is not a throttling error.
+
+    Twilio exceptions do not carry headers, so the last response of the
+    (pooled) HTTP client is consulted instead.
+    """
+    if isinstance(exc, ProviderHTTPError) and exc.status_code == 429:
+        headers = exc.headers or {}
+    elif isinstance(exc, TwilioRestException) and exc.status == 429:
+        response = getattr(http_client, "last_response", None)
+        headers = getattr(response, "headers", None) or {}
+    else:
+        return None
+    return _parse_retry_after(headers.get("Retry-After")) or 0
+
+
+def retry_countdown(provider, exc, attempt, http_client=None):
+    """
+    Countdown before retrying a failed send. Throttling pauses the provider
+    for every worker and never retries sooner than ``Retry-After``.
+    """
+    delay = backoff_delay(attempt)
+    retry_after = throttled_retry_after(exc, http_client)
+    if retry_after is not None:
+        pause_provider(provider, retry_after)
+        record_throttle(provider, retry_after)
+        delay = retry_after + delay
+    return delay
+
+
+def wait_for_send_slot(task, provider, sender=None):
+    """
+    Gate a Celery send task on the provider rate limits.
+
+    Returns True when the task was deferred (re-enqueued with a countdown,
+    without consuming a retry) and the caller should return. Eager tasks
+    (tests, local dev) sleep instead.
+    """
+    while True:
+        wait = acquire_send_slot(provider, sender)
+        if not wait:
+            return False
+        # Jitter spreads deferred tasks so they do not all return at the same moment.
+        wait += random.uniform(0, 1)
+        if task.request.is_eager:
+            time.sleep(wait)
+            continue
+        task.apply_async(args=task.request.args, kwargs=task.request.kwargs, countdown=wait)
+        return True
+
+
+def defer(task, countdown):
+    """Re-enqueue the running task invocation after ``countdown`` seconds."""
+    if task.request.is_eager:
+        time.sleep(countdown)
+    task.apply_async(args=task.request.args, kwargs=task.request.kwargs, countdown=countdown)
+
+
+def record_throttle(provider, wait):
+    _incr(f"{KEY_PREFIX}:stats:{provider}:throttled")
+    _incr(f"{KEY_PREFIX}:stats:{provider}:throttle_wait_ms", int(wait * 1000))
+
+
+def record_sent(provider, queue_waits):
+    """Record sends and how long each message sat queued (seconds)."""
+    if not queue_waits:
+        return
+    _incr(f"{KEY_PREFIX}:stats:{provider}:sent", len(queue_waits))
+    _incr(f"{KEY_PREFIX}:stats:{provider}:queue_wait_ms", int(sum(queue_waits) * 1000))
+
+
+def provider_stats(provider):
+    cache = _cache()
+    keys = ["throttled", "throttle_wait_ms", "sent", "queue_wait_ms"]
+    values = cache.get_many([f"{KEY_PREFIX}:stats:{provider}:{k}" for k in keys])
+    stats = {k: values.get(f"{KEY_PREFIX}:stats:{provider}:{k}", 0) for k in keys}
+    paused_until = cache.get(f"{KEY_PREFIX}:{provider}:paused_until") or 0
+    return {
+        "sent": stats["sent"],
+        "avg_queue_wait_seconds": round(stats["queue_wait_ms"] / stats["sent"] / 1000, 3) if stats["sent"] else 0,
+        "throttled": stats["throttled"],
+        "avg_throttle_wait_seconds": (
+            round(stats["throttle_wait_ms"] / stats["throttled"] / 1000, 3) if stats["throttled"] else 0
+        ),
+        "paused_for_seconds": round(max(paused_until - time.time(), 0), 3),
+    }
@@ -1,5 +1,5 @@
 from django.urls import re_path
-from .consumers import RoomChatConsumer, CityLobbyChatConsumer, PresenceConsumer, CityPresenceConsumer, PublicPresenceConsumer
+from .consumers import RoomChatConsumer, CityLobbyChatConsumer, PresenceConsumer, CityPresenceConsumer, PublicPresenceConsumer, NotificationConsumer, ApprovalQueueConsumer
 
 websocket_urlpatterns = [
     re_path(r"ws/chat/office/(?P<room_id>\d+)/$", RoomChatConsumer.as_asgi()),
@@ -9,4 +9,7 @@ websocket_urlpatterns = [
     re_path(r"ws/presence/city/(?P<city_id>\d+)/$", CityPresenceConsumer.as_asgi()),
     
     re_path(r"ws/public/offices/(?P<slug>[^/]+)/presence/$", PublicPresenceConsumer.as_asgi()),
+
+    re_path(r"ws/notifications/$", NotificationConsumer.as_asgi()),
+    re_path(r"ws/approvals/office/(?P<office_id>\d+)/$", ApprovalQueueConsumer.as_asgi()),
 ]
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import RoomChatMessage, CityLobbyChatMessage, CommunicationLog, SMSMessage, VoiceCall, EmailMessage
+from .models import RoomChatMessage, CityLobbyChatMessage, CommunicationLog, SMSMessage, VoiceCall, EmailMessage, Conversation, Campaign, StaffNotification
 
 
 
@@ -40,3 +40,114 @@ class CommunicationLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = CommunicationLog
         fields = "__all__"
+
+
+# -------------------------------
+# INBOX (lightweight, explicit fields)
+# -------------------------------
+class InboxSMSSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SMSMessage
+        fields = ["id", "from_number", "to_number", "body", "media", "received_at"]
+
+class InboxVoiceCallSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VoiceCall
+        fields = ["id", "call_sid", "from_number", "to_number", "status", "recording_url", "started_at", "ended_at"]
+
+class InboxEmailSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EmailMessage
+        fields = ["id", "from_email", "to_emails", "subject", "body_text", "body_html", "attachments", "received_at"]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.context.get("include_payload"):
+            fields.pop("body_html", None)
+        return fields
+
+class CommunicationInboxSerializer(serializers.ModelSerializer):
+    """
+    Inbox row. Heavy columns (raw provider ``payload`` and email HTML bodies)
+    are only rendered when the view sets ``include_payload`` in the context.
+    """
+    sms_messages = InboxSMSSerializer(many=True, read_only=True)
+    voice_calls = InboxVoiceCallSerializer(many=True, read_only=True)
+    emails = InboxEmailSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = CommunicationLog
+        fields = [
+            "id", "office", "type", "direction", "provider_id", "status", "payload",
+            "created_at", "staff", "visitor_identifier",
+            "sms_messages", "voice_calls", "emails",
+        ]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.context.get("include_payload"):
+            fields.pop("payload", None)
+        return fields
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Conversation
+        fields = [
+            "id", "office", "counterpart", "kind", "last_message_at", "last_message_preview",
+            "last_direction", "last_log", "message_count", "unread_count",
+        ]
+
+
+# -------------------------------
+# CAMPAIGNS
+# -------------------------------
+class CampaignCreateSerializer(serializers.Serializer):
+    """
+    Campaign request. ``recipients`` entries are a phone number / email or an
+    object with ``to`` plus template variables; ``query`` selects recipients
+    from office data, e.g. {"source": "visitor_submissions", "room": 3}.
+    Templates use ``$name`` placeholders ($name, $office, $to and any
+    recipient keys).
+    """
+    office_id = serializers.IntegerField()
+    channel = serializers.ChoiceField(choices=Campaign.CHANNEL_CHOICES)
+    name = serializers.CharField(required=False, allow_blank=True, default="")
+    subject = serializers.CharField(required=False, allow_blank=True, default="")
+    body = serializers.CharField()
+    body_html = serializers.CharField(required=False, allow_blank=True, default="")
+    recipients = serializers.ListField(child=serializers.JSONField(), required=False, default=list)
+    query = serializers.DictField(required=False)
+
+    def validate(self, attrs):
+        if not attrs.get("recipients") and not attrs.get("query"):
+            raise serializers.ValidationError("Provide recipients or query.")
+        if attrs["channel"] == "email" and not attrs.get("subject"):
+            raise serializers.ValidationError({"subject": "Required for email campaigns."})
+        return attrs
+
+
+class CampaignSerializer(serializers.ModelSerializer):
+    pending_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Campaign
+        fields = [
+            "id", "office", "channel", "name", "status", "total_count", "sent_count",
+            "failed_count", "pending_count", "created_at", "completed_at",
+        ]
+
+    def get_pending_count(self, obj):
+        return max(obj.total_count - obj.sent_count - obj.failed_count, 0)
+
+
+# -------------------------------
+# STAFF NOTIFICATIONS
+# -------------------------------
+class StaffNotificationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StaffNotification
+        fields = [
+            "id", "event", "title", "body", "office", "data", "status", "channels", "digest_size",
+            "created_at", "delivered_at", "latency_ms", "read_at",
+        ]
@@ -0,0 +1,340 @@
+"""
+Local stand-in for the provider APIs we call, for offline load tests.
+
+Implements the subset we use: Twilio Messages create, SendGrid v3 Mail
+Send and Paystack transaction verify. Latency, error rate and a per-provider
+rate limit (answered with 429 + Retry-After, like the real APIs) are
+configurable. Twilio status callbacks are posted back signed with the auth
+token, and SendGrid events signed with an ECDSA key generated per
+stand-in (``sendgrid_public_key``), so our webhook handlers can be
+exercised end to end.
+
+    with ProviderStandIn(StandInConfig(latency=0.05)).activate() as standin:
+        ...  # get_twilio_client() / get_sendgrid_client() / Paystack now hit it
+
+or run it standalone with ``manage.py run_provider_standin``.
+"""
+import base64
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import requests
+from django.conf import settings
+from django.test import override_settings
+from django.utils import timezone
+from twilio.request_validator import RequestValidator
+from .providers import registry
+
+TWILIO_MESSAGES_RE = re.compile(r"^/2010-04-01/Accounts/(?P<account_sid>[^/]+)/Messages\.json$")
+SENDGRID_SEND_PATH = "/v3/mail/send"
+PAYSTACK_VERIFY_RE = re.compile(r"^/transaction/verify/(?P<reference>[^/?]+)$")
+
+
+@dataclass
+class StandInConfig:
+    latency: float = 0.0  # seconds added to every response
+    jitter: float = 0.0  # +/- seconds, uniform
+    error_rate: float = 0.0  # share of requests answered with a 500
+    rate_limit: float = 0.0  # requests/second per provider; 0 = unlimited
+    retry_after: int = 1  # Retry-After sent with 429s
+    paystack_status: str = "success"  # data.status returned by verify
+    status_callbacks: list = field(default_factory=lambda: ["sent", "delivered"])
+    callback_delay: float = 0.0  # seconds before each status callback
+    sendgrid_event_url: str = None  # where to post (signed) SendGrid event webhooks
+    sendgrid_events: list = field(default_factory=lambda: ["processed", "delivered"])
+    auth_token: str = None  # signs Twilio callbacks; default settings.TWILIO_AUTH_TOKEN
+    seed: int = None
+
+
+class _Bucket:
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def sign_twilio_request(url, params, auth_token=None):
+    """X-Twilio-Signature for a form POST to ``url``."""
+    return RequestValidator(auth_token or settings.TWILIO_AUTH_TOKEN).compute_signature(url, params)
+
+
+class ProviderStandIn:
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or StandInConfig()
+        self.host = host
+        self.port = port
+        self.server = None
+        self.counts = Counter()  # (provider, status_code) -> requests
+        self.requests = []  # (provider, path, body) of every request, in order
+        self.callbacks = []  # (url, params, status_code) of posted status callbacks
+        self._random = random.Random(self.config.seed)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._event_key = None
+
+    # -- lifecycle ----------------------------------------------------
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.server.server_address[1]}"
+
+    def _make_server(self):
+        handler = type("Handler", (_Handler,), {"standin": self})
+        server = ThreadingHTTPServer((self.host, self.port), handler)
+        server.daemon_threads = True
+        return server
+
+    def start(self):
+        self.server = self._make_server()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def serve_forever(self):
+        """Blocking variant used by the management command."""
+        self.server = self._make_server()
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def settings_overrides(self):
+        return {
+            "TWILIO_API_BASE_URL": self.base_url,
+            "SENDGRID_API_BASE_URL": self.base_url,
+            "PAYSTACK_API_BASE_URL": self.base_url,
+        }
+
+    @contextmanager
+    def activate(self):
+        """Start the server and point the provider clients at it."""
+        started = self.server is None
+        if started:
+            self.start()
+        registry.reset()
+        try:
+            with override_settings(**self.settings_overrides()):
+                yield self
+        finally:
+            registry.reset()
+            if started:
+                self.stop()
+
+    # -- behaviour ----------------------------------------------------
+    def _gate(self, provider):
+        """(status, headers, body) to answer instead of the normal response, or None."""
+        config = self.config
+        if config.latency or config.jitter:
+            with self._lock:
+                jitter = self._random.uniform(-config.jitter, config.jitter) if config.jitter else 0
+            time.sleep(max(0.0, config.latency + jitter))
+
+        if config.rate_limit:
+            with self._lock:
+                bucket = self._buckets.setdefault(provider, _Bucket(config.rate_limit))
+            if not bucket.take():
+                headers = {"Retry-After": str(config.retry_after)}
+                return 429, headers, {"code": 20429, "message": "Too Many Requests", "status": 429}
+
+        if config.error_rate:
+            with self._lock:
+                failed = self._random.random() < config.error_rate
+            if failed:
+                return 500, {}, {"code": 20500, "message": "Internal Server Error", "status": 500}
+        return None
+
+    def handle(self, method, path, body):
+        """Route one request; returns (provider, status, headers, json_body or None)."""
+        path = urlsplit(path).path
+        match = TWILIO_MESSAGES_RE.match(path)
+        if method == "POST" and match:
+            provider = "twilio"
+        elif method == "POST" and path == SENDGRID_SEND_PATH:
+            provider = "sendgrid"
+        elif method == "GET" and PAYSTACK_VERIFY_RE.match(path):
+            provider = "paystack"
+        else:
+            return "unknown", 404, {}, {"message": "Not found", "status": 404}
+
+        with self._lock:
+            self.requests.append((provider, path, body))
+        gated = self._gate(provider)
+        if gated:
+            return (provider, *gated)
+
+        if provider == "twilio":
+            return (provider, 201, {}, self._twilio_message(match.group("account_sid"), body))
+        if provider == "sendgrid":
+            message_id = uuid.uuid4().hex
+            if self.config.sendgrid_event_url and self.config.sendgrid_events:
+                threading.Thread(target=self._post_sendgrid_events, args=(message_id, body), daemon=True).start()
+            return provider, 202, {"X-Message-Id": message_id}, None
+        reference = PAYSTACK_VERIFY_RE.match(path).group("reference")
+        return provider, 200, {}, {
+            "status": True,
+            "message": "Verification successful",
+            "data": {"status": self.config.paystack_status, "reference": reference, "amount": 0},
+        }
+
+    def _twilio_message(self, account_sid, body):
+        form = parse_qs(body.decode())
+        params = {k: v[-1] for k, v in form.items()}
+        sid = "SM" + uuid.uuid4().hex
+        callback = params.get("StatusCallback")
+        if callback and self.config.status_callbacks:
+            threading.Thread(
+                target=self._post_status_callbacks, args=(callback, sid, account_sid, params), daemon=True,
+            ).start()
+        return {
+            "sid": sid,
+            "account_sid": account_sid,
+            "to": params.get("To"),
+            "from": params.get("From"),
+            "body": params.get("Body", ""),
+            "status": "queued",
+            "num_segments": "1",
+            "num_media": str(len(form.get("MediaUrl", []))),
+            "direction": "outbound-api",
+            "date_created": timezone.now().strftime("%a, %d %b %Y %H:%M:%S +0000"),
+            "uri": f"/2010-04-01/Accounts/{account_sid}/Messages/{sid}.json",
+        }
+
+    def _post_status_callbacks(self, url, sid, account_sid, message):
+        for status in self.config.status_callbacks:
+            if self.config.callback_delay:
+                time.sleep(self.config.callback_delay)
+            params = {
+                "MessageSid": sid,
+                "SmsSid": sid,
+                "AccountSid": account_sid,
+                "MessageStatus": status,
+                "SmsStatus": status,
+                "To": message.get("To", ""),
+                "From": message.get("From", ""),
+            }
+            signature = sign_twilio_request(url, params, self.config.auth_token)
+            try:
+                code = requests.post(url, data=params, headers={"X-Twilio-Signature": signature}, timeout=10).status_code
+            except requests.RequestException:
+                code = None
+            with self._lock:
+                self.callbacks.append((url, params, code))
+
+
+    # -- SendGrid event webhook -----------------------------------------
+    def _signing_key(self):
+        from cryptography.hazmat.primitives.asymmetric import ec
+
+        with self._lock:
+            if self._event_key is None:
+                self._event_key = ec.generate_private_key(ec.SECP256R1())
+            return self._event_key
+
+    @property
+    def sendgrid_public_key(self):
+        """Base64 DER public key for SENDGRID_EVENT_WEBHOOK_PUBLIC_KEY."""
+        from cryptography.hazmat.primitives import serialization
+
+        der = self._signing_key().public_key().public_bytes(
+            serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        return base64.b64encode(der).decode()
+
+    def sign_sendgrid_events(self, body, timestamp):
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec
+
+        signature = self._signing_key().sign(timestamp.encode() + body, ec.ECDSA(hashes.SHA256()))
+        return base64.b64encode(signature).decode()
+
+    def _post_sendgrid_events(self, message_id, body):
+        try:
+            mail = json.loads(body or b"{}")
+        except ValueError:
+            return
+        for name in self.config.sendgrid_events:
+            if self.config.callback_delay:
+                time.sleep(self.config.callback_delay)
+            events = []
+            for i, personalization in enumerate(mail.get("personalizations") or []):
+                for to in personalization.get("to") or []:
+                    events.append({
+                        **(personalization.get("custom_args") or {}),
+                        "email": to.get("email"),
+                        "event": name,
+                        "timestamp": int(time.time()),
+                        "sg_message_id": f"{message_id}.standin.{i}",
+                        "sg_event_id": uuid.uuid4().hex,
+                    })
+            payload = json.dumps(events).encode()
+            timestamp = str(int(time.time()))
+            headers = {
+                "Content-Type": "application/json",
+                "X-Twilio-Email-Event-Webhook-Signature": self.sign_sendgrid_events(payload, timestamp),
+                "X-Twilio-Email-Event-Webhook-Timestamp": timestamp,
+            }
+            try:
+                code = requests.post(self.config.sendgrid_event_url, data=payload, headers=headers, timeout=10).status_code
+            except requests.RequestException:
+                code = None
+            with self._lock:
+                self.callbacks.append((self.config.sendgrid_event_url, events, code))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # allow keep-alive
+    disable_nagle_algorithm = True
+    standin = None
+
+    def _respond(self, method):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        provider, status, headers, payload = self.standin.handle(method, self.path, body)
+        with self.standin._lock:
+            self.standin.counts[(provider, status)] += 1
+        data = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if payload is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self._respond("POST")
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def log_message(self, *args):
+        pass
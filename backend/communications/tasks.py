@@ -1,47 +1,72 @@
+import time
+from html import escape
+from string import Template
 from celery import shared_task
 from django.conf import settings
-from twilio.rest import Client
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from django.utils import timezone
+from sendgrid.helpers.mail import CustomArg, Mail, Personalization, Substitution, To
 from aistaff.services.ai_secretary import AIOfficeAssistant
-from .models import CommunicationLog
+from aistaff.services.intent_router import LLM, get_intent_router, record_route
+from aistaff.services.llm import get_llm_backend
+from .models import Campaign, CommunicationLog, SMSMessage
+from .blobstore import BlobTooLarge, blob_ref, ingest_url
+from .campaigns import record_chunk_result, render, set_opted_out
+from .delivery import attach_orphan_events, status_callback_url
+from .classify import batch_size as classify_batch_size, claim_pending_logs, release_schedule
+from .threads import attach_to_conversation
+from .providers import get_twilio_client, get_sendgrid_client, get_http_session
+from .ratelimit import (
+    acquire_send_slot, backoff_delay, defer, record_sent, retry_countdown, throttled_retry_after, wait_for_send_slot,
+)
+
+
+def _queue_wait(log):
+    return (timezone.now() - log.created_at).total_seconds()
 
 
 # ---------------------------------------------------------------------
 # 📞 SMS Sending
 # ---------------------------------------------------------------------
-@shared_task(bind=True, max_retries=3)
+@shared_task(bind=True, max_retries=5)
 def send_sms_task(self, log_id, to, body, media=None):
     """Send outbound SMS via Twilio"""
     log = CommunicationLog.objects.get(pk=log_id)
-    client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+    if wait_for_send_slot(self, "twilio", settings.TWILIO_PHONE_NUMBER):
+        return
+    client = get_twilio_client()
     try:
         msg = client.messages.create(
-            from_=settings.TWILIO_NUMBER,
+            from_=settings.TWILIO_PHONE_NUMBER,
             to=to,
             body=body,
             media_url=media or None,
+            status_callback=status_callback_url(),
         )
         log.provider_id = msg.sid
         log.status = "sent"
         log.payload = {**(log.payload or {}), "twilio_sid": msg.sid}
         log.save(update_fields=["provider_id", "status", "payload"])
+        attach_orphan_events("twilio", [log])
+        record_sent("twilio", [_queue_wait(log)])
     except Exception as e:
         log.status = "error"
         log.payload = {**(log.payload or {}), "error": str(e)}
         log.save(update_fields=["status", "payload"])
-        raise self.retry(exc=e, countdown=30)
+        countdown = retry_countdown("twilio", e, self.request.retries, client.http_client)
+        raise self.retry(exc=e, countdown=countdown)
 
 
 # ---------------------------------------------------------------------
 # 📧 Email Sending
 # ---------------------------------------------------------------------
-@shared_task(bind=True, max_retries=2)
+@shared_task(bind=True, max_retries=5)
 def send_email_task(self, log_id, to_emails, subject, body_text, body_html=None):
     """Send outbound email via SendGrid"""
     log = CommunicationLog.objects.get(pk=log_id)
+    if wait_for_send_slot(self, "sendgrid"):
+        return
     try:
-        sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
+        sg = get_sendgrid_client()
         mail = Mail(
             from_email=settings.DEFAULT_FROM_EMAIL,
             to_emails=to_emails,
@@ -49,56 +74,191 @@ def send_email_task(self, log_id, to_emails, subject, body_text, body_html=None)
             plain_text_content=body_text,
             html_content=body_html,
         )
+        mail.personalizations[0].add_custom_arg(CustomArg("log_id", str(log.id)))  # echoed in event webhooks
         res = sg.send(mail)
         msg_id = getattr(getattr(res, "headers", {}), "get", lambda *_: "")("X-Message-Id", "")
         log.provider_id = msg_id
         log.status = "sent"
         log.payload = {**(log.payload or {}), "status_code": getattr(res, "status_code", 200)}
         log.save(update_fields=["provider_id", "status", "payload"])
+        attach_orphan_events("sendgrid", [log])
+        record_sent("sendgrid", [_queue_wait(log)])
     except Exception as e:
         log.status = "error"
         log.payload = {**(log.payload or {}), "error": str(e)}
         log.save(update_fields=["status", "payload"])
-        raise self.retry(exc=e, countdown=60)
+        raise self.retry(exc=e, countdown=retry_countdown("sendgrid", e, self.request.retries))
 
 
 # ---------------------------------------------------------------------
-# 🤖 AI Office Assistant Auto-Reply
+# 📎 Inbound MMS Media
 # ---------------------------------------------------------------------
-@shared_task
-def classify_and_autoreply(log_id):
+@shared_task(bind=True, max_retries=5)
+def ingest_sms_media(self, sms_id):
     """
-    Automatically classify and respond to inbound communications (SMS/Email)
-    using the AIOfficeAssistant logic.
+    Stream an inbound MMS's media from Twilio into the blob store and point
+    SMSMessage.media at the stored blobs. Already stored items are skipped,
+    so retries only fetch what is missing.
     """
-    log = CommunicationLog.objects.get(pk=log_id)
-    payload = log.payload or {}
-    print("DEBUG >> Using AIOfficeAssistant:", AIOfficeAssistant)
-    print("DEBUG: running classify_and_autoreply for log", log_id)    # --- Extract incoming text safely ---
-    text = ""
-    if log.type == "sms":
-        sms_rel = getattr(log, "sms_messages", None)
-        if sms_rel and sms_rel.exists():
-            text = sms_rel.first().body
-    elif log.type == "email":
-        email_rel = getattr(log, "emails", None)
-        if email_rel and email_rel.exists():
-            text = email_rel.first().body_text or ""
+    sms = SMSMessage.objects.select_related("log").get(pk=sms_id)
+    session = get_http_session()
+    auth = (settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+    media, blobs, failed = [], [], None
+    for item in sms.media:
+        if isinstance(item, str):
+            item = {"url": item, "content_type": "", "blob_id": None}
+        if item.get("blob_id") or item.get("error") or not item.get("url"):
+            media.append(item)
+            continue
+        try:
+            blob = ingest_url(session, item["url"], auth=auth, timeout=settings.PROVIDER_HTTP_TIMEOUT)
+        except BlobTooLarge:
+            media.append({**item, "error": "too_large"})
+            continue
+        except Exception as e:
+            failed = e
+            media.append(item)
+            continue
+        blobs.append(blob)
+        media.append(blob_ref(blob, url=item["url"], content_type=item.get("content_type") or blob.content_type))
 
-    if not text:
-        log.payload = {**payload, "auto_reply_status": "no_text_found"}
-        log.save(update_fields=["payload"])
-        return
+    SMSMessage.objects.filter(pk=sms.pk).update(media=media)
+    if blobs:
+        sms.log.blobs.add(*blobs)
+    if failed is not None:
+        raise self.retry(exc=failed, countdown=backoff_delay(self.request.retries))
 
-    # --- Run the AI Office Assistant ---
-    ai = AIOfficeAssistant(
-        org={"name": getattr(log.office, "name", "My Office")},
-        user=getattr(log.staff, "name", "Staff"),
-        context={"source": log.type},
+
+# ---------------------------------------------------------------------
+# 📣 Campaign Chunks
+# ---------------------------------------------------------------------
+def _sendgrid_tokens(*templates):
+    """Identifiers used by the templates, mapped to SendGrid substitution tags."""
+    names = []
+    for template in templates:
+        for name in Template(template or "").get_identifiers():
+            if name not in names:
+                names.append(name)
+    return {name: f"-{name}-" for name in names}
+
+
+def _send_sms_chunk(campaign, logs):
+    """
+    Send each SMS of the chunk. Returns the logs that were attempted and,
+    if throttled before the end, the seconds to wait before the rest; the
+    chunk is re-enqueued for them rather than sleeping in the worker.
+    """
+    client = get_twilio_client()
+    sender = settings.TWILIO_PHONE_NUMBER
+    done = []
+    for log in logs:
+        wait = acquire_send_slot("twilio", sender)
+        if wait:
+            return done, wait
+        try:
+            msg = client.messages.create(
+                from_=sender,
+                to=log.payload["to"],
+                body=render(campaign.body_template, log.payload["vars"]),
+                status_callback=status_callback_url(),
+            )
+            log.provider_id = msg.sid
+            log.status = "sent"
+        except Exception as e:
+            if throttled_retry_after(e, client.http_client) is not None:
+                return done, retry_countdown("twilio", e, 0, client.http_client)
+            log.status = "error"
+            log.payload = {**log.payload, "error": str(e)}
+        done.append(log)
+    return done, 0
+
+
+def _send_email_chunk(campaign, logs):
+    """One SendGrid request for the whole chunk, one personalization per recipient."""
+    wait = acquire_send_slot("sendgrid")
+    if wait:
+        return [], wait
+
+    tokens = _sendgrid_tokens(campaign.subject_template, campaign.body_template)
+    # The HTML part gets its own tags so its values can be escaped.
+    html_tokens = {name: f"-{name}_html-" for name in _sendgrid_tokens(campaign.html_template)}
+    mail = Mail(
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        subject=Template(campaign.subject_template).safe_substitute(tokens),
+        plain_text_content=Template(campaign.body_template).safe_substitute(tokens),
+        html_content=Template(campaign.html_template).safe_substitute(html_tokens) or None,
     )
-    decision = ai.classify_or_reply(text)
-    
-    #---- Normalize the decision ----
+    for log in logs:
+        variables = log.payload["vars"]
+        personalization = Personalization()
+        personalization.add_to(To(log.payload["to"], variables.get("name") or None))
+        for name, tag in tokens.items():
+            personalization.add_substitution(Substitution(tag, variables.get(name, f"${name}")))
+        for name, tag in html_tokens.items():
+            personalization.add_substitution(Substitution(tag, escape(variables.get(name, f"${name}"))))
+        personalization.add_custom_arg(CustomArg("log_id", str(log.id)))
+        mail.add_personalization(personalization, index=len(mail.personalizations or []))
+
+    try:
+        res = get_sendgrid_client().send(mail)
+    except Exception as e:
+        if throttled_retry_after(e) is not None:
+            return [], retry_countdown("sendgrid", e, 0)
+        for log in logs:
+            log.status = "error"
+            log.payload = {**log.payload, "error": str(e)}
+        return logs, 0
+    msg_id = getattr(getattr(res, "headers", {}), "get", lambda *_: "")("X-Message-Id", "")
+    for log in logs:
+        log.provider_id = msg_id
+        log.status = "sent"
+    return logs, 0
+
+
+@shared_task(bind=True)
+def send_campaign_chunk(self, campaign_id, log_ids):
+    """
+    Send one chunk of a campaign and add its outcome to the campaign counters.
+
+    Only logs still queued are sent, so a redelivered or deferred chunk does
+    not message recipients twice. When the provider throttles, the sent part
+    is recorded and the chunk re-enqueues itself for the remainder.
+    """
+    campaign = Campaign.objects.get(pk=campaign_id)
+    logs = list(CommunicationLog.objects.filter(pk__in=log_ids, campaign=campaign, status="queued").order_by("id"))
+    if not logs:
+        return
+    if campaign.channel == "email":
+        done, wait = _send_email_chunk(campaign, logs)
+    else:
+        done, wait = _send_sms_chunk(campaign, logs)
+
+    if done:
+        CommunicationLog.objects.bulk_update(done, ["provider_id", "status", "payload"], batch_size=500)
+        attach_orphan_events("sendgrid" if campaign.channel == "email" else "twilio", done)
+        sent = [log for log in done if log.status == "sent"]
+        record_chunk_result(campaign.id, len(sent), len(done) - len(sent))
+        record_sent("sendgrid" if campaign.channel == "email" else "twilio", [_queue_wait(log) for log in sent])
+    if wait:
+        defer(self, wait)
+
+
+# ---------------------------------------------------------------------
+# 🤖 AI Office Assistant Auto-Reply
+# ---------------------------------------------------------------------
+def _inbound_text(log):
+    """Text of an inbound SMS/email log (works with prefetched relations)."""
+    if log.type == "sms":
+        sms = next(iter(log.sms_messages.all()), None)
+        return sms.body if sms else ""
+    if log.type == "email":
+        email = next(iter(log.emails.all()), None)
+        return (email.body_text or "") if email else ""
+    return ""
+
+
+def _dispatch_decision(log, decision):
+    """Send the reply an AI decision asks for and record the outcome on the log."""
     action = None
     reply_body = ""
     # --- Interpret AI Decision ---
@@ -107,45 +267,40 @@ def classify_and_autoreply(log_id):
     elif isinstance(decision, dict):
         action = decision.get("action")
         reply_body = decision.get("text") or decision.get("message", "")
-    else:
-        reply_body = ""
-    
-    # Abort if action is mossing or unrecognized
-    allowed_actions ={"reply_sms", "reply_email"}
+
+    # "reply" answers on the channel the message came in on
+    if action == "reply":
+        action = f"reply_{log.type}"
+
+    # Abort if action is missing or unrecognized
+    allowed_actions = {"reply_sms", "reply_email"}
     if action not in allowed_actions:
-        log.playload = {**payload, "auto_reply_status": f"ignor_action_{action or 'none'}"}
-        log.save(update_fields=["payload"])
-        return
-    
-    if not reply_body:
-        log.payload = {**payload, "auto_reply_status": "no_reply_generated"}
-        log.save(update_fields=["payload"])
-        return
+        status = f"ignored_action_{action or 'none'}"
+    elif not reply_body:
+        status = "no_reply_generated"
+    else:
+        status = "reply_sent"
 
-    # --- Handle SMS Replies ---
-    if action == "reply_sms" and log.type == "sms":
-        sms_rel = getattr(log, "sms_messages", None)
-        if sms_rel and sms_rel.exists():
-            from_number = sms_rel.first().from_number
-            new_log = CommunicationLog.objects.create(
-                office=log.office,
-                type="sms",
-                direction="outbound",
-                status="queued",
-                payload={"reply_to": log.id, "text": reply_body},
-            )
-            send_sms_task.delay(new_log.id, from_number, reply_body)
+        # --- Handle SMS Replies ---
+        if action == "reply_sms" and log.type == "sms":
+            sms = next(iter(log.sms_messages.all()), None)
+            if sms:
+                new_log = CommunicationLog.objects.create(
+                    office=log.office,
+                    type="sms",
+                    direction="outbound",
+                    status="queued",
+                    payload={"reply_to": log.id, "text": reply_body},
+                )
+                attach_to_conversation(new_log, sms.from_number, reply_body)
+                send_sms_task.delay(new_log.id, sms.from_number, reply_body)
 
-    # --- Handle Email Replies ---
-    elif action == "reply_rmail" and log.type == "email":
-        email_rel = (
-            getattr(log, "emails", None) or getattr(log, "emails_messages", None)
-        )
-        if email_rel and email_rel.exists():
-            email_obj = email_rel.first()
+        # --- Handle Email Replies ---
+        elif action == "reply_email" and log.type == "email":
+            email_obj = next(iter(log.emails.all()), None)
             from_email = getattr(email_obj, "from_email", None)
-            subject = f"Re: {getattr(email_obj, 'subject', 'Your message')}"
             if from_email:
+                subject = f"Re: {email_obj.subject or 'Your message'}"
                 new_log = CommunicationLog.objects.create(
                     office=log.office,
                     type="email",
@@ -153,8 +308,143 @@ def classify_and_autoreply(log_id):
                     status="queued",
                     payload={"reply_to": log.id, "text": reply_body},
                 )
-            send_email_task.delay(new_log.id, [from_email], subject, reply_body)
+                attach_to_conversation(new_log, from_email, subject)
+                send_email_task.delay(new_log.id, [from_email], subject, reply_body)
+
+    return _mark_done(log, status)
+
+
+def _mark_done(log, status):
+    log.payload = {**(log.payload or {}), "auto_reply_status": status}
+    log.ai_status = "done"
+    log.save(update_fields=["payload", "ai_status"])
+    return status
+
+
+def _office_org(log):
+    return {"name": getattr(log.office, "name", "My Office")}
+
+
+def _route_locally(log, text):
+    """
+    Try the local intent router first. Handles the message (reply, STOP or
+    START) when the intent is clear and returns the route either way.
+    """
+    route = get_intent_router().route(text, office=log.office, channel=log.type)
+    if not route.handled:
+        return route
+
+    if route.action in ("opt_out", "opt_in"):
+        opted_out = route.action == "opt_out"
+        if log.conversation_id:
+            set_opted_out(log.conversation_id, opted_out)
+        # No reply: Twilio answers STOP/START itself and blocks sends after STOP.
+        log.payload = {**(log.payload or {}), "auto_reply_status": "opted_out" if opted_out else "opted_in"}
+        log.ai_status = "done"
+        log.save(update_fields=["payload", "ai_status"])
+    else:
+        _dispatch_decision(log, {"action": "reply", "text": route.reply})
+    record_route(log.office_id, log.type, route.intent, route.elapsed_ms)
+    return route
+
+
+@shared_task
+def classify_and_autoreply(log_id):
+    """
+    Automatically classify and respond to one inbound communication
+    (SMS/Email) using the AIOfficeAssistant logic. Bursts should go through
+    classify.queue_for_classification, which batches per office.
+    """
+    log = CommunicationLog.objects.get(pk=log_id)
+    text = _inbound_text(log)
+    if not text:
+        _mark_done(log, "no_text_found")
+        return
+
+    route = _route_locally(log, text)
+    if route.handled:
+        return
+    if get_llm_backend() is None:
+        _mark_done(log, "ai_disabled")
+        return
+
+    ai = AIOfficeAssistant(org=_office_org(log), staff_user=log.staff)
+    started = time.perf_counter()
+    decision = ai.classify_or_reply(text)
+    record_route(log.office_id, log.type, LLM, route.elapsed_ms, (time.perf_counter() - started) * 1000)
+    _dispatch_decision(log, decision)
+
+
+@shared_task
+def classify_pending_batch(office_id):
+    """
+    Classify pending inbound logs of one office with one model call per
+    COMMS_CLASSIFY_BATCH_SIZE logs, then dispatch the replies.
+    """
+    release_schedule(office_id)
+    size = classify_batch_size()
+    logs = claim_pending_logs(office_id, size)
+    if not logs:
+        return
+
+    messages = []
+    router_ms = {}
+    ai_enabled = get_llm_backend() is not None
+    for log in logs:
+        text = _inbound_text(log)
+        if not text:
+            _mark_done(log, "no_text_found")
+            continue
+        route = _route_locally(log, text)
+        if route.handled:
+            continue
+        if not ai_enabled:
+            _mark_done(log, "ai_disabled")
+            continue
+        messages.append({"id": log.id, "channel": log.type, "text": text})
+        router_ms[log.id] = route.elapsed_ms
+
+    if messages:
+        ai = AIOfficeAssistant(org=_office_org(logs[0]))
+        started = time.perf_counter()
+        decisions = ai.classify_batch(messages)
+        llm_ms = (time.perf_counter() - started) * 1000 / len(messages)
+        by_id = {log.id: log for log in logs}
+        for message in messages:
+            log = by_id[message["id"]]
+            record_route(log.office_id, log.type, LLM, router_ms[log.id], llm_ms)
+            _dispatch_decision(log, decisions.get(message["id"]))
+
+    if len(logs) == size:
+        # A full batch: more may be waiting behind it.
+        classify_pending_batch.delay(office_id)
+
+
+# ---------------------------------------------------------------------
+# 🔔 Staff notifications
+# ---------------------------------------------------------------------
+@shared_task
+def deliver_staff_notifications(user_id):
+    """Send a user's pending staff notifications as one digest."""
+    from .notifications import deliver
+
+    return deliver(user_id)
+
+
+# ---------------------------------------------------------------------
+# 🧹 Housekeeping (scheduled in virtual_office.celery)
+# ---------------------------------------------------------------------
+@shared_task
+def reschedule_stuck_classifications():
+    """Re-run classification for offices whose claimed or pending logs were left behind."""
+    from .classify import reschedule_stuck
+
+    return len(reschedule_stuck())
+
+
+@shared_task
+def prune_provider_events():
+    """Drop webhook dedup markers older than the provider retry window."""
+    from .dedup import prune_provider_events as prune
 
-    # --- Mark success ---
-    log.payload = {**payload, "auto_reply_status": "reply_sent"}
-    log.save(update_fields=["payload"])
+    return prune()
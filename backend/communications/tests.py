@@ -1,16 +1,35 @@
-from django.test import TestCase, override_settings
+import json
+import tempfile
+import time
+from datetime import timedelta
 from unittest.mock import patch, MagicMock
 
-from communications.models import CommunicationLog, SMSMessage, EmailMessage
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from aistaff.services.llm import FakeLLMBackend, set_llm_backend
+from communications.dedup import recent_events
+from communications.models import (
+    Blob, Campaign, CommunicationLog, CommunicationLogPayload, Conversation, DeliveryStatRollup, EmailMessage,
+    MessageStatusEvent, OfficeAddress, SMSMessage, StaffNotification, VoiceCall,
+)
 from communications.tasks import classify_and_autoreply
+from virtual_office.testing import make_office
+from workspace.models import Membership, Office, Room
 
 
 @override_settings(
     CELERY_TASK_ALWAYS_EAGER=True,
     CELERY_TASK_EAGER_PROPAGATES=True,
+    AI_LLM_BACKEND="fake",
 )
 class TestClassifyAndAutoReply(TestCase):
     def setUp(self):
+        set_llm_backend(None)
+        self.addCleanup(set_llm_backend, None)
         # --- Create inbound SMS ---
         self.sms_log = CommunicationLog.objects.create(
             type="sms",
@@ -130,3 +149,813 @@ class TestClassifyAndAutoReply(TestCase):
 
         mock_send_sms.assert_not_called()
         mock_send_email.assert_not_called()
+
+
+class TestWebhookDeduplication(TestCase):
+    def setUp(self):
+        recent_events.clear()
+
+    @patch("communications.webhooks.RequestValidator")
+    def test_retried_sms_webhook_creates_single_log(self, mock_validator):
+        mock_validator.return_value.validate.return_value = True
+        data = {"MessageSid": "SM123", "From": "+15550001111", "To": "+15550002222", "Body": "hi"}
+
+        for _ in range(3):
+            res = self.client.post("/api/comms/webhook/twilio/sms/", data)
+            self.assertEqual(res.status_code, 200)
+
+        self.assertEqual(CommunicationLog.objects.filter(provider_id="SM123").count(), 1)
+        self.assertEqual(SMSMessage.objects.count(), 1)
+
+    def test_call_status_callbacks_upsert_one_voice_call(self):
+        base = {"CallSid": "CA1", "From": "+15550001111", "To": "+15550002222"}
+        for status in ["ringing", "in-progress", "ringing", "completed", "completed"]:
+            self.client.post("/api/comms/webhook/twilio/call/", {**base, "CallStatus": status})
+
+        self.assertEqual(CommunicationLog.objects.filter(provider_id="CA1").count(), 1)
+        call = VoiceCall.objects.get(call_sid="CA1")
+        self.assertEqual(VoiceCall.objects.count(), 1)
+        # the late "ringing" callback must not move the call backwards
+        self.assertEqual(call.status, "completed")
+        self.assertIsNotNone(call.started_at)
+        self.assertIsNotNone(call.ended_at)
+        self.assertEqual(call.log.status, "completed")
+
+    @override_settings(COMMS_PROVIDER_EVENT_RETENTION=3600)
+    def test_expired_markers_are_pruned(self):
+        from communications.dedup import is_duplicate_event
+        from communications.models import ProviderEvent
+        from communications.tasks import prune_provider_events
+
+        is_duplicate_event("twilio", "SM-old", "sms.inbound")
+        is_duplicate_event("twilio", "SM-new", "sms.inbound")
+        ProviderEvent.objects.filter(provider_id="SM-old").update(received_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(prune_provider_events(), 1)
+        self.assertEqual(list(ProviderEvent.objects.values_list("provider_id", flat=True)), ["SM-new"])
+
+
+class TestCommunicationInbox(TestCase):
+    def setUp(self):
+        self.user, self.office = make_office("staff")
+        for i in range(5):
+            log = CommunicationLog.objects.create(
+                office=self.office, type="sms", direction="inbound", status="received",
+                payload={"raw": "x" * 100},
+            )
+            SMSMessage.objects.create(log=log, from_number="+1555000", to_number="+1555999", body=f"msg {i}")
+
+    def get(self, **params):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.get("/api/comms/inbox/", {"office_id": self.office.id, **params})
+
+    def test_keyset_pages_cover_all_rows_without_payload(self):
+        seen = []
+        res = self.get(page_size=2)
+        while True:
+            self.assertEqual(res.status_code, 200)
+            for row in res.data["results"]:
+                self.assertNotIn("payload", row)
+                seen.append(row["id"])
+            if not res.data["next"]:
+                break
+            from urllib.parse import parse_qs, urlparse
+
+            cursor = parse_qs(urlparse(res.data["next"]).query)["cursor"][0]
+            res = self.get(page_size=2, cursor=cursor)
+
+        expected = list(CommunicationLog.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_include_payload_and_filters(self):
+        res = self.get(include_payload=1, direction="inbound", type="sms")
+        self.assertEqual(len(res.data["results"]), 5)
+        self.assertIn("payload", res.data["results"][0])
+        self.assertEqual(len(res.data["results"][0]["sms_messages"]), 1)
+
+        self.assertEqual(len(self.get(direction="outbound").data["results"]), 0)
+
+    def test_requires_membership(self):
+        _, other = make_office("x", name="Other")
+        self.assertEqual(self.get(office_id=other.id).status_code, 404)
+
+    def test_rejects_non_numeric_office(self):
+        self.assertEqual(self.get(office_id="abc").status_code, 400)
+
+
+class TestConversationThreading(TestCase):
+    def test_normalization(self):
+        from communications.threads import normalize_counterpart
+
+        self.assertEqual(normalize_counterpart("+1 (555) 000-1111"), ("phone", "+15550001111"))
+        self.assertEqual(normalize_counterpart("whatsapp:+15550001111"), ("phone", "+15550001111"))
+        self.assertEqual(normalize_counterpart("Jane <Jane.Doe@Example.COM>"), ("email", "jane.doe@example.com"))
+
+    def setUp(self):
+        recent_events.clear()
+        self.user, self.office = make_office("staff")
+
+    @patch("communications.webhooks.RequestValidator")
+    def test_inbound_and_outbound_share_thread_with_summary(self, mock_validator):
+        from communications.threads import attach_to_conversation
+
+        mock_validator.return_value.validate.return_value = True
+        OfficeAddress.objects.create(office=self.office, address="+1 555 000 2222")
+        self.client.post(
+            "/api/comms/webhook/twilio/sms/",
+            {"MessageSid": "SM1", "From": "+1 555 000 1111", "To": "+15550002222", "Body": "hello"},
+        )
+        inbound = CommunicationLog.objects.get(provider_id="SM1")
+        self.assertEqual(inbound.office, self.office)
+        outbound = CommunicationLog.objects.create(office=self.office, type="sms", direction="outbound", status="queued")
+        attach_to_conversation(outbound, "+15550001111", "hi back")
+
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.office, self.office)
+        self.assertEqual(conversation.counterpart, "+15550001111")
+        self.assertEqual(conversation.message_count, 2)
+        self.assertEqual(conversation.unread_count, 1)
+        self.assertEqual(conversation.last_message_preview, "hi back")
+        self.assertEqual(conversation.last_direction, "outbound")
+        self.assertEqual(conversation.last_log_id, outbound.id)
+        self.assertEqual(set(conversation.logs.values_list("id", flat=True)), {inbound.id, outbound.id})
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        listed = client.get("/api/comms/conversations/", {"office_id": self.office.id}).data["results"]
+        self.assertEqual([c["id"] for c in listed], [conversation.id])
+
+    @patch("communications.webhooks.RequestValidator")
+    def test_message_to_unregistered_number_stays_unassigned(self, mock_validator):
+        from communications.threads import attach_to_conversation
+
+        mock_validator.return_value.validate.return_value = True
+        outbound = CommunicationLog.objects.create(office=self.office, type="sms", direction="outbound", status="sent")
+        attach_to_conversation(outbound, "+15550001111", "hi")
+        for sid in ("SM2", "SM3"):
+            self.client.post(
+                "/api/comms/webhook/twilio/sms/",
+                {"MessageSid": sid, "From": "+15550001111", "To": "+15550009999", "Body": "thanks"},
+            )
+        # Not delivered to the office that last talked to the sender, and one unassigned thread.
+        self.assertIsNone(CommunicationLog.objects.get(provider_id="SM2").office)
+        self.assertEqual(Conversation.objects.get(office=self.office).message_count, 1)
+        self.assertEqual(Conversation.objects.get(office__isnull=True).message_count, 2)
+
+    @patch("communications.webhooks.RequestValidator")
+    def test_stop_through_webhook_excludes_campaign_recipient(self, mock_validator):
+        from communications.campaigns import resolve_recipients
+
+        mock_validator.return_value.validate.return_value = True
+        OfficeAddress.objects.create(office=self.office, address="+15550002222")
+        sms = {"From": "+15550001111", "To": "+15550002222"}
+        self.client.post("/api/comms/webhook/twilio/sms/", {**sms, "MessageSid": "SM3", "Body": "STOP"})
+        # An unattributable STOP (unknown number, no history) still counts for every office.
+        self.client.post(
+            "/api/comms/webhook/twilio/sms/",
+            {"MessageSid": "SM4", "From": "+15550003333", "To": "+15550009999", "Body": "stop"},
+        )
+
+        recipients = ["+15550001111", "+15550003333", "+15550004444"]
+        self.assertEqual([r["to"] for r in resolve_recipients(self.office, "sms", recipients)], ["+15550004444"])
+
+        self.client.post("/api/comms/webhook/twilio/sms/", {**sms, "MessageSid": "SM5", "Body": "START"})
+        self.assertEqual(
+            [r["to"] for r in resolve_recipients(self.office, "sms", recipients)], ["+15550001111", "+15550004444"],
+        )
+        # A START sent to the office lifts the earlier unattributed STOP too.
+        self.client.post(
+            "/api/comms/webhook/twilio/sms/",
+            {"MessageSid": "SM6", "From": "+15550003333", "To": "+15550002222", "Body": "START"},
+        )
+        self.assertEqual(len(resolve_recipients(self.office, "sms", recipients)), 3)
+
+
+class TestProviderClientRegistry(TestCase):
+    def test_clients_are_reused_until_reset(self):
+        from communications.providers import ProviderClientRegistry, rebase_url
+
+        registry = ProviderClientRegistry()
+        built = []
+        factory = lambda: built.append(object()) or built[-1]
+
+        first = registry.get("twilio", factory)
+        self.assertIs(registry.get("twilio", factory), first)
+        registry.reset()  # what worker_process_init does after fork
+        self.assertIsNot(registry.get("twilio", factory), first)
+        self.assertEqual(len(built), 2)
+
+        self.assertEqual(
+            rebase_url("https://api.twilio.com/2010-04-01/Accounts/AC1/Messages.json", "http://127.0.0.1:9000"),
+            "http://127.0.0.1:9000/2010-04-01/Accounts/AC1/Messages.json",
+        )
+
+
+@override_settings(COMMS_CAMPAIGN_CHUNK_SIZE=2, COMMS_RATE_LIMITS={"twilio_sender": {"rate": 100, "per": 1}})
+class TestCampaigns(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user, self.office = make_office("staff")
+
+    def post(self, data):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = client.post("/api/comms/campaigns/", {"office_id": self.office.id, **data}, format="json")
+        return client, res
+
+    @patch("communications.tasks.get_sendgrid_client")
+    def test_email_campaign_uses_one_request_per_chunk(self, mock_sg):
+        mock_sg.return_value.send.return_value = MagicMock(status_code=202, headers={"X-Message-Id": "sg-1"})
+        client, res = self.post({
+            "channel": "email",
+            "subject": "Hi $name",
+            "body": "See you at $office",
+            "recipients": [
+                {"to": "a@example.com", "name": "Ann"}, "B@example.com", "b@example.com", "c@example.com",
+            ],
+        })
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.data["total_count"], 3)  # duplicate b@ dropped
+
+        # 3 recipients in chunks of 2 -> 2 SendGrid calls
+        self.assertEqual(mock_sg.return_value.send.call_count, 2)
+        body = mock_sg.return_value.send.call_args_list[0].args[0].get()
+        self.assertEqual(body["subject"], "Hi -name-")
+        self.assertEqual(body["personalizations"][0]["substitutions"], {"-name-": "Ann", "-office-": "HQ"})
+
+        detail = client.get(f"/api/comms/campaigns/{res.data['id']}/").data
+        self.assertEqual((detail["status"], detail["sent_count"], detail["pending_count"]), ("completed", 3, 0))
+        self.assertEqual(CommunicationLog.objects.filter(campaign_id=res.data["id"], provider_id="sg-1").count(), 3)
+
+    @patch("communications.tasks.get_sendgrid_client")
+    def test_html_substitutions_are_escaped(self, mock_sg):
+        mock_sg.return_value.send.return_value = MagicMock(status_code=202, headers={"X-Message-Id": "sg-1"})
+        self.post({
+            "channel": "email", "subject": "Hi $name", "body": "Hi $name", "body_html": "<p>Hi $name</p>",
+            "recipients": [{"to": "a@example.com", "name": "<script>x</script>"}],
+        })
+        body = mock_sg.return_value.send.call_args.args[0].get()
+        substitutions = body["personalizations"][0]["substitutions"]
+        self.assertEqual(substitutions["-name-"], "<script>x</script>")
+        self.assertEqual(substitutions["-name_html-"], "&lt;script&gt;x&lt;/script&gt;")
+
+    def test_malformed_query_range_is_rejected(self):
+        _, res = self.post({
+            "channel": "email", "subject": "Hi", "body": "Hi",
+            "query": {"source": "visitor_submissions", "since": "yesterday"},
+        })
+        self.assertEqual(res.status_code, 400)
+
+    @override_settings(COMMS_RATE_LIMITS={"twilio_sender": {"rate": 1, "per": 60}})
+    @patch("communications.tasks.defer")
+    @patch("communications.tasks.get_twilio_client")
+    def test_throttled_chunk_is_requeued_not_slept(self, mock_twilio, mock_defer):
+        mock_twilio.return_value.messages.create.return_value = MagicMock(sid="SM1")
+        with patch("time.sleep") as sleep:
+            _, res = self.post({"channel": "sms", "body": "Hi", "recipients": ["+15550001", "+15550002"]})
+        sleep.assert_not_called()
+        self.assertEqual(mock_twilio.return_value.messages.create.call_count, 1)
+        self.assertGreater(mock_defer.call_args.args[1], 0)
+        self.assertEqual(CommunicationLog.objects.filter(campaign_id=res.data["id"], status="queued").count(), 1)
+
+    @patch("communications.tasks.get_twilio_client")
+    def test_sms_campaign_counts_failures(self, mock_twilio):
+        mock_twilio.return_value.messages.create.side_effect = [MagicMock(sid="SM1"), Exception("bad number")]
+        client, res = self.post({"channel": "sms", "body": "Reminder for $name", "recipients": ["+15550001", "+15550002"]})
+
+        campaign = Campaign.objects.get(pk=res.data["id"])
+        self.assertEqual((campaign.status, campaign.sent_count, campaign.failed_count), ("completed", 1, 1))
+        self.assertEqual(Conversation.objects.filter(office=self.office, message_count=1).count(), 2)
+
+        metrics = client.get("/api/comms/send-metrics/", {"office_id": self.office.id}).data
+        self.assertEqual(metrics["queued"], {})
+        self.assertEqual(metrics["providers"]["twilio"]["sent"], 1)
+
+
+@override_settings(COMMS_RATE_LIMITS={"twilio": {"rate": 3, "per": 60}, "twilio_sender": {"rate": 2, "per": 60}})
+class TestSendScheduler(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_buckets_per_sender_and_provider(self):
+        from communications.ratelimit import acquire_send_slot, provider_stats
+
+        self.assertEqual(acquire_send_slot("twilio", "+1555"), 0)
+        self.assertEqual(acquire_send_slot("twilio", "+1555"), 0)
+        self.assertGreater(acquire_send_slot("twilio", "+1555"), 0)  # sender bucket empty
+        self.assertEqual(acquire_send_slot("twilio", "+1666"), 0)
+        self.assertGreater(acquire_send_slot("twilio", "+1777"), 0)  # provider bucket empty
+        self.assertEqual(provider_stats("twilio")["throttled"], 2)
+
+    def test_denied_sender_does_not_spend_provider_budget(self):
+        from communications.ratelimit import acquire_send_slot
+
+        for _ in range(5):
+            acquire_send_slot("twilio", "+1555")  # 2 allowed, then the sender limit
+        self.assertEqual(acquire_send_slot("twilio", "+1666"), 0)
+        self.assertGreater(acquire_send_slot("twilio", "+1777"), 0)
+
+    def test_no_double_burst_across_window_edge(self):
+        from communications.ratelimit import acquire_send_slot
+
+        with patch("communications.ratelimit.time.time", return_value=59.0):
+            allowed = [acquire_send_slot("twilio") for _ in range(3)]
+        with patch("communications.ratelimit.time.time", return_value=61.0):
+            self.assertGreater(acquire_send_slot("twilio"), 0)
+        with patch("communications.ratelimit.time.time", return_value=100.0):
+            self.assertEqual(acquire_send_slot("twilio"), 0)  # 3 * 20/60 + 0 + 1 <= 3
+        self.assertEqual(allowed, [0, 0, 0])
+
+    def test_429_honors_retry_after_and_pauses_provider(self):
+        from twilio.base.exceptions import TwilioRestException
+        from communications.providers import ProviderHTTPError
+        from communications.ratelimit import acquire_send_slot, retry_countdown
+
+        http_client = MagicMock()
+        http_client.last_response.headers = {"Retry-After": "30"}
+        exc = TwilioRestException(429, "https://api.twilio.com/x", "Too Many Requests")
+        self.assertGreaterEqual(retry_countdown("twilio", exc, 0, http_client), 30)
+        self.assertGreater(acquire_send_slot("twilio"), 25)
+
+        error = ProviderHTTPError(MagicMock(status_code=500, headers={}, text="boom"))
+        for attempt in range(12):
+            self.assertLessEqual(retry_countdown("sendgrid", error, attempt), 600)
+        self.assertEqual(acquire_send_slot("sendgrid"), 0)
+
+
+@override_settings(COMMS_CLASSIFY_BATCH_SIZE=2)
+class TestBatchedClassification(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.llm = FakeLLMBackend()
+        set_llm_backend(self.llm)
+        self.addCleanup(set_llm_backend, None)
+        _, self.office = make_office()
+
+    @patch("communications.tasks.send_sms_task.delay")
+    def test_burst_is_classified_in_batches(self, mock_send_sms):
+        from communications.classify import queue_for_classification
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                log = CommunicationLog.objects.create(
+                    office=self.office, type="sms", direction="inbound", status="received",
+                )
+                SMSMessage.objects.create(log=log, from_number=f"+1555000{i}", body=f"question {i}")
+                queue_for_classification(log)
+
+        self.assertEqual(len(self.llm.calls), 3)  # 2 + 2 + 1
+        self.assertIn("HQ", self.llm.calls[0]["system"])
+        self.assertEqual(mock_send_sms.call_count, 5)
+        self.assertEqual(
+            CommunicationLog.objects.filter(direction="inbound", ai_status="done").count(), 5
+        )
+        outbound = CommunicationLog.objects.filter(direction="outbound", type="sms").first()
+        self.assertIn("HQ", outbound.payload["text"])
+
+    def _inbound(self, **fields):
+        log = CommunicationLog.objects.create(
+            office=self.office, type="sms", direction="inbound", status="received", **fields,
+        )
+        SMSMessage.objects.create(log=log, from_number="+15550001", body="question")
+        return log
+
+    @patch("communications.tasks.send_sms_task.delay")
+    def test_stale_claims_are_reclaimed(self, mock_send_sms):
+        from communications.tasks import classify_pending_batch
+
+        stale = self._inbound(ai_status="processing", ai_claimed_at=timezone.now() - timedelta(hours=1))
+        busy = self._inbound(ai_status="processing", ai_claimed_at=timezone.now())
+        classify_pending_batch(self.office.id)
+
+        stale.refresh_from_db()
+        busy.refresh_from_db()
+        self.assertEqual((stale.ai_status, busy.ai_status), ("done", "processing"))
+        self.assertEqual(mock_send_sms.call_count, 1)
+
+    @patch("communications.tasks.send_sms_task.delay")
+    def test_periodic_task_picks_up_stuck_logs_of_quiet_offices(self, mock_send_sms):
+        from communications.tasks import reschedule_stuck_classifications
+
+        stale = self._inbound(ai_status="processing", ai_claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(reschedule_stuck_classifications(), 1)
+        stale.refresh_from_db()
+        self.assertEqual(stale.ai_status, "done")
+        self.assertEqual(reschedule_stuck_classifications(), 0)
+
+    @override_settings(AI_LLM_BACKEND="disabled")
+    @patch("communications.tasks.send_sms_task.delay")
+    def test_disabled_backend_sends_no_ai_replies(self, mock_send_sms):
+        from communications.tasks import classify_pending_batch
+
+        set_llm_backend(None)
+        log = self._inbound(ai_status="pending")
+        classify_pending_batch(self.office.id)
+
+        log.refresh_from_db()
+        self.assertEqual((log.ai_status, log.payload["auto_reply_status"]), ("done", "ai_disabled"))
+        mock_send_sms.assert_not_called()
+        self.assertEqual(self.llm.calls, [])
+
+
+class TestBlobStore(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(
+            BLOB_STORE_ROOT=tmp.name, BLOB_MAX_BYTES=1024, BLOB_CHUNK_SIZE=100, SENDGRID_INBOUND_TOKEN="secret",
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_inbound_email_attachments_are_stored_once(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from communications.blobstore import blob_path
+
+        data = {
+            "from": "client@example.com", "to": "office@example.com", "subject": "Docs", "text": "see attached",
+            "attachment1": SimpleUploadedFile("a.pdf", b"%PDF" * 100, content_type="application/pdf"),
+            "attachment2": SimpleUploadedFile("copy.pdf", b"%PDF" * 100, content_type="application/pdf"),
+            "attachment3": SimpleUploadedFile("huge.bin", b"x" * 2000),
+        }
+        self.assertEqual(self.client.post("/api/comms/webhook/sendgrid/inbound/?token=secret", data).status_code, 200)
+
+        blob = Blob.objects.get()
+        self.assertEqual(blob.size, 400)
+        self.assertEqual(blob_path(blob.sha256).read_bytes(), b"%PDF" * 100)
+        email = EmailMessage.objects.get()
+        self.assertEqual(
+            sorted((a["filename"], a.get("sha256")) for a in email.attachments),
+            [("a.pdf", blob.sha256), ("copy.pdf", blob.sha256), ("huge.bin", None)],
+        )
+        self.assertEqual(list(email.log.blobs.all()), [blob])
+
+        user = get_user_model().objects.create_user(username="staff")
+        url = f"/api/comms/blobs/{blob.sha256}/"
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.get(url).status_code, 404)
+        CommunicationLog.objects.filter(pk=email.log_id).update(office=Office.objects.create(name="HQ", owner=user))
+        res = client.get(url)
+        self.assertEqual(b"".join(res.streaming_content), b"%PDF" * 100)
+
+    def test_inbound_email_rejects_unverified_or_oversized_posts(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        url = "/api/comms/webhook/sendgrid/inbound/"
+        data = {"from": "client@example.com", "to": "office@example.com", "subject": "Docs"}
+        files = {f"attachment{i}": SimpleUploadedFile(f"{i}.txt", b"file %d" % i) for i in range(3)}
+        self.assertEqual(self.client.post(url, {**data, **files}).status_code, 403)
+        self.assertEqual(self.client.post(f"{url}?token=wrong", data).status_code, 403)
+        with override_settings(SENDGRID_INBOUND_MAX_BYTES=100):
+            self.assertEqual(self.client.post(f"{url}?token=secret", {**data, **files}).status_code, 413)
+        self.assertFalse(Blob.objects.exists())
+
+        files = {f"attachment{i}": SimpleUploadedFile(f"{i}.txt", b"file %d" % i) for i in range(3)}
+        with override_settings(BLOB_MAX_FILES_PER_REQUEST=2):
+            self.assertEqual(self.client.post(f"{url}?token=secret", {**data, **files}).status_code, 200)
+        self.assertEqual(Blob.objects.count(), 2)
+        errors = [a.get("error") for a in EmailMessage.objects.get().attachments]
+        self.assertEqual(errors.count("too_many_files"), 1)
+
+    @patch("communications.tasks.get_http_session")
+    def test_mms_media_is_streamed_into_blobs(self, mock_session):
+        from communications.tasks import ingest_sms_media
+
+        response = mock_session.return_value.get.return_value.__enter__.return_value
+        response.headers = {"Content-Type": "image/jpeg", "Content-Length": "300"}
+        response.iter_content.side_effect = lambda chunk_size: iter([b"j" * chunk_size] * 3)
+
+        log = CommunicationLog.objects.create(type="sms", direction="inbound", status="received")
+        sms = SMSMessage.objects.create(log=log, from_number="+1555", to_number="+1666", media=[
+            {"url": "https://api.twilio.com/media/ME1", "content_type": "image/jpeg", "blob_id": None},
+            {"url": "https://api.twilio.com/media/ME2", "content_type": "image/jpeg", "blob_id": None},
+        ])
+        ingest_sms_media(sms.id)
+
+        sms.refresh_from_db()
+        blob = Blob.objects.get()
+        self.assertEqual([m["blob_id"] for m in sms.media], [blob.id, blob.id])
+        self.assertEqual(blob.content_type, "image/jpeg")
+        self.assertEqual(list(log.blobs.all()), [blob])
+
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True, NOTIFY_DIGEST_WINDOW=60)
+class TestStaffNotifications(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner, self.office = make_office(email="owner@example.com", public=True, public_slug="hq")
+        User = get_user_model()
+        self.member = User.objects.create_user(username="member", email="member@example.com")
+        guest = User.objects.create_user(username="guest", email="guest@example.com")
+        Membership.objects.create(user=self.member, office=self.office, role="MEMBER")
+        Membership.objects.create(user=guest, office=self.office, role="GUEST")
+
+    def test_burst_is_sent_as_one_digest(self):
+        from django.core import mail
+        from communications.notifications import deliver, notify_staff
+        from communications.tasks import deliver_staff_notifications
+
+        # Run immediate deliveries, hold back the ones due when the window closes.
+        def apply_async(args, kwargs=None, countdown=None, **options):
+            if not countdown:
+                deliver(*args)
+
+        mock_later = patch.object(deliver_staff_notifications, "apply_async", side_effect=apply_async).start()
+        self.addCleanup(patch.stopall)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_staff([self.owner], "ticket_created", "Ticket #1", "first", office=self.office)
+        self.assertEqual([m.subject for m in mail.outbox], ["Ticket #1"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_staff([self.owner], "ticket_created", "Ticket #2", office=self.office)
+            notify_staff([self.owner], "lead_escalated", "Lead", office=self.office)
+        self.assertEqual(len(mail.outbox), 1)
+        mock_later.assert_called_with((self.owner.id,), countdown=60)
+        self.assertEqual(mock_later.call_count, 2)
+
+        deliver(self.owner.id)  # the trailing task
+        self.assertEqual(mail.outbox[1].subject, "2 new notifications")
+        self.assertIn("- Lead", mail.outbox[1].body)
+        rows = StaffNotification.objects.filter(recipient=self.owner)
+        self.assertEqual(rows.filter(status="delivered").count(), 3)
+        self.assertEqual(rows.get(title="Lead").channels, ["websocket", "email"])
+        self.assertIsNotNone(rows.get(title="Lead").latency_ms)
+
+    @override_settings(NOTIFY_MAX_ATTEMPTS=2)
+    @patch("communications.notifications.send_mail", side_effect=OSError("smtp down"))
+    @patch("communications.notifications._send_websocket", side_effect=OSError("layer down"))
+    def test_failed_delivery_is_retried_then_marked_failed(self, mock_ws, mock_mail):
+        from communications.notifications import deliver, latency_stats
+        from communications.tasks import deliver_staff_notifications
+
+        StaffNotification.objects.create(recipient=self.owner, event="ticket_created", title="Ticket")
+        with patch.object(deliver_staff_notifications, "apply_async") as mock_retry:
+            deliver(self.owner.id)
+            row = StaffNotification.objects.get()
+            self.assertEqual((row.status, row.attempts, row.delivered_at), ("pending", 1, None))
+            self.assertEqual(row.errors, {"websocket": "layer down", "email": "smtp down"})
+            self.assertEqual(mock_retry.call_args.args, ((self.owner.id,),))
+
+            deliver(self.owner.id)
+            self.assertEqual(mock_retry.call_count, 1)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), ("failed", 2))
+        self.assertEqual(latency_stats(StaffNotification.objects.all())["count"], 0)
+
+    @patch("communications.notifications._send_websocket")
+    def test_socket_alone_does_not_count_when_email_fails(self, mock_ws):
+        from django.core import mail
+        from communications.notifications import deliver
+        from communications.tasks import deliver_staff_notifications
+
+        StaffNotification.objects.create(recipient=self.owner, event="ticket_created", title="Ticket")
+        with patch.object(deliver_staff_notifications, "apply_async") as mock_retry:
+            with patch("communications.notifications.send_mail", side_effect=OSError("smtp down")):
+                deliver(self.owner.id)
+            row = StaffNotification.objects.get()
+            self.assertEqual((row.status, row.channels, row.attempts), ("pending", ["websocket"], 1))
+            mock_retry.assert_called_once()
+
+            deliver(self.owner.id)  # the retry only sends the email
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.channels), ("delivered", ["websocket", "email"]))
+        self.assertEqual(mock_ws.call_count, 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_escalation_and_approval_notify_office_staff_after_commit(self):
+        from django.core import mail
+        from aistaff.services.ai_receptionist import AIReceptionist
+
+        ai = AIReceptionist(org={"name": "HQ"}, city=None, staff_user=self.owner, office=self.office)
+        with self.captureOnCommitCallbacks() as callbacks:
+            # Skip the pay-per-success billing wrapper; it needs a funded wallet.
+            result = AIReceptionist.escalate.__wrapped__(ai, {"message": "Need help"})
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(len(mail.outbox), 0)  # nothing sent inside the request
+        for callback in callbacks:
+            callback()
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ["member@example.com", "owner@example.com"])
+
+        room = Room.objects.create(office=self.office, name="Boardroom", access_policy="approval")
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = APIClient().post(
+                f"/api/public/rooms/submit_access/{room.id}/", {"data": {"name": "Ama"}}, format="json",
+            )
+        self.assertEqual(resp.status_code, 201, resp.content)
+        pending = StaffNotification.objects.filter(event="approval_pending")
+        self.assertEqual(sorted(pending.values_list("recipient__username", flat=True)), ["member", "owner"])
+
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        listing = client.get("/api/comms/notifications/", {"unread": 1}).data
+        self.assertEqual(len(listing["results"]), 2)
+        self.assertEqual(client.post("/api/comms/notifications/read/", {}, format="json").data["updated"], 2)
+        latency = client.get("/api/comms/notifications/latency/", {"office_id": self.office.id}).data
+        self.assertEqual(latency["latency"]["count"], 4)
+
+
+class TestProviderStandIn(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_sends_and_payment_verify_run_offline(self):
+        from sendgrid.helpers.mail import Mail
+        from accounts.models import PaystackTransaction, UserWallet
+        from communications.providers import ProviderHTTPError, get_sendgrid_client
+        from communications.standin import ProviderStandIn, StandInConfig
+        from communications.tasks import send_sms_task
+
+        user = get_user_model().objects.create_user(username="payer")
+        pay_tx = PaystackTransaction.objects.create(user=user, amount=10, credits_to_add=100)
+        log = CommunicationLog.objects.create(type="sms", direction="outbound", status="queued")
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with ProviderStandIn(StandInConfig(rate_limit=1, retry_after=7)).activate() as standin:
+            send_sms_task(log.id, "+15550001111", "hello")
+            resp = client.post("/api/wallet/verify/", {"reference": pay_tx.reference}, format="json")
+
+            mail = Mail(from_email="a@example.com", to_emails="b@example.com", subject="hi", plain_text_content="hi")
+            get_sendgrid_client().send(mail)
+            with self.assertRaises(ProviderHTTPError) as ctx:
+                get_sendgrid_client().send(mail)
+
+        log.refresh_from_db()
+        self.assertEqual(log.status, "sent")
+        self.assertTrue(log.provider_id.startswith("SM"))
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertEqual(UserWallet.objects.get(user=user).total_credits, 100)
+        self.assertEqual(ctx.exception.status_code, 429)
+        self.assertEqual(ctx.exception.headers["Retry-After"], "7")
+        self.assertEqual(standin.counts[("sendgrid", 202)], 1)
+
+    def test_signed_twilio_webhook_is_accepted(self):
+        from communications.standin import sign_twilio_request
+
+        url = "http://testserver/api/comms/webhook/twilio/sms/"
+        params = {"MessageSid": "SMstandin", "From": "+15550001111", "To": "+15550000000", "Body": "hi", "NumMedia": "0"}
+        client = Client()
+        self.assertEqual(client.post(url, params, HTTP_X_TWILIO_SIGNATURE="bad").status_code, 403)
+        resp = client.post(url, params, HTTP_X_TWILIO_SIGNATURE=sign_twilio_request(url, params))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(CommunicationLog.objects.filter(provider_id="SMstandin").exists())
+
+
+class TestDeliveryStatus(TestCase):
+    def setUp(self):
+        recent_events.clear()
+        self.owner, self.office = make_office()
+
+    def outbound(self, type, provider_id):
+        return CommunicationLog.objects.create(
+            office=self.office, type=type, direction="outbound", status="sent", provider_id=provider_id,
+        )
+
+    def test_twilio_callbacks_build_history_and_rollups(self):
+        from communications.standin import sign_twilio_request
+
+        log = self.outbound("sms", "SM1")
+        url = "http://testserver/api/comms/webhook/twilio/status/"
+        client = Client()
+        for status in ["delivered", "sent", "delivered"]:  # out of order, then a retry
+            params = {"MessageSid": "SM1", "MessageStatus": status}
+            resp = client.post(url, params, HTTP_X_TWILIO_SIGNATURE=sign_twilio_request(url, params))
+            self.assertEqual(resp.status_code, 200)
+
+        log.refresh_from_db()
+        self.assertEqual(log.status, "delivered")
+        self.assertEqual(list(log.status_events.order_by("id").values_list("status", flat=True)), ["delivered", "sent"])
+        self.assertEqual(
+            dict(DeliveryStatRollup.objects.values_list("status", "count")), {"delivered": 1, "sent": 1},
+        )
+
+    @patch("communications.tasks.wait_for_send_slot", return_value=0)
+    @patch("communications.tasks.get_twilio_client")
+    def test_callback_before_sid_is_saved_is_attached_later(self, mock_client, mock_slot):
+        from communications.standin import sign_twilio_request
+        from communications.tasks import send_sms_task
+
+        url = "http://testserver/api/comms/webhook/twilio/status/"
+        params = {"MessageSid": "SM9", "MessageStatus": "delivered"}
+        Client().post(url, params, HTTP_X_TWILIO_SIGNATURE=sign_twilio_request(url, params))
+        self.assertIsNone(MessageStatusEvent.objects.get().log)
+
+        log = CommunicationLog.objects.create(office=self.office, type="sms", direction="outbound", status="queued")
+        mock_client.return_value.messages.create.return_value = MagicMock(sid="SM9")
+        send_sms_task.apply(args=(log.id, "+15550001111", "hi"))
+
+        log.refresh_from_db()
+        self.assertEqual(log.status, "delivered")
+        self.assertEqual(MessageStatusEvent.objects.get().log, log)
+        self.assertEqual(DeliveryStatRollup.objects.get().status, "delivered")
+
+    def test_unsigned_sendgrid_events_are_rejected_without_a_key(self):
+        url = "/api/comms/webhook/sendgrid/events/"
+        with self.settings(SENDGRID_EVENT_WEBHOOK_PUBLIC_KEY=None):
+            self.assertEqual(self.client.post(url, b"[]", content_type="application/json").status_code, 403)
+
+    def test_signed_sendgrid_events_feed_the_dashboard(self):
+        from communications.standin import ProviderStandIn
+
+        delivered = self.outbound("email", "msg1")
+        bounced = self.outbound("email", "msg1")  # same request, told apart by the log_id custom arg
+        events = [
+            {"event": "processed", "log_id": str(delivered.id), "sg_message_id": "msg1.a", "sg_event_id": "e1", "timestamp": int(time.time())},
+            {"event": "delivered", "log_id": str(delivered.id), "sg_message_id": "msg1.a", "sg_event_id": "e2", "timestamp": int(time.time())},
+            {"event": "open", "log_id": str(delivered.id), "sg_message_id": "msg1.a", "sg_event_id": "e3", "timestamp": int(time.time())},
+            {"event": "bounce", "log_id": str(bounced.id), "sg_message_id": "msg1.b", "sg_event_id": "e4", "timestamp": int(time.time()), "status": "5.1.1"},
+        ]
+        body = json.dumps(events).encode()
+        standin = ProviderStandIn()
+        timestamp = str(int(time.time()))
+        signature = standin.sign_sendgrid_events(body, timestamp)
+
+        client = APIClient()
+        with self.settings(SENDGRID_EVENT_WEBHOOK_PUBLIC_KEY=standin.sendgrid_public_key):
+            url = "/api/comms/webhook/sendgrid/events/"
+            headers = {"HTTP_X_TWILIO_EMAIL_EVENT_WEBHOOK_TIMESTAMP": timestamp}
+            bad = client.post(url, body, content_type="application/json",
+                              HTTP_X_TWILIO_EMAIL_EVENT_WEBHOOK_SIGNATURE=signature[::-1], **headers)
+            self.assertEqual(bad.status_code, 403)
+            resp = client.post(url, body, content_type="application/json",
+                               HTTP_X_TWILIO_EMAIL_EVENT_WEBHOOK_SIGNATURE=signature, **headers)
+            self.assertEqual(resp.status_code, 200)
+
+        delivered.refresh_from_db()
+        bounced.refresh_from_db()
+        self.assertEqual((delivered.status, bounced.status), ("delivered", "bounced"))
+
+        client.force_authenticate(self.owner)
+        stats = client.get("/api/comms/delivery-stats/", {"office_id": self.office.id}).data
+        self.assertEqual(stats["totals"]["sendgrid"]["delivery_rate"], 0.5)
+        self.assertEqual(stats["totals"]["sendgrid"]["opened"], 1)
+        history = client.get(f"/api/comms/logs/{bounced.id}/status-events/").data
+        self.assertEqual(history["events"][0]["error_code"], "5.1.1")
+
+
+@override_settings(SENDGRID_INBOUND_TOKEN="secret")
+class TestPayloadPolicy(TestCase):
+    def setUp(self):
+        recent_events.clear()
+
+    def test_inbound_email_keeps_summary_inline_and_offloads_raw(self):
+        from communications.payloads import load_raw_payload
+
+        headers = "Received: from mx.example.com\n" * 200 + "Message-ID: <abc@example.com>\n"
+        res = self.client.post("/api/comms/webhook/sendgrid/inbound/?token=secret", {
+            "from": "ama@example.com", "to": "hq@example.com", "subject": "Hi", "text": "hello",
+            "headers": headers, "envelope": "{}", "spam_score": "0.1",
+        })
+        self.assertEqual(res.status_code, 200)
+
+        log = CommunicationLog.objects.get(provider_id="<abc@example.com>")
+        self.assertEqual(log.payload, {
+            "from": "ama@example.com", "to": "hq@example.com", "subject": "Hi", "spam_score": "0.1", "_raw": "offloaded",
+        })
+        self.assertLess(len(log.raw_payload.data), len(headers) // 10)
+        self.assertEqual(load_raw_payload(log)["headers"], headers)
+
+    def test_offloaded_inbound_payload_is_served_to_the_office(self):
+        owner, office = make_office()
+        OfficeAddress.objects.create(office=office, address="hq@example.com")
+        headers = "Received: from mx.example.com\n" * 200 + "Message-ID: <raw@example.com>\n"
+        self.client.post("/api/comms/webhook/sendgrid/inbound/?token=secret", {
+            "from": "ama@example.com", "to": "HQ <hq@example.com>", "subject": "Hi", "text": "hello", "headers": headers,
+        })
+        log = CommunicationLog.objects.get(provider_id="<raw@example.com>")
+        self.assertEqual(log.payload["_raw"], "offloaded")
+
+        client = APIClient()
+        client.force_authenticate(owner)
+        res = client.get(f"/api/comms/logs/{log.id}/raw-payload/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["payload"]["headers"], headers)
+        client.force_authenticate(get_user_model().objects.create_user(username="stranger"))
+        self.assertEqual(client.get(f"/api/comms/logs/{log.id}/raw-payload/").status_code, 404)
+
+    def test_backfill_slims_legacy_rows_in_chunks(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from communications.payloads import load_raw_payload
+
+        raw = {"MessageSid": "SMold", "From": "+15550001111", "To": "+15550002222", "Body": "hi", "ApiVersion": "2010-04-01"}
+        legacy = [
+            CommunicationLog.objects.create(type="sms", direction="inbound", payload={**raw, "MessageSid": f"SM{i}"})
+            for i in range(3)
+        ]
+        outbound = CommunicationLog.objects.create(type="sms", direction="outbound", payload={"to": "+1555"})
+
+        out = StringIO()
+        call_command("slim_comm_payloads", chunk_size=2, stdout=out)
+        self.assertIn("slimmed 3", out.getvalue())
+        log = CommunicationLog.objects.get(pk=legacy[0].pk)
+        self.assertNotIn("ApiVersion", log.payload)
+        self.assertEqual(load_raw_payload(log)["ApiVersion"], "2010-04-01")
+        outbound.refresh_from_db()
+        self.assertEqual(outbound.payload, {"to": "+1555"})
+
+        call_command("slim_comm_payloads", stdout=out)  # idempotent
+        self.assertEqual(CommunicationLogPayload.objects.count(), 3)
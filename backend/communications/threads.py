@@ -0,0 +1,150 @@
+import re
+from collections import Counter, defaultdict
+from email.utils import parseaddr
+from django.conf import settings
+from django.db.models import Case, F, Q, Value, When
+from .models import Conversation, CommunicationLog, OfficeAddress
+
+
+def normalize_phone(value):
+    """
+    Best-effort E.164 normalization ("+<country><number>").
+
+    Numbers without an international prefix get COMMS_DEFAULT_COUNTRY_CODE
+    (trunk "0" dropped) when it is configured; otherwise they are assumed
+    to already carry their country code. Returns "" for unusable input.
+    """
+    value = (value or "").strip()
+    if value.lower().startswith("whatsapp:"):
+        value = value[len("whatsapp:"):]
+    international = value.startswith("+") or value.startswith("00")
+    digits = re.sub(r"\D", "", value)
+    if value.startswith("00"):
+        digits = digits[2:]
+    if not international:
+        country_code = getattr(settings, "COMMS_DEFAULT_COUNTRY_CODE", "")
+        if country_code:
+            digits = f"{country_code}{digits.lstrip('0')}"
+    if not 7 <= len(digits) <= 15:
+        return ""
+    return f"+{digits}"
+
+
+def normalize_email(value):
+    """Lowercased bare address from 'Name <addr>' or 'addr'; "" if invalid."""
+    address = parseaddr(value or "")[1].strip().lower()
+    return address if "@" in address else ""
+
+
+def normalize_counterpart(value):
+    """Return (kind, key) for a phone number or email address."""
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else ""
+    if not value:
+        return None, ""
+    if "@" in value and not value.lower().startswith("whatsapp:"):
+        return "email", normalize_email(value)
+    return "phone", normalize_phone(value)
+
+
+def resolve_office(to):
+    """
+    Office id an inbound message belongs to, or None.
+
+    The To number/address (a list, or comma-separated for email) is looked
+    up in OfficeAddress. Messages to an address no office has registered
+    stay unassigned; the sender's history with other offices is not used,
+    as that would deliver them to another tenant's inbox.
+    """
+    values = to if isinstance(to, (list, tuple)) else (to or "").split(",")
+    keys = [key for key in (normalize_counterpart(v.strip())[1] for v in values if v) if key]
+    if not keys:
+        return None
+    return OfficeAddress.objects.filter(address__in=keys).values_list("office_id", flat=True).first()
+
+
+def attach_to_conversation(log, counterpart, preview=""):
+    """
+    Attach a log to its office/counterpart conversation and refresh the
+    denormalized summary in one UPDATE. Safe under concurrent ingest: counters
+    use F() expressions and the "last message" fields only move forward.
+    """
+    kind, key = normalize_counterpart(counterpart)
+    if not key:
+        return None
+
+    conversation, _ = Conversation.objects.get_or_create(
+        office_id=log.office_id, counterpart=key, defaults={"kind": kind}
+    )
+
+    newer = Q(last_message_at__isnull=True) | Q(last_message_at__lte=log.created_at)
+
+    def if_newer(value, field):
+        model_field = Conversation._meta.get_field(field)
+        output_field = getattr(model_field, "target_field", model_field)
+        return Case(When(newer, then=Value(value)), default=F(field), output_field=output_field)
+
+    Conversation.objects.filter(pk=conversation.pk).update(
+        message_count=F("message_count") + 1,
+        unread_count=F("unread_count") + (1 if log.direction == "inbound" else 0),
+        last_message_preview=if_newer((preview or "")[:200], "last_message_preview"),
+        last_direction=if_newer(log.direction, "last_direction"),
+        last_log=if_newer(log.pk, "last_log"),
+        last_message_at=if_newer(log.created_at, "last_message_at"),
+    )
+    CommunicationLog.objects.filter(pk=log.pk).update(conversation=conversation)
+    log.conversation = conversation
+    return conversation
+
+
+def attach_many_to_conversations(office_id, items):
+    """
+    Bulk variant of attach_to_conversation for outbound fan-out.
+
+    ``items`` is a list of (log, counterpart, preview) for outbound logs of
+    one office. Uses a constant number of queries regardless of how many
+    logs are attached.
+    """
+    keyed = []
+    for log, counterpart, preview in items:
+        kind, key = normalize_counterpart(counterpart)
+        if key:
+            keyed.append((log, kind, key, (preview or "")[:200]))
+    if not keyed:
+        return {}
+
+    kinds = {key: kind for _, kind, key, _ in keyed}
+    Conversation.objects.bulk_create(
+        [Conversation(office_id=office_id, counterpart=key, kind=kind) for key, kind in kinds.items()],
+        ignore_conflicts=True,
+    )
+    conversations = {
+        c.counterpart: c
+        for c in Conversation.objects.filter(office_id=office_id, counterpart__in=list(kinds))
+    }
+
+    latest = {}
+    for log, _, key, preview in keyed:
+        log.conversation = conversations[key]
+        latest[key] = (log, preview)
+
+    CommunicationLog.objects.bulk_update([log for log, *_ in keyed], ["conversation"], batch_size=500)
+    by_count = defaultdict(list)
+    for key, count in Counter(key for _, _, key, _ in keyed).items():
+        by_count[count].append(conversations[key].pk)
+    for count, pks in by_count.items():
+        Conversation.objects.filter(pk__in=pks).update(message_count=F("message_count") + count)
+    updated = []
+    for key, (log, preview) in latest.items():
+        conversation = conversations[key]
+        if conversation.last_message_at and conversation.last_message_at > log.created_at:
+            continue
+        conversation.last_message_at = log.created_at
+        conversation.last_message_preview = preview
+        conversation.last_direction = log.direction
+        conversation.last_log = log
+        updated.append(conversation)
+    Conversation.objects.bulk_update(
+        updated, ["last_message_at", "last_message_preview", "last_direction", "last_log"], batch_size=500
+    )
+    return conversations
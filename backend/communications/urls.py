@@ -7,7 +7,23 @@ urlpatterns = [
     path("sms/send/", views.SendSMSView.as_view()),
     path("email/send/", views.SendEmailView.as_view()),
     path("logs/", views.CommunicationLogList.as_view()),
+    path("inbox/", views.CommunicationInboxView.as_view(), name="comms-inbox"),
+    path("conversations/", views.ConversationListView.as_view(), name="comms-conversations"),
+    path("conversations/<int:pk>/messages/", views.ConversationMessagesView.as_view(), name="comms-conversation-messages"),
+    path("conversations/<int:pk>/read/", views.ConversationReadView.as_view(), name="comms-conversation-read"),
+    path("campaigns/", views.CampaignCreateView.as_view(), name="comms-campaigns"),
+    path("campaigns/<int:pk>/", views.CampaignDetailView.as_view(), name="comms-campaign-detail"),
+    path("send-metrics/", views.SendMetricsView.as_view(), name="comms-send-metrics"),
+    path("blobs/<str:sha256>/", views.BlobDownloadView.as_view(), name="comms-blob"),
+    path("delivery-stats/", views.DeliveryStatsView.as_view(), name="comms-delivery-stats"),
+    path("logs/<int:pk>/raw-payload/", views.CommunicationLogRawPayloadView.as_view(), name="comms-log-raw-payload"),
+    path("logs/<int:pk>/status-events/", views.MessageStatusHistoryView.as_view(), name="comms-log-status-events"),
+    path("notifications/", views.StaffNotificationListView.as_view(), name="comms-notifications"),
+    path("notifications/read/", views.StaffNotificationReadView.as_view(), name="comms-notifications-read"),
+    path("notifications/latency/", views.StaffNotificationLatencyView.as_view(), name="comms-notifications-latency"),
     path("webhook/twilio/sms/", webhooks.twilio_sms_webhook),
     path("webhook/twilio/call/", webhooks.twilio_call_webhook),
+    path("webhook/twilio/status/", webhooks.twilio_status_webhook),
     path("webhook/sendgrid/inbound/", webhooks.sendgrid_inbound),
+    path("webhook/sendgrid/events/", webhooks.sendgrid_events_webhook),
 ]
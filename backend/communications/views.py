@@ -1,13 +1,29 @@
+from datetime import timedelta
 from django.views.decorators.csrf import csrf_exempt
+from django.utils import timezone
 from django.utils.timezone import now
-from django.http import JsonResponse, HttpResponse
+from django.db.models import Count, F, Min, Prefetch, Q, Sum
+from django.db.models.functions import TruncDay
+from django.http import FileResponse, Http404, JsonResponse, HttpResponse
 from rest_framework import generics, permissions
-from .models import RoomChatMessage, CityLobbyChatMessage, CommunicationLog, SMSMessage, EmailMessage
-from .serializers import RoomChatMessageSerializer, CityLobbyChatMessageSerializer, CommunicationLogSerializer
+from rest_framework.exceptions import ValidationError
+from .models import RoomChatMessage, CityLobbyChatMessage, CommunicationLog, SMSMessage, EmailMessage, Conversation, Campaign, Blob, StaffNotification, DeliveryStatRollup, MessageStatusEvent
+from .serializers import RoomChatMessageSerializer, CityLobbyChatMessageSerializer, CommunicationLogSerializer, CommunicationInboxSerializer, ConversationSerializer, CampaignCreateSerializer, CampaignSerializer, StaffNotificationSerializer
+from .pagination import KeysetPagination
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from .tasks import send_sms_task, send_email_task, classify_and_autoreply
+from workspace.models import Office
+from .tasks import send_sms_task, send_email_task
+from .classify import queue_for_classification
+from .threads import attach_to_conversation, normalize_counterpart, resolve_office
+from .campaigns import create_campaign, resolve_recipients
+from .params import parse_bound
+from .ratelimit import provider_stats
+from .blobstore import blob_path
+from .notifications import latency_stats
+from .delivery import FAILED_STATUSES
+from .payloads import load_raw_payload
 
 # -------------------------------
 # ROOM CHAT
@@ -53,6 +69,7 @@ class SendSMSView(APIView):
             return Response({"error":"Missing 'to'"}, status=400)
 
         log = CommunicationLog.objects.create(office_id=office_id, type="sms", direction="outbound", status="queued", payload={})
+        attach_to_conversation(log, to, body)
         # enqueue
         send_sms_task.delay(log.id, to, body, media)
         return Response({"ok": True, "log_id": log.id}, status=201)
@@ -65,6 +82,7 @@ class SendEmailView(APIView):
         body_text = request.data.get("body_text","")
         body_html = request.data.get("body_html","")
         log = CommunicationLog.objects.create(office_id=office_id, type="email", direction="outbound", status="queued", payload={})
+        attach_to_conversation(log, to, subject or body_text)
         send_email_task.delay(log.id, to, subject, body_text, body_html)
         return Response({"ok": True, "log_id": log.id}, status=201)
 
@@ -72,7 +90,7 @@ class CommunicationLogList(generics.ListAPIView):
     serializer_class = CommunicationLogSerializer
     def get_queryset(self):
         office_id = self.request.query_params.get("office_id")
-        qs = CommunicationLog.objects.all().order_by("-created_at")
+        qs = CommunicationLog.objects.prefetch_related("sms_messages", "voice_calls", "emails").order_by("-created_at")
         if office_id:
             qs = qs.filter(office_id=office_id)
         # optional filters: type, direction, date range
@@ -81,6 +99,207 @@ class CommunicationLogList(generics.ListAPIView):
             qs = qs.filter(type=t)
         return qs
 
+
+def _user_offices(user):
+    return Office.objects.filter(Q(owner=user) | Q(memberships__user=user))
+
+
+def _office_param(params, user):
+    """The required ``office_id`` query param as an int: 400 if missing or malformed, 404 if not ``user``'s."""
+    office_id = params.get("office_id")
+    if not office_id:
+        raise ValidationError({"office_id": "This query parameter is required."})
+    if not office_id.isdigit():
+        raise ValidationError({"office_id": "Expected an office id."})
+    if not _user_offices(user).filter(pk=office_id).exists():
+        raise Http404
+    return int(office_id)
+
+
+class CommunicationInboxView(generics.ListAPIView):
+    """
+    Office inbox: newest-first, keyset-paginated on (created_at, id).
+
+    Query params: office_id (required), type (comma separated), direction,
+    since / until (ISO date or datetime), include_payload=1 to render the raw
+    provider payload and email HTML bodies, cursor / page_size.
+    """
+    serializer_class = CommunicationInboxSerializer
+    pagination_class = KeysetPagination
+    permission_classes = [permissions.IsAuthenticated]
+
+    def include_payload(self):
+        return self.request.query_params.get("include_payload", "").lower() in ("1", "true", "yes")
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["include_payload"] = self.include_payload()
+        return context
+
+    def get_base_queryset(self):
+        office_id = _office_param(self.request.query_params, self.request.user)
+        return CommunicationLog.objects.filter(office_id=office_id)
+
+    def get_queryset(self):
+        params = self.request.query_params
+        qs = self.get_base_queryset()
+
+        types = [t for t in (params.get("type") or "").split(",") if t]
+        if len(types) == 1:
+            qs = qs.filter(type=types[0])
+        elif types:
+            qs = qs.filter(type__in=types)
+
+        direction = params.get("direction")
+        if direction:
+            qs = qs.filter(direction=direction)
+
+        since = parse_bound(params.get("since"), "since")
+        until = parse_bound(params.get("until"), "until", end=True)
+        if since:
+            qs = qs.filter(created_at__gte=since)
+        if until:
+            qs = qs.filter(created_at__lt=until)
+
+        if self.include_payload():
+            emails = EmailMessage.objects.all()
+        else:
+            qs = qs.defer("payload")
+            emails = EmailMessage.objects.defer("body_html")
+        return qs.prefetch_related("sms_messages", "voice_calls", Prefetch("emails", queryset=emails))
+
+
+class ConversationPagination(KeysetPagination):
+    timestamp_field = "last_message_at"
+
+
+class ConversationListView(generics.ListAPIView):
+    """
+    Office conversations, most recently active first. Optional filters:
+    unread=1, kind=phone|email, counterpart=<number or email>.
+    """
+    serializer_class = ConversationSerializer
+    pagination_class = ConversationPagination
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        params = self.request.query_params
+        office_id = _office_param(params, self.request.user)
+
+        qs = Conversation.objects.filter(office_id=office_id, last_message_at__isnull=False)
+        if params.get("unread", "").lower() in ("1", "true", "yes"):
+            qs = qs.filter(unread_count__gt=0)
+        if params.get("kind"):
+            qs = qs.filter(kind=params["kind"])
+        if params.get("counterpart"):
+            qs = qs.filter(counterpart=normalize_counterpart(params["counterpart"])[1])
+        return qs
+
+
+def _get_conversation(user, pk):
+    return get_object_or_404(Conversation, pk=pk, office__in=_user_offices(user))
+
+
+class ConversationMessagesView(CommunicationInboxView):
+    """All logs of one conversation, with the inbox filters and pagination."""
+
+    def get_base_queryset(self):
+        conversation = _get_conversation(self.request.user, self.kwargs["pk"])
+        return CommunicationLog.objects.filter(conversation=conversation)
+
+
+class ConversationReadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        conversation = _get_conversation(request.user, pk)
+        Conversation.objects.filter(pk=conversation.pk).update(unread_count=0)
+        return Response({"ok": True, "id": conversation.id, "unread_count": 0})
+
+
+# -------------------------------
+# CAMPAIGNS
+# -------------------------------
+class CampaignCreateView(APIView):
+    """Queue a bulk SMS/email send; poll CampaignDetailView for progress."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = CampaignCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        office = get_object_or_404(_user_offices(request.user).distinct(), pk=data["office_id"])
+
+        recipients = resolve_recipients(office, data["channel"], data.get("recipients"), data.get("query"))
+        campaign = create_campaign(
+            office,
+            data["channel"],
+            data["body"],
+            recipients,
+            subject_template=data.get("subject", ""),
+            html_template=data.get("body_html", ""),
+            name=data.get("name", ""),
+            user=request.user,
+        )
+        campaign.refresh_from_db()
+        return Response(CampaignSerializer(campaign).data, status=201)
+
+
+class CampaignDetailView(generics.RetrieveAPIView):
+    serializer_class = CampaignSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Campaign.objects.filter(office__in=_user_offices(self.request.user))
+
+
+class SendMetricsView(APIView):
+    """
+    Send scheduler health for an office: outbound queue depth and age per
+    channel, plus provider-wide throughput, throttling and queue wait.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        office_id = _office_param(request.query_params, request.user)
+
+        rows = (
+            CommunicationLog.objects.filter(office_id=office_id, direction="outbound", status="queued")
+            .values("type")
+            .annotate(count=Count("id"), oldest=Min("created_at"))
+        )
+        current = timezone.now()
+        queued = {
+            row["type"]: {
+                "count": row["count"],
+                "oldest_age_seconds": round((current - row["oldest"]).total_seconds(), 3),
+            }
+            for row in rows
+        }
+        return Response({
+            "queued": queued,
+            "providers": {name: provider_stats(name) for name in ("twilio", "sendgrid")},
+        })
+
+
+class BlobDownloadView(APIView):
+    """Stream a stored attachment/media file referenced by one of the user's offices."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, sha256):
+        blob = get_object_or_404(
+            Blob.objects.filter(logs__office__in=_user_offices(request.user)).distinct(), sha256=sha256
+        )
+        path = blob_path(blob.sha256)
+        if not path.exists():
+            raise Http404
+        filename = request.query_params.get("filename") or blob.sha256
+        response = FileResponse(open(path, "rb"), content_type=blob.content_type or "application/octet-stream",
+                                as_attachment=True, filename=filename)
+        response["ETag"] = f'"{blob.sha256}"'
+        response["Cache-Control"] = "private, max-age=31536000, immutable"
+        return response
+
 # -------------------------------
 # AUTO-REPLY INBOUND HANDLERS
 # -------------------------------
@@ -98,6 +317,7 @@ def twilio_inbound_sms(request):
 
     # 1️⃣ Create inbound communication log
     log = CommunicationLog.objects.create(
+        office_id=resolve_office(to_number),
         type="sms",
         direction="inbound",
         status="received",
@@ -116,9 +336,10 @@ def twilio_inbound_sms(request):
         body=body,
         received_at=now(),
     )
+    attach_to_conversation(log, from_number, body)
 
-    # 3️⃣ Trigger AI classification + auto-reply
-    classify_and_autoreply.delay(log.id)
+    # 3️⃣ Queue for batched AI classification + auto-reply
+    queue_for_classification(log)
 
     return HttpResponse("OK", status=200)
 
@@ -137,6 +358,7 @@ def inbound_email_webhook(request):
 
     # 1️⃣ Create inbound log
     log = CommunicationLog.objects.create(
+        office_id=resolve_office(to_email),
         type="email",
         direction="inbound",
         status="received",
@@ -158,8 +380,147 @@ def inbound_email_webhook(request):
         body_html=body_html,
         received_at=now(),
     )
+    attach_to_conversation(log, from_email, subject or body_text)
 
-    # 3️⃣ Trigger AI classification + auto-reply
-    classify_and_autoreply.delay(log.id)
+    # 3️⃣ Queue for batched AI classification + auto-reply
+    queue_for_classification(log)
 
     return JsonResponse({"status": "received"})
+
+
+class CommunicationLogRawPayloadView(APIView):
+    """Full provider payload of a log, decompressed from side storage when offloaded."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        offices = _user_offices(request.user)
+        # Logs attributed only through their conversation are the office's too.
+        log = get_object_or_404(
+            CommunicationLog.objects.filter(Q(office__in=offices) | Q(conversation__office__in=offices)).distinct(),
+            pk=pk,
+        )
+        return Response({"id": log.id, "payload": load_raw_payload(log)})
+
+
+# -------------------------------
+# DELIVERY STATUS
+# -------------------------------
+class DeliveryStatsView(APIView):
+    """
+    Deliverability dashboard for an office, read from the hourly rollups.
+    Query params: office_id (required), days (default 7, max 90),
+    bucket=hour|day (default day), channel=sms|email.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        office_id = _office_param(request.query_params, request.user)
+        try:
+            days = min(max(int(request.query_params.get("days", 7)), 1), 90)
+        except ValueError:
+            raise ValidationError({"days": "Must be an integer."})
+        bucket = request.query_params.get("bucket", "day")
+        if bucket not in ("hour", "day"):
+            raise ValidationError({"bucket": "Must be 'hour' or 'day'."})
+
+        qs = DeliveryStatRollup.objects.filter(
+            office_id=office_id, bucket_start__gte=timezone.now() - timedelta(days=days),
+        )
+        channel = request.query_params.get("channel")
+        if channel:
+            qs = qs.filter(channel=channel)
+
+        if bucket == "day":
+            qs = qs.annotate(bucket=TruncDay("bucket_start"))
+        else:
+            qs = qs.annotate(bucket=F("bucket_start"))
+        rows = list(
+            qs.values("bucket", "provider", "channel", "status")
+            .annotate(count=Sum("count"))
+            .order_by("bucket", "provider", "channel", "status")
+        )
+
+        totals = {}
+        for row in rows:
+            counts = totals.setdefault(row["provider"], {})
+            counts[row["status"]] = counts.get(row["status"], 0) + row["count"]
+        for counts in totals.values():
+            delivered = counts.get("delivered", 0)
+            failed = sum(counts.get(s, 0) for s in FAILED_STATUSES)
+            counts["delivery_rate"] = round(delivered / (delivered + failed), 4) if delivered + failed else None
+
+        return Response({
+            "buckets": [{**row, "bucket": row["bucket"].isoformat()} for row in rows],
+            "totals": totals,
+        })
+
+
+class MessageStatusHistoryView(APIView):
+    """Status callbacks received for one outbound log, oldest first."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        log = get_object_or_404(CommunicationLog, pk=pk, office__in=_user_offices(request.user))
+        events = MessageStatusEvent.objects.filter(log=log).order_by("occurred_at", "id")
+        return Response({
+            "id": log.id,
+            "status": log.status,
+            "events": [
+                {"status": e.status, "raw_status": e.raw_status, "error_code": e.error_code,
+                 "occurred_at": e.occurred_at.isoformat()}
+                for e in events
+            ],
+        })
+
+
+# -------------------------------
+# STAFF NOTIFICATIONS
+# -------------------------------
+class StaffNotificationListView(generics.ListAPIView):
+    """The current user's notifications, newest first. ?unread=1 to filter."""
+    serializer_class = StaffNotificationSerializer
+    pagination_class = KeysetPagination
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        qs = StaffNotification.objects.filter(recipient=self.request.user)
+        if self.request.query_params.get("unread", "").lower() in ("1", "true", "yes"):
+            qs = qs.filter(read_at__isnull=True)
+        return qs
+
+
+class StaffNotificationReadView(APIView):
+    """Mark notifications read: {"ids": [...]}, or all of them when ids is omitted."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        qs = StaffNotification.objects.filter(recipient=request.user, read_at__isnull=True)
+        ids = request.data.get("ids")
+        if ids is not None:
+            if not isinstance(ids, list):
+                raise ValidationError({"ids": "Expected a list of ids."})
+            qs = qs.filter(pk__in=ids)
+        updated = qs.update(read_at=timezone.now())
+        return Response({"ok": True, "updated": updated})
+
+
+class StaffNotificationLatencyView(APIView):
+    """
+    Delivery latency (creation to send, digest wait included) of the user's
+    notifications, or of a whole office with ?office_id=.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        office_id = request.query_params.get("office_id")
+        if office_id:
+            if not _user_offices(request.user).filter(pk=office_id).exists():
+                raise Http404
+            qs = StaffNotification.objects.filter(office_id=office_id)
+        else:
+            qs = StaffNotification.objects.filter(recipient=request.user)
+        return Response({
+            "latency": latency_stats(qs),
+            "pending": qs.filter(status__in=["pending", "sending"]).count(),
+            "failed": qs.filter(status="failed").count(),
+        })
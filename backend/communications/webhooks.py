@@ -3,7 +3,18 @@ from django.http import HttpResponse, JsonResponse
 from .models import CommunicationLog, SMSMessage, VoiceCall, EmailMessage
 from django.utils import timezone
 from twilio.request_validator import RequestValidator
+from aistaff.services.intent_router import opt_keyword
 from django.conf import settings
+from django.db import transaction
+from email.parser import HeaderParser
+from .dedup import is_duplicate_event
+from .threads import attach_to_conversation, resolve_office
+from .campaigns import set_opted_out
+from .blobstore import BlobUploadHandler, blob_ref
+from .payloads import split_payload, store_raw_payload
+from .delivery import record_status_events, sendgrid_event, twilio_event, verify_sendgrid_signature
+import hashlib
+import hmac
 import json
 
 @csrf_exempt
@@ -16,16 +27,39 @@ def twilio_sms_webhook(request):
     if not validator.validate(url, params, signature):
         return HttpResponse(status=403)
 
+    message_sid = request.POST.get("MessageSid")
     from_number = request.POST.get("From")
     to_number = request.POST.get("To")
     body = request.POST.get("Body","")
     media = []
     num_media = int(request.POST.get("NumMedia","0"))
     for i in range(num_media):
-        media.append(request.POST.get(f"MediaUrl{i}"))
+        # Bytes are fetched into the blob store after commit (ingest_sms_media).
+        media.append({
+            "url": request.POST.get(f"MediaUrl{i}"),
+            "content_type": request.POST.get(f"MediaContentType{i}", ""),
+            "blob_id": None,
+        })
 
-    log = CommunicationLog.objects.create(type="sms", direction="inbound", status="received", payload=params)
-    SMSMessage.objects.create(log=log, from_number=from_number, to_number=to_number, body=body, media=media)
+    with transaction.atomic():
+        if is_duplicate_event("twilio", message_sid, "sms.inbound"):
+            return HttpResponse("OK")
+        inline, raw = split_payload("twilio.sms", params)
+        log = CommunicationLog.objects.create(
+            office_id=resolve_office(to_number), type="sms", direction="inbound",
+            status="received", provider_id=message_sid, payload=inline,
+        )
+        store_raw_payload(log, "twilio.sms", raw)
+        sms = SMSMessage.objects.create(log=log, from_number=from_number, to_number=to_number, body=body, media=media)
+        conversation = attach_to_conversation(log, from_number, body)
+        # STOP/START must reach campaigns even when no auto-reply runs for this message.
+        opted_out = opt_keyword(body)
+        if conversation and opted_out is not None:
+            set_opted_out(conversation.pk, opted_out)
+        if media:
+            from .tasks import ingest_sms_media
+
+            transaction.on_commit(lambda: ingest_sms_media.delay(sms.id))
     # Optionally: dispatch AI classification or push to WebSocket
     return HttpResponse("OK")
 
@@ -37,25 +71,155 @@ def twilio_call_webhook(request):
     from_number = data.get("From")
     to_number = data.get("To")
     status = data.get("CallStatus")
-    # create or update log
-    log, _ = CommunicationLog.objects.get_or_create(provider_id=call_sid, defaults={"type":"voice","direction":"inbound"})
-    VoiceCall.objects.create(log=log, from_number=from_number, to_number=to_number, status=status)
+    if not call_sid:
+        return HttpResponse(status=400)
+
+    event_type = f"call.{status or 'unknown'}"
+    if data.get("RecordingSid"):
+        event_type = f"call.recording.{data['RecordingSid']}"
+    direction = "outbound" if (data.get("Direction") or "").startswith("outbound") else "inbound"
+
+    with transaction.atomic():
+        if is_duplicate_event("twilio", call_sid, event_type):
+            return HttpResponse("OK")
+
+        # One log and one VoiceCall per CallSid; later callbacks update them in place.
+        ours, theirs = (to_number, from_number) if direction == "inbound" else (from_number, to_number)
+        log, log_created = CommunicationLog.objects.get_or_create(
+            provider_id=call_sid, type="voice",
+            defaults={"direction": direction, "status": status, "office_id": resolve_office(ours)},
+        )
+        if log_created:
+            attach_to_conversation(log, from_number if direction == "inbound" else to_number, "Voice call")
+        call, _ = VoiceCall.objects.select_for_update().get_or_create(
+            call_sid=call_sid,
+            defaults={"log": log, "from_number": from_number or "", "to_number": to_number or ""},
+        )
+        update_fields = _apply_call_status(call, status, data)
+        if update_fields:
+            call.save(update_fields=update_fields)
+            if "status" in update_fields:
+                CommunicationLog.objects.filter(pk=log.pk).update(status=call.status)
     return HttpResponse("OK")
 
+
+def _apply_call_status(call, status, data):
+    """Advance a VoiceCall through its lifecycle; returns the changed fields."""
+    changed = []
+    now = timezone.now()
+    if status and call.can_transition_to(status):
+        call.status = status
+        changed.append("status")
+        if status == "in-progress" and not call.started_at:
+            call.started_at = now
+            changed.append("started_at")
+        if status in VoiceCall.TERMINAL_STATUSES and not call.ended_at:
+            call.ended_at = now
+            changed.append("ended_at")
+    recording_url = data.get("RecordingUrl")
+    if recording_url and recording_url != call.recording_url:
+        call.recording_url = recording_url
+        changed.append("recording_url")
+    return changed
+
+
+def _email_message_id(data):
+    """Message-ID header of an inbound SendGrid post, or a content hash fallback."""
+    headers = HeaderParser().parsestr(data.get("headers") or "")
+    message_id = (headers.get("Message-ID") or "").strip()
+    if message_id:
+        return message_id[:200]
+    digest = hashlib.sha256()
+    for key in ("from", "to", "subject", "text"):
+        digest.update((data.get(key) or "").encode("utf-8"))
+        digest.update(b"\0")
+    return f"sha256:{digest.hexdigest()}"
+
+def _sendgrid_inbound_allowed(request):
+    """
+    Inbound Parse posts are unsigned, so the parse URL carries a shared
+    secret (``?token=`` = SENDGRID_INBOUND_TOKEN). Without one configured,
+    posts are only accepted with DEBUG on.
+    """
+    expected = getattr(settings, "SENDGRID_INBOUND_TOKEN", None)
+    if not expected:
+        return settings.DEBUG
+    return hmac.compare_digest(request.GET.get("token", ""), expected)
+
+
 @csrf_exempt
 def sendgrid_inbound(request):
-    # SendGrid posts raw email data. Validate using SendGrid verification as desired.
+    # SendGrid posts raw email data. The sender is checked and the size capped
+    # before anything is read; attachments then stream straight into the blob
+    # store while the body is parsed.
+    if not _sendgrid_inbound_allowed(request):
+        return HttpResponse(status=403)
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        return HttpResponse(status=400)
+    if content_length > getattr(settings, "SENDGRID_INBOUND_MAX_BYTES", 30 * 1024 * 1024):
+        return HttpResponse(status=413)
+    handler = BlobUploadHandler(request)
+    request.upload_handlers = [handler]
     try:
-        attachments = []
         # Save minimal fields
         data = request.POST.dict()
+        uploads = [f for _, files in request.FILES.lists() for f in files]
+        attachments = [blob_ref(f.blob, filename=f.name) for f in uploads] + handler.skipped
+        message_id = _email_message_id(data)
         from_email = data.get("from")
         to_email = data.get("to")
         subject = data.get("subject","")
         text = data.get("text","")
         html = data.get("html","")
-        log = CommunicationLog.objects.create(type="email", direction="inbound", status="received", payload=data)
-        EmailMessage.objects.create(log=log, from_email=from_email, to_emails=[to_email], subject=subject, body_text=text, body_html=html, attachments=attachments)
+        with transaction.atomic():
+            if is_duplicate_event("sendgrid", message_id, "email.inbound"):
+                return HttpResponse("OK")
+            inline, raw = split_payload("sendgrid.inbound", data)
+            log = CommunicationLog.objects.create(
+                office_id=resolve_office(to_email), type="email", direction="inbound",
+                status="received", provider_id=message_id, payload=inline,
+            )
+            store_raw_payload(log, "sendgrid.inbound", raw)
+            EmailMessage.objects.create(log=log, from_email=from_email, to_emails=[to_email], subject=subject, body_text=text, body_html=html, attachments=attachments)
+            if uploads:
+                log.blobs.add(*{f.blob for f in uploads})
+            attach_to_conversation(log, from_email, subject or text)
     except Exception:
         return HttpResponse(status=400)
     return HttpResponse("OK")
+
+
+@csrf_exempt
+def twilio_status_webhook(request):
+    """Twilio StatusCallback for outbound messages (queued/sent/delivered/undelivered/failed)."""
+    validator = RequestValidator(settings.TWILIO_AUTH_TOKEN)
+    signature = request.META.get("HTTP_X_TWILIO_SIGNATURE", "")
+    params = request.POST.dict()
+    if not validator.validate(request.build_absolute_uri(), params, signature):
+        return HttpResponse(status=403)
+    event = twilio_event(params)
+    if not event["provider_id"] or not event["status"]:
+        return HttpResponse(status=400)
+    record_status_events("twilio", [event])
+    return HttpResponse("OK")
+
+
+@csrf_exempt
+def sendgrid_events_webhook(request):
+    """SendGrid event webhook: a JSON array of delivery and engagement events."""
+    if not verify_sendgrid_signature(
+        request.body,
+        request.META.get("HTTP_X_TWILIO_EMAIL_EVENT_WEBHOOK_SIGNATURE"),
+        request.META.get("HTTP_X_TWILIO_EMAIL_EVENT_WEBHOOK_TIMESTAMP"),
+    ):
+        return HttpResponse(status=403)
+    try:
+        items = json.loads(request.body or b"[]")
+    except ValueError:
+        return HttpResponse(status=400)
+    if not isinstance(items, list):
+        return HttpResponse(status=400)
+    record_status_events("sendgrid", [sendgrid_event(item) for item in items if isinstance(item, dict)])
+    return HttpResponse("OK")
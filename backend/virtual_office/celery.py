@@ -4,4 +4,16 @@ from celery import Celery
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "virtual_office.settings")
 app = Celery("virtual_office")
 app.config_from_object("django.conf:settings", namespace="CELERY")
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+# Periodic housekeeping, run by the celery_beat service.
+app.conf.beat_schedule = {
+    "prune-provider-events": {
+        "task": "communications.tasks.prune_provider_events",
+        "schedule": 3600,
+    },
+    "reschedule-stuck-classifications": {
+        "task": "communications.tasks.reschedule_stuck_classifications",
+        "schedule": 300,
+    },
+}
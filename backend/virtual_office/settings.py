@@ -18,6 +18,15 @@ from datetime import timedelta
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# "openai", "disabled" (no AI auto-replies) or "fake" (canned replies; tests only)
+AI_LLM_BACKEND = os.getenv("AI_LLM_BACKEND", "openai" if OPENAI_API_KEY else "disabled")
+AI_LLM_MODEL = os.getenv("AI_LLM_MODEL", "gpt-4o-mini")
+# Local intent router in front of the LLM: optional naive Bayes fallback and its confidence floor
+AI_INTENT_CLASSIFIER = True
+AI_INTENT_CLASSIFIER_THRESHOLD = 0.8
+# Used when no model latency has been measured yet for an office (intent router savings report)
+AI_LLM_EXPECTED_LATENCY_MS = 1500
+FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -43,6 +52,78 @@ TWILIO_WHATSAPP_NUMBER = "whatsapp:+1234567890"  # optional for WhatsApp
 
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 
+# Provider HTTP clients (one keep-alive pool per worker process)
+PROVIDER_HTTP_POOL_SIZE = 10
+PROVIDER_HTTP_TIMEOUT = 10  # seconds
+TWILIO_API_BASE_URL = os.getenv("TWILIO_API_BASE_URL")  # None = https://api.twilio.com
+SENDGRID_API_BASE_URL = os.getenv("SENDGRID_API_BASE_URL")  # None = https://api.sendgrid.com
+PAYSTACK_API_BASE_URL = os.getenv("PAYSTACK_API_BASE_URL", "https://api.paystack.co")
+# Public base URL of this API; when set, outbound SMS ask Twilio for status callbacks
+COMMS_STATUS_CALLBACK_BASE_URL = os.getenv("COMMS_STATUS_CALLBACK_BASE_URL")
+# Base64 DER public key of SendGrid's signed event webhook (unset = events rejected unless DEBUG)
+SENDGRID_EVENT_WEBHOOK_PUBLIC_KEY = os.getenv("SENDGRID_EVENT_WEBHOOK_PUBLIC_KEY")
+# Inbound Parse: shared secret expected as ?token= on the parse URL, and the largest accepted post
+SENDGRID_INBOUND_TOKEN = os.getenv("SENDGRID_INBOUND_TOKEN")
+SENDGRID_INBOUND_MAX_BYTES = 30 * 1024 * 1024
+
+# Webhook deduplication: size of the per-process recent event-id cache
+COMMS_DEDUP_CACHE_SIZE = 10000
+COMMS_PROVIDER_EVENT_RETENTION = 3 * 24 * 3600  # seconds dedup markers are kept; providers stop retrying well before (SendGrid: 72h)
+# Country code prepended to national-format numbers when threading conversations (e.g. "233")
+COMMS_DEFAULT_COUNTRY_CODE = os.getenv("COMMS_DEFAULT_COUNTRY_CODE", "")
+# Campaigns: recipients per Celery task (and per SendGrid request), and per campaign
+COMMS_CAMPAIGN_CHUNK_SIZE = 100
+COMMS_CAMPAIGN_MAX_RECIPIENTS = 10000
+# Send scheduler: sliding-window limits per provider and per sender number ("<provider>_sender"),
+# {"rate": requests, "per": seconds}. Counters live in the cache, so use a shared one (Redis)
+# when running several workers.
+COMMS_RATE_LIMITS = {
+    "twilio": {"rate": 100, "per": 1},
+    "twilio_sender": {"rate": 1, "per": 1},
+    "sendgrid": {"rate": 50, "per": 1},
+}
+COMMS_RATE_LIMIT_CACHE = "default"
+COMMS_RETRY_BASE_DELAY = 5  # seconds; retries use full-jitter exponential backoff
+COMMS_RETRY_MAX_DELAY = 600
+# Content-addressed store for MMS media and email attachments
+# Keep it outside MEDIA_ROOT: files are only served by BlobDownloadView, which checks the office
+BLOB_STORE_ROOT = os.getenv("BLOB_STORE_ROOT", str(BASE_DIR / "blobstore"))
+BLOB_MAX_BYTES = 25 * 1024 * 1024  # per file; larger uploads/downloads are rejected
+BLOB_CHUNK_SIZE = 64 * 1024  # bytes hashed and written per step
+BLOB_MAX_FILES_PER_REQUEST = 20  # attachments stored per inbound email; the rest are skipped
+# Public directory (cities / offices / office detail): rendered-response cache TTL and client max-age, seconds
+PUBLIC_DIRECTORY_CACHE_TIMEOUT = 300
+PUBLIC_DIRECTORY_MAX_AGE = 60
+# New recurring room bookings are checked for conflicts this many days ahead (open-ended series)
+BOOKING_RECURRENCE_HORIZON_DAYS = 365
+# Public visitors' current office travels in this signed cookie (or the X-Office-Context header), not the session
+OFFICE_CONTEXT_COOKIE_NAME = "office_context"
+OFFICE_CONTEXT_MAX_AGE = 7 * 24 * 3600
+# Cached revocation snapshot used to validate visitor room-access tokens without the database, seconds
+VISITOR_ACCESS_SNAPSHOT_TIMEOUT = 3600
+# Rows fetched per round trip by the streaming office exports (server-side cursor on PostgreSQL)
+EXPORT_CHUNK_SIZE = 2000
+# Raw webhook payloads: per-source overrides of communications.payloads.DEFAULT_POLICY,
+# e.g. {"twilio.sms": {"keep": ["MessageSid", "From", "To"], "raw": "drop"}}; raw is offload|drop|inline
+COMMS_PAYLOAD_POLICY = {}
+COMMS_PAYLOAD_COMPRESSION_LEVEL = 6  # zlib level for offloaded payloads
+# Inbound AI classification: messages per model call, and the longest a message waits for its batch (seconds)
+COMMS_CLASSIFY_BATCH_SIZE = 20
+COMMS_CLASSIFY_MAX_DELAY = 2
+COMMS_CLASSIFY_CLAIM_TIMEOUT = 300  # seconds before a batch's unfinished claim is picked up again
+# Staff notifications: events within this many seconds of a delivery are merged into one digest
+NOTIFY_DIGEST_WINDOW = 60
+NOTIFY_MAX_ATTEMPTS = 5  # failed deliveries (no email/SMS got through) before a notification is marked failed
+NOTIFY_FROM_EMAIL = os.getenv("NOTIFY_FROM_EMAIL", "noreply@yourapp.com")
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+
 # Celery Test Mode
 CELERY_BROKER_URL = "memory://"
 CELERY_RESULT_BACKEND = "cache+memory://"
@@ -183,8 +264,10 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",   # React dev server
     "http://127.0.0.1:3000",
 ]
+CORS_EXPOSE_HEADERS = ["ETag", "X-Office-Context"]
 
-# Session cookies
-SESSION_ENGINE = "django.contrib.sessions.backends.db"
+# Session cookies; SESSION_ENGINE may be e.g. django.contrib.sessions.backends.cached_db
+SESSION_ENGINE = os.getenv("SESSION_ENGINE", "django.contrib.sessions.backends.db")
+SESSION_CACHE_ALIAS = "default"
 SESSION_COOKIE_SAMESITE = "None"
 SESSION_COOKIE_SECURE = True  # REQUIRED if SameSite=None
@@ -30,6 +30,14 @@ REDIS_URL = ENV("REDIS_URL", "redis://redis:6379/0")
 CELERY_BROKER_URL = ENV("CELERY_BROKER_URL", "redis://redis:6379/1")
 CELERY_RESULT_BACKEND = ENV("CELERY_RESULT_BACKEND", "redis://redis:6379/2")
 
+# Shared cache: the comms send scheduler keeps its token buckets here.
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": REDIS_URL,
+    }
+}
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
@@ -59,18 +67,21 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
-SESSION_ENGINE = "django.contrib.sessions.backends.db"
+SESSION_ENGINE = os.getenv("SESSION_ENGINE", "django.contrib.sessions.backends.cached_db")
 SESSION_COOKIE_SECURE = True
 SESSION_COOKIE_SAMESITE = "None"
 CSRF_COOKIE_SECURE = True
 
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = [FRONTEND_URL]
+CORS_EXPOSE_HEADERS = ["ETag", "X-Office-Context"]
 
 STATIC_URL = "/static/"
 MEDIA_URL = "/media/"
 STATIC_ROOT = ENV("STATIC_ROOT", "/vol/web/static")
 MEDIA_ROOT = ENV("MEDIA_ROOT", "/vol/web/media")
+# Outside MEDIA_ROOT: nginx serves /media/ publicly, blobs only go out through BlobDownloadView
+BLOB_STORE_ROOT = ENV("BLOB_STORE_ROOT", "/vol/web/blobs")
 
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
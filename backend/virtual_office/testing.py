@@ -0,0 +1,26 @@
+"""Fixtures shared by the apps' test modules."""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+
+def make_office(username="owner", email="", **fields):
+    """A new user and an office they own and belong to as OWNER; returns (user, office)."""
+    from workspace.models import Membership, Office
+
+    owner = get_user_model().objects.create_user(username=username, email=email)
+    office = Office.objects.create(owner=owner, **{"name": "HQ", **fields})
+    Membership.objects.create(user=owner, office=office, role="OWNER")
+    return owner, office
+
+
+class OfficeAPITestCase(TestCase):
+    """``self.owner`` owns ``self.office`` (built from ``office_fields``); ``self.client`` is logged in as them."""
+    office_fields = {}
+
+    def setUp(self):
+        cache.clear()
+        self.owner, self.office = make_office(**self.office_fields)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
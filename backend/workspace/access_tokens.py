@@ -0,0 +1,153 @@
+"""
+Visitor room-access tokens.
+
+A token is an HS256 JWT naming the submission and room, and recording
+whether the submission was approved and which access policy (and
+Room.access_version) it was issued under. ``validate`` accepts a token
+without touching the database when those claims are still current. It
+checks them against a cached snapshot of revoked submissions, of
+submissions in approval rooms that are not (or no longer) approved and of
+rooms whose policy has changed, plus a tombstone for deleted submissions,
+all fetched in one cache round trip. Tokens that may be stale (pending
+approval, or the policy changed since issue) are checked against the
+database and come back re-issued.
+
+Revoking, approving or changing a room policy bumps a shared version
+counter after commit. A snapshot built for an older version is rebuilt on
+its next use, so concurrent writers never leave a stale set behind. Only
+the caller holding a short cache lock rebuilds; others arriving meanwhile
+check their token against the database instead of all rebuilding at once.
+"""
+from datetime import timedelta
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+ALGORITHM = "HS256"
+VERSION_KEY = "visitor_access:version"
+SNAPSHOT_KEY = "visitor_access:snapshot:v2"
+REBUILD_LOCK_KEY = "visitor_access:rebuild"
+REBUILD_LOCK_TIMEOUT = 30  # seconds; outlives any sane rebuild if the holder dies
+APPROVAL_LIFETIME = timedelta(days=7)
+DEFAULT_LIFETIME = timedelta(hours=24)
+MAX_LIFETIME = max(APPROVAL_LIFETIME, DEFAULT_LIFETIME)
+
+
+class AccessDenied(Exception):
+    def __init__(self, message, status, key="error"):
+        super().__init__(message)
+        self.status = status
+        self.key = key
+
+
+def lifetime(policy):
+    # Approval lasts longer, others shorter.
+    return APPROVAL_LIFETIME if policy == "approval" else DEFAULT_LIFETIME
+
+
+def issue(submission, room, exp=None):
+    """Token for ``submission``; re-issued tokens keep their original ``exp``."""
+    exp = exp or int((timezone.now() + lifetime(room.access_policy)).timestamp())
+    payload = {
+        "submission_id": submission.id,
+        "room_id": room.id,
+        "approved": bool(submission.approved),
+        "policy": room.access_policy,
+        "pv": room.access_version,
+        "exp": exp,
+    }
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm=ALGORITHM)
+
+
+def _tombstone_key(submission_id):
+    return f"visitor_access:deleted:{submission_id}"
+
+
+def snapshot_timeout():
+    return getattr(settings, "VISITOR_ACCESS_SNAPSHOT_TIMEOUT", 3600)
+
+
+def _build(version):
+    from .models import Room, VisitorAccessSubmission
+
+    since = timezone.now() - MAX_LIFETIME
+    revoked = frozenset(
+        VisitorAccessSubmission.objects.filter(revoked=True, created_at__gte=since).values_list("pk", flat=True)
+    )
+    # An "approved" claim only holds while the submission is still approved.
+    unapproved = frozenset(
+        VisitorAccessSubmission.objects.filter(
+            room__access_policy="approval", approved=False, revoked=False, created_at__gte=since,
+        ).values_list("pk", flat=True)
+    )
+    versions = dict(Room.objects.filter(access_version__gt=1).values_list("pk", "access_version"))
+    entry = (version, revoked, unapproved, versions)
+    cache.set(SNAPSHOT_KEY, entry, snapshot_timeout())
+    return entry
+
+
+def _rebuild(version):
+    """A fresh snapshot, or None when another caller is already building one."""
+    if not cache.add(REBUILD_LOCK_KEY, version, REBUILD_LOCK_TIMEOUT):
+        return None
+    try:
+        return _build(version)
+    finally:
+        cache.delete(REBUILD_LOCK_KEY)
+
+
+def changed():
+    """Call after commit whenever revocations, approvals or room policies change."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 0, None)
+        cache.incr(VERSION_KEY)
+
+
+def forget(submission_id):
+    """A deleted submission's tokens stop working (until they would have expired anyway)."""
+    cache.set(_tombstone_key(submission_id), True, int(MAX_LIFETIME.total_seconds()))
+
+
+def validate(token):
+    """
+    ``{"valid": True, "room": room_id}`` (plus a fresh ``token`` after a
+    database check), or raises AccessDenied / jwt errors.
+    """
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+    submission_id, room_id = payload["submission_id"], payload["room_id"]
+
+    found = cache.get_many([VERSION_KEY, SNAPSHOT_KEY, _tombstone_key(submission_id)])
+    if found.get(_tombstone_key(submission_id)):
+        raise AccessDenied("Submission not found", 404)
+    version = found.get(VERSION_KEY, 0)
+    entry = found.get(SNAPSHOT_KEY)
+    if entry is None or entry[0] != version:
+        entry = _rebuild(version)
+        if entry is None:
+            return _validate_from_db(submission_id, room_id, payload["exp"])
+    _, revoked, unapproved, versions = entry
+    if submission_id in revoked:
+        raise AccessDenied("Submission not found", 404)
+
+    current = "pv" in payload and versions.get(room_id, 1) == payload["pv"]
+    approved = payload.get("approved") and submission_id not in unapproved
+    if current and (payload.get("policy") != "approval" or approved):
+        return {"valid": True, "room": room_id}
+    return _validate_from_db(submission_id, room_id, payload["exp"])
+
+
+def _validate_from_db(submission_id, room_id, exp):
+    from .models import VisitorAccessSubmission
+
+    sub = (
+        VisitorAccessSubmission.objects.filter(id=submission_id, room_id=room_id, revoked=False)
+        .select_related("room").first()
+    )
+    if not sub:
+        raise AccessDenied("Submission not found", 404)
+    if sub.room.access_policy == "approval" and not sub.approved:
+        raise AccessDenied("Waiting for approval", 403, key="detail")
+    return {"valid": True, "room": sub.room.id, "token": issue(sub, sub.room, exp=exp)}
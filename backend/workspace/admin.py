@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Office, Room, Worker, WorkerPresence, cityLobby, Membership, Presence, OfficeCity, VisitorAccessSubmission, SupportTicket
+from .models import Office, Room, Worker, WorkerPresence, WorkerPresenceEvent, cityLobby, Membership, Presence, OfficeCity, VisitorAccessSubmission, SupportTicket
 
 
 @admin.register(Office)
@@ -7,6 +7,7 @@ class OfficeAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "city", "owner")
     search_fields = ("name", "city", "owner__username")
     list_filter = ("city",)
+    readonly_fields = ("coordinates",)  # mirrors lat/lng; edit those instead
 
 
 @admin.register(Room)
@@ -48,6 +49,11 @@ class WorkerAdmin(admin.ModelAdmin):
 @admin.register(WorkerPresence)
 class WorkerPresenceAdmin(admin.ModelAdmin):
     list_display = ( "worker", "is_presence", "last_login_time", "last_logout_at")
+
+@admin.register(WorkerPresenceEvent)
+class WorkerPresenceEventAdmin(admin.ModelAdmin):
+    list_display = ("worker", "office", "kind", "at")
+    list_filter = ("kind", "office")
    
 @admin.register(VisitorAccessSubmission)
 class VisitorAccessSubmissionAdmin(admin.ModelAdmin):
@@ -0,0 +1,127 @@
+"""
+Live approval queue for rooms with the ``approval`` access policy.
+
+Staff of an office subscribe to ``approvals_{office_id}``
+(communications.consumers.ApprovalQueueConsumer). New pending submissions
+are pushed there as they arrive, and bulk approve/revoke outcomes are
+pushed there after commit. The waiting visitors hear about the outcome on
+the public presence socket of the office. The queue itself is one query
+on the (office, approved, revoked, created_at) index.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import connection, transaction
+from . import access_tokens
+from .models import VisitorAccessSubmission
+
+APPROVE, REVOKE = "approve", "revoke"
+MAX_BATCH = 500
+QUEUE_LIMIT = 200
+
+
+class ApprovalError(Exception):
+    pass
+
+
+def queue_group(office_id):
+    return f"approvals_{office_id}"
+
+
+def is_staff(user, office):
+    from communications.notifications import office_staff
+
+    return office_staff(office).filter(pk=user.pk).exists()
+
+
+def payload(submission):
+    return {
+        "id": submission.id,
+        "room": submission.room_id,
+        "room_name": submission.room.name,
+        "visitor_id": submission.visitor_id,
+        "name": submission.name,
+        "email": submission.email,
+        "phone": submission.phone,
+        "data": submission.data,
+        "created_at": submission.created_at.isoformat(),
+    }
+
+
+def pending(office, limit=QUEUE_LIMIT):
+    """Oldest-first submissions waiting for a decision in ``office``'s approval rooms."""
+    qs = (
+        VisitorAccessSubmission.objects.filter(office=office, approved=False, revoked=False)
+        .filter(room__access_policy="approval")
+        .select_related("room").order_by("created_at", "id")
+    )
+    return [payload(submission) for submission in qs[:limit]]
+
+
+def _send(group, event):
+    async_to_sync(get_channel_layer().group_send)(group, event)
+
+
+def announce(submission):
+    """Push a new pending submission to the office's queue once it is committed."""
+    data = payload(submission)
+    office_id = submission.office_id
+    transaction.on_commit(lambda: _send(
+        queue_group(office_id),
+        {"type": "approval.event", "payload": {"type": "approval.pending", "submission": data}},
+    ))
+
+
+def decide(office, ids, action, user=None):
+    """
+    Approve or revoke the submissions ``ids`` of ``office`` in one update.
+    Returns the ids that actually changed; staff and the waiting visitors
+    are told after commit.
+    """
+    if action not in (APPROVE, REVOKE):
+        raise ApprovalError("action must be 'approve' or 'revoke'")
+    if not isinstance(ids, list) or not ids:
+        raise ApprovalError("ids must be a non-empty list")
+    if len(ids) > MAX_BATCH:
+        raise ApprovalError(f"Decide at most {MAX_BATCH} submissions at a time.")
+    try:
+        ids = [int(pk) for pk in ids]
+    except (TypeError, ValueError):
+        raise ApprovalError("ids must be submission ids")
+
+    targets = VisitorAccessSubmission.objects.filter(office=office, pk__in=ids, revoked=False)
+    if action == APPROVE:
+        targets = targets.filter(approved=False)
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            targets = targets.select_for_update()
+        changed = list(targets.values_list("pk", "room_id"))
+        changes = {"approved": True} if action == APPROVE else {"revoked": True}
+        VisitorAccessSubmission.objects.filter(pk__in=[pk for pk, _ in changed]).update(**changes)
+        if changed:
+            transaction.on_commit(lambda: _decided(office, action, changed, user))
+    return [pk for pk, _ in changed]
+
+
+def _decided(office, action, changed, user):
+    # Queryset updates skip the model signals that refresh the token snapshot.
+    access_tokens.changed()
+    outcome = "approved" if action == APPROVE else "revoked"
+    _send(queue_group(office.pk), {
+        "type": "approval.event",
+        "payload": {
+            "type": "approval.decided",
+            "outcome": outcome,
+            "by": getattr(user, "username", None),
+            "submissions": [pk for pk, _ in changed],
+        },
+    })
+    # Only ids go to the public socket: visitors match their own submission id
+    # and re-validate their token, which comes back re-issued.
+    _send(f"public_office_{office.public_slug}", {
+        "type": "presence.broadcast",
+        "payload": {
+            "type": "access.decision",
+            "outcome": outcome,
+            "submissions": [{"id": pk, "room": room_id} for pk, room_id in changed],
+        },
+    })
@@ -0,0 +1,197 @@
+"""
+Per-room, per-day free/busy bitmaps.
+
+Each UTC day is cut into SLOT_MINUTES slots; RoomDayAvailability.busy stores
+one bit per slot (set = booked, including partially booked slots), so a
+missing row means the room is free all day. The RoomBooking signals in
+models.py recompute the affected days inside the booking's transaction.
+Recurring series are not stored in the bitmaps; searches expand them for
+the searched days only and OR them in.
+
+Searches load the bitmaps of every candidate room in one query and answer
+with integer bit operations in memory: "free between 2pm and 5pm" is one
+AND per room, and "next free 30 minutes" a few shifts and ANDs.
+"""
+import math
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.db.models import FilteredRelation, Q
+from .models import Room, RoomBooking, RoomBookingException, RoomDayAvailability
+from .recurrence import expand, load_exceptions, window_q
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+DAY_BYTES = SLOTS_PER_DAY // 8
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+SLOT = timedelta(minutes=SLOT_MINUTES)
+
+
+def day_start(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def days_between(start, end):
+    """UTC days touched by ``[start, end)``."""
+    first = start.astimezone(dt_timezone.utc).date()
+    last = (end - timedelta(microseconds=1)).astimezone(dt_timezone.utc).date()
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def span_mask(day, start, end):
+    """Bits of every slot of ``day`` that ``[start, end)`` touches."""
+    begin = (max(start, day_start(day)) - day_start(day)) / SLOT
+    finish = (min(end, day_start(day) + timedelta(days=1)) - day_start(day)) / SLOT
+    first, last = math.floor(begin), math.ceil(finish)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def to_bytes(mask):
+    return mask.to_bytes(DAY_BYTES, "little")
+
+
+def from_bytes(data):
+    return int.from_bytes(bytes(data), "little") if data else 0
+
+
+# -- maintenance -----------------------------------------------------------
+def refresh(room_id, days):
+    """Recompute the bitmaps of ``room_id`` for ``days`` from its bookings."""
+    days = sorted(set(days))
+    if not days:
+        return
+    lower, upper = day_start(days[0]), day_start(days[-1]) + timedelta(days=1)
+    masks = dict.fromkeys(days, 0)
+    bookings = RoomBooking.objects.filter(room_id=room_id, recurrence="", start_time__lt=upper, end_time__gt=lower)
+    for start, end in bookings.values_list("start_time", "end_time"):
+        for day in days_between(start, end):
+            if day in masks:
+                masks[day] |= span_mask(day, start, end)
+
+    RoomDayAvailability.objects.filter(room_id=room_id, day__in=days).delete()
+    RoomDayAvailability.objects.bulk_create([
+        RoomDayAvailability(room_id=room_id, day=day, busy=to_bytes(mask))
+        for day, mask in masks.items() if mask
+    ])
+
+
+def refresh_for_spans(spans):
+    """Refresh the days touched by ``[(room_id, start, end), ...]``."""
+    days = {}
+    for room_id, start, end in spans:
+        if room_id and start and end and end > start:
+            days.setdefault(room_id, set()).update(days_between(start, end))
+    for room_id, room_days in days.items():
+        refresh(room_id, room_days)
+
+
+def rebuild(rooms=None):
+    """Recompute every bitmap of ``rooms`` (default: all rooms) from scratch."""
+    rooms = Room.objects.all() if rooms is None else rooms
+    count = 0
+    for room_id in rooms.values_list("pk", flat=True).iterator():
+        spans = RoomBooking.objects.filter(room_id=room_id, recurrence="").values_list("start_time", "end_time")
+        days = {day for start, end in spans if end > start for day in days_between(start, end)}
+        RoomDayAvailability.objects.filter(room_id=room_id).exclude(day__in=days).delete()
+        refresh(room_id, days)
+        count += 1
+    return count
+
+
+# -- searches --------------------------------------------------------------
+def load(office, days, min_capacity=None):
+    """
+    ``[(room, {day: busy mask})]`` for the rooms of ``office``, smallest fitting
+    room first, in a single query.
+    """
+    rooms = Room.objects.filter(office=office)
+    if min_capacity:
+        rooms = rooms.filter(capacity__gte=min_capacity)
+    rows = (
+        rooms.annotate(avail=FilteredRelation("day_availability", condition=Q(day_availability__day__in=days)))
+        .values_list("id", "name", "capacity", "avail__day", "avail__busy")
+        .order_by("capacity", "id")
+    )
+    result, index = [], {}
+    for room_id, name, capacity, day, busy in rows:
+        if room_id not in index:
+            index[room_id] = len(result)
+            result.append(({"id": room_id, "name": name, "capacity": capacity}, {}))
+        if day is not None:
+            result[index[room_id]][1][day] = from_bytes(busy)
+    _overlay_series(result, days)
+    return result
+
+
+def _overlay_series(result, days):
+    """OR in the occurrences of recurring bookings, which the stored bitmaps leave out."""
+    if not result or not days:
+        return
+    window_start, window_end = day_start(days[0]), day_start(days[-1]) + timedelta(days=1)
+    masks = {room["id"]: busy for room, busy in result}
+    series = list(
+        RoomBooking.objects.filter(window_q(window_start, window_end), room_id__in=list(masks))
+        .exclude(recurrence="")
+        .only("id", "room_id", "start_time", "end_time", "recurrence")
+    )
+    if not series:
+        return
+    exceptions = load_exceptions(RoomBookingException, [row.pk for row in series], window_start, window_end)
+    wanted = set(days)
+    for occurrence in expand(series, window_start, window_end, exceptions):
+        busy = masks[occurrence.series.room_id]
+        for day in days_between(occurrence.start, occurrence.end):
+            if day in wanted:
+                busy[day] = busy.get(day, 0) | span_mask(day, occurrence.start, occurrence.end)
+
+
+def free_rooms(office, start, end, min_capacity=None):
+    """Rooms of ``office`` with no booking in ``[start, end)``, smallest first."""
+    days = days_between(start, end)
+    windows = {day: span_mask(day, start, end) for day in days}
+    return [
+        room for room, busy in load(office, days, min_capacity)
+        if not any(busy.get(day, 0) & window for day, window in windows.items())
+    ]
+
+
+def first_free_room(office, start, end, min_capacity=None):
+    rooms = free_rooms(office, start, end, min_capacity)
+    return rooms[0] if rooms else None
+
+
+def _first_run(free, length, from_slot):
+    """Lowest slot >= from_slot starting ``length`` consecutive set bits, or None."""
+    runs = free
+    for shift in range(1, length):
+        runs &= free >> shift
+    runs >>= from_slot
+    if not runs:
+        return None
+    return from_slot + (runs & -runs).bit_length() - 1
+
+
+def next_free_slot(office, after, duration, min_capacity=None, days=7):
+    """
+    Earliest ``(room, start, end)`` of length ``duration`` starting at or
+    after ``after`` (rounded up to a slot) within ``days``, or None. Slots
+    do not run past midnight UTC, so ``duration`` is at most a day.
+    """
+    length = max(1, math.ceil(duration / SLOT))
+    if length > SLOTS_PER_DAY:
+        raise ValueError("duration must be at most one day")
+    search = days_between(after, after + timedelta(days=days))
+    rooms = load(office, search, min_capacity)
+    for day in search:
+        from_slot = 0
+        if day == search[0]:
+            from_slot = max(0, math.ceil((after - day_start(day)) / SLOT))
+        best = None
+        for room, busy in rooms:
+            slot = _first_run(FULL_DAY & ~busy.get(day, 0), length, from_slot)
+            if slot is not None and (best is None or slot < best[1]):
+                best = (room, slot)
+        if best:
+            start = day_start(day) + best[1] * SLOT
+            return best[0], start, start + length * SLOT
+    return None
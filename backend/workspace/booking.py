@@ -0,0 +1,260 @@
+"""
+Room booking engine.
+
+Bookings are half-open intervals ``[start_time, end_time)`` per room,
+optionally recurring (see workspace.recurrence). All writes go through
+``book`` / ``reschedule`` / ``move_occurrence``, which check for overlaps,
+series expanded lazily for the checked window, under a per-room lock; on
+PostgreSQL the ``roombooking_no_overlap`` GiST exclusion constraint
+(migrations 0021, 0023) backs this up for single bookings. ``free_slots`` answers
+"what is free in this office between A and B" for every room at once.
+"""
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, FilteredRelation, Q
+from django.utils import timezone
+from . import recurrence as recurring
+from .models import Room, RoomBooking, RoomBookingException
+
+EXCLUSION_CONSTRAINT = "roombooking_no_overlap"
+MAX_SEARCH_DAYS = 31
+
+SeriesRow = namedtuple("SeriesRow", "pk room_id start_time end_time recurrence")
+
+
+class BookingError(Exception):
+    pass
+
+
+class BookingConflict(BookingError):
+    def __init__(self, room, start, end):
+        super().__init__(f"{room.name} is already booked at that time.")
+        self.room = room
+        self.start = start
+        self.end = end
+
+
+def overlapping(start, end, prefix=""):
+    """Q for bookings intersecting ``[start, end)``."""
+    return Q(**{f"{prefix}start_time__lt": end, f"{prefix}end_time__gt": start})
+
+
+def recurrence_horizon():
+    """How far ahead new recurring bookings are checked for conflicts."""
+    return timedelta(days=getattr(settings, "BOOKING_RECURRENCE_HORIZON_DAYS", 365))
+
+
+def occurrences(rooms, start, end, exclude=None, skip=None):
+    """
+    Occurrences of the bookings of ``rooms`` (a queryset or list of ids)
+    intersecting ``[start, end)``, recurring series expanded for that window
+    only. ``exclude`` leaves out one booking/series, ``skip`` one occurrence
+    ``(series_id, original_start)``.
+    """
+    rows = RoomBooking.objects.filter(recurring.window_q(start, end), room__in=rooms)
+    if exclude is not None:
+        rows = rows.exclude(pk=exclude.pk)
+    rows = list(rows.only("id", "room_id", "start_time", "end_time", "recurrence"))
+    exceptions = recurring.load_exceptions(
+        RoomBookingException, [r.pk for r in rows if r.recurrence], start, end,
+    )
+    if skip is not None:
+        exceptions[skip] = None
+    return recurring.expand(rows, start, end, exceptions)
+
+
+def find_conflict(room, spans, exclude=None, skip=None):
+    """First existing occurrence overlapping any of ``spans`` [(start, end)], or None."""
+    spans = sorted(spans)
+    if not spans:
+        return None
+    busy = sorted(
+        (o.start, o.end) for o in occurrences([room.pk], spans[0][0], max(e for _, e in spans), exclude, skip)
+    )
+    i = 0
+    for start, end in spans:
+        while i < len(busy) and busy[i][1] <= start:
+            i += 1
+        j = i
+        while j < len(busy) and busy[j][0] < end:
+            if busy[j][1] > start:
+                return busy[j]
+            j += 1
+    return None
+
+
+def validate_interval(start, end):
+    if not start or not end:
+        raise BookingError("Both a start and an end time are required.")
+    if timezone.is_naive(start) or timezone.is_naive(end):
+        raise BookingError("Times must include a timezone.")
+    if end <= start:
+        raise BookingError("The end time must be after the start time.")
+
+
+def series_spans(booking):
+    """Occurrence spans of a (possibly unsaved) booking up to the conflict horizon."""
+    if not booking.recurrence:
+        return [(booking.start_time, booking.end_time)]
+    limit = booking.start_time + recurrence_horizon()
+    if booking.recurrence_until:
+        limit = min(limit, booking.recurrence_until)
+    return [(o.start, o.end) for o in recurring.expand([booking], booking.start_time, limit)]
+
+
+def _lock_room(room_id):
+    """Serialize bookers of one room."""
+    if connection.features.has_select_for_update:
+        list(Room.objects.select_for_update().filter(pk=room_id).values_list("pk", flat=True))
+    else:
+        # SQLite: the first write of a transaction takes the database write lock until commit.
+        Room.objects.filter(pk=room_id).update(capacity=F("capacity"))
+
+
+def _write(room, spans, save, exclude=None, skip=None):
+    with transaction.atomic():
+        _lock_room(room.pk)
+        taken = find_conflict(room, spans, exclude=exclude, skip=skip)
+        if taken:
+            raise BookingConflict(room, *taken)
+        try:
+            with transaction.atomic():
+                return save()
+        except IntegrityError as exc:
+            if EXCLUSION_CONSTRAINT in str(exc):
+                raise BookingConflict(room, spans[0][0], spans[0][1]) from exc
+            raise
+
+
+def _prepare(booking):
+    validate_interval(booking.start_time, booking.end_time)
+    try:
+        booking.recurrence_until = recurring.series_until(booking.recurrence, booking.start_time, booking.end_time)
+    except ValueError as exc:
+        raise BookingError(str(exc)) from exc
+    return series_spans(booking)
+
+
+def book(room, start, end, recurrence="", **fields):
+    """
+    Create a booking of ``room``, optionally recurring (an RRULE string);
+    raises BookingConflict when any occurrence is taken.
+    """
+    booking = RoomBooking(room=room, start_time=start, end_time=end, recurrence=recurrence or "", **fields)
+    spans = _prepare(booking)
+
+    def save():
+        booking.save()
+        return booking
+
+    return _write(room, spans, save)
+
+
+def reschedule(booking, start, end):
+    """Move a booking, or a whole series (its first occurrence becomes ``start``)."""
+    booking.start_time, booking.end_time = start, end
+    spans = _prepare(booking)
+
+    def save():
+        booking.save(update_fields=["start_time", "end_time"])
+        return booking
+
+    return _write(booking.room, spans, save, exclude=booking)
+
+
+def _check_occurrence(series, original_start):
+    if not series.recurrence:
+        raise BookingError("Only recurring bookings have occurrences.")
+    if not recurring.occurs_at(series, original_start):
+        raise BookingError("That is not an occurrence of this booking.")
+
+
+def move_occurrence(series, original_start, start, end):
+    """Move one occurrence of a recurring booking to ``[start, end)``."""
+    _check_occurrence(series, original_start)
+    validate_interval(start, end)
+
+    def save():
+        RoomBookingException.objects.update_or_create(
+            series=series, original_start=original_start, defaults={"start_time": start, "end_time": end},
+        )
+        return series
+
+    return _write(series.room, [(start, end)], save, skip=(series.pk, original_start))
+
+
+def cancel_occurrence(series, original_start):
+    """Cancel one occurrence of a recurring booking."""
+    _check_occurrence(series, original_start)
+    RoomBookingException.objects.update_or_create(
+        series=series, original_start=original_start, defaults={"start_time": None, "end_time": None},
+    )
+
+
+def free_slots(office, start, end, duration=None, min_capacity=None):
+    """
+    Free intervals of every room of ``office`` within ``[start, end)``.
+
+    Returns ``[{"room": {...}, "slots": [(slot_start, slot_end), ...]}]`` in
+    room order; gaps shorter than ``duration`` (a timedelta) are left out.
+    One query, plus one for the exceptions when recurring series are involved.
+    """
+    validate_interval(start, end)
+    if end - start > timedelta(days=MAX_SEARCH_DAYS):
+        raise BookingError(f"Search at most {MAX_SEARCH_DAYS} days at a time.")
+    duration = duration or timedelta(0)
+
+    def fits(slot_start, slot_end):
+        return slot_end > slot_start and slot_end - slot_start >= duration
+
+    rooms = Room.objects.filter(office=office)
+    if min_capacity:
+        rooms = rooms.filter(capacity__gte=min_capacity)
+    rows = (
+        rooms.annotate(busy=FilteredRelation("roombooking", condition=recurring.window_q(start, end, "roombooking__")))
+        .values_list("id", "name", "capacity", "busy__id", "busy__start_time", "busy__end_time", "busy__recurrence")
+        .order_by("id")
+    )
+
+    result, busy, series = {}, {}, []
+    for room_id, name, capacity, booking_id, busy_start, busy_end, rule in rows:
+        if room_id not in result:
+            result[room_id] = {"room": {"id": room_id, "name": name, "capacity": capacity}, "slots": []}
+            busy[room_id] = []
+        if booking_id is None:
+            continue
+        if rule:
+            series.append(SeriesRow(booking_id, room_id, busy_start, busy_end, rule))
+        else:
+            busy[room_id].append((busy_start, busy_end))
+    if series:
+        exceptions = recurring.load_exceptions(RoomBookingException, [row.pk for row in series], start, end)
+        for occurrence in recurring.expand(series, start, end, exceptions):
+            busy[occurrence.series.room_id].append((occurrence.start, occurrence.end))
+
+    for room_id, entry in result.items():
+        cursor = start
+        for busy_start, busy_end in sorted(busy[room_id]):
+            if fits(cursor, busy_start):
+                entry["slots"].append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if fits(cursor, end):
+            entry["slots"].append((cursor, end))
+    return list(result.values())
+
+
+def suggest(office, start, end, limit=3, horizon=timedelta(days=1)):
+    """
+    Up to ``limit`` alternatives of the same length as ``[start, end)``,
+    earliest first, from the free slots in the following ``horizon``.
+    """
+    duration = end - start
+    options = [
+        (slot_start, entry["room"])
+        for entry in free_slots(office, start, start + horizon, duration=duration)
+        for slot_start, _ in entry["slots"]
+    ]
+    options.sort(key=lambda option: (option[0], option[1]["id"]))
+    return [(room, slot_start, slot_start + duration) for slot_start, room in options[:limit]]
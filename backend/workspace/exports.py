@@ -0,0 +1,148 @@
+"""
+Streaming compliance exports of visitor submissions and room bookings.
+
+Rows are read with ``iterator(chunk_size=...)`` (a server-side cursor on
+PostgreSQL), encoded as CSV or JSON Lines and sent in blocks of roughly
+BLOCK_BYTES through a StreamingHttpResponse, optionally gzip-compressed on
+the fly, so memory stays flat however many rows an office has. Room and
+date-range filters use the (room, created_at) / (room, start_time) indexes.
+Under ASGI the blocks are pulled one at a time through ``sync_to_async``;
+handing Django the plain generator there would make it buffer the whole
+export before sending a byte.
+"""
+import csv
+import io
+import json
+import zlib
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .models import RoomBooking, VisitorAccessSubmission
+
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+BLOCK_BYTES = 64 * 1024
+# Spreadsheets run CSV cells starting with these as formulas.
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+DATASETS = {
+    "submissions": {
+        "model": VisitorAccessSubmission,
+        "time_field": "created_at",
+        "columns": (
+            "id", "room_id", "room__name", "visitor_id", "name", "email", "phone",
+            "approved", "revoked", "created_at", "data",
+        ),
+    },
+    "bookings": {
+        "model": RoomBooking,
+        "time_field": "start_time",
+        "columns": (
+            "id", "room_id", "room__name", "visitor_name", "visitor_email", "start_time", "end_time",
+            "recurrence", "confirmed", "created_at",
+        ),
+    },
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+def chunk_size():
+    return getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+
+
+def rows(office, dataset, room=None, since=None, until=None):
+    """Value tuples of ``dataset`` for ``office``, oldest first."""
+    spec = DATASETS.get(dataset)
+    if spec is None:
+        raise ExportError(f"dataset must be one of {sorted(DATASETS)}")
+    time_field = spec["time_field"]
+    qs = spec["model"].objects.filter(room__office=office)
+    if room:
+        qs = qs.filter(room_id=room)
+    if since:
+        qs = qs.filter(**{f"{time_field}__gte": since})
+    if until:
+        qs = qs.filter(**{f"{time_field}__lt": until})
+    qs = qs.order_by(time_field, "id").values_list(*spec["columns"])
+    return spec["columns"], qs.iterator(chunk_size=chunk_size())
+
+
+def _cell(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=DjangoJSONEncoder)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return "" if value is None else value
+
+
+def _lines(columns, values, fmt):
+    names = [c.replace("__", "_") for c in columns]
+    if fmt == "jsonl":
+        for row in values:
+            yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + "\n"
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for row in values:
+        writer.writerow([_cell(v) for v in row])
+        if buffer.tell() >= BLOCK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode(columns, values, fmt, compress=False):
+    """Yield ``bytes`` blocks of the export, gzip-compressed when ``compress``."""
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    block, size = [], 0
+    for text in _lines(columns, values, fmt):
+        data = text.encode("utf-8")
+        block.append(data)
+        size += len(data)
+        if size >= BLOCK_BYTES:
+            out = b"".join(block)
+            block, size = [], 0
+            out = gzip.compress(out) if gzip else out
+            if out:
+                yield out
+    out = b"".join(block)
+    if gzip:
+        out = gzip.compress(out) + gzip.flush()
+    if out:
+        yield out
+
+
+async def _blocks_async(blocks):
+    """Async view of ``blocks``, advancing the sync generator (and its cursor) in the sync thread."""
+    step = sync_to_async(next)
+    while True:
+        block = await step(blocks, None)
+        if block is None:
+            return
+        yield block
+
+
+def response(office, dataset, fmt="csv", compress=False, asynchronous=False, **filters):
+    """The export as a StreamingHttpResponse; pass ``asynchronous`` when served under ASGI."""
+    if fmt not in FORMATS:
+        raise ExportError(f"type must be one of {sorted(FORMATS)}")
+    columns, values = rows(office, dataset, **filters)
+    filename = f"{office.public_slug or office.pk}-{dataset}-{timezone.now():%Y%m%d}.{fmt}"
+    if compress:
+        filename += ".gz"
+    blocks = encode(columns, values, fmt, compress)
+    result = StreamingHttpResponse(
+        _blocks_async(blocks) if asynchronous else blocks,
+        content_type="application/gzip" if compress else f"{FORMATS[fmt]}; charset=utf-8",
+    )
+    result["Content-Disposition"] = f'attachment; filename="{filename}"'
+    result["Cache-Control"] = "private, no-store"
+    return result
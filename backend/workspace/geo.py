@@ -0,0 +1,227 @@
+"""
+Nearby offices and cities.
+
+Public offices (placed at their city's centre when they have no
+coordinates of their own) and cities with coordinates are held in an
+in-process grid index: points are bucketed into CELL_DEGREES cells, so a
+radius query only looks at the cells the circle can touch and nearest-k
+widens the radius until it has k exact hits.
+
+Office and OfficeCity signals (models.py) update the index of the process
+that made the change after commit and bump a shared version counter in the
+cache; other processes see the version move and rebuild on their next
+query.
+"""
+import math
+import threading
+from collections import defaultdict
+from django.core.cache import cache
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+CELL_DEGREES = 1.0
+MAX_RADIUS_KM = math.pi * EARTH_RADIUS_KM
+VERSION_KEY = "geo:index:version"
+
+
+def parse_point(value):
+    """(lat, lng) from ``{"lat", "lng"}``-style dicts or ``[lat, lng]``, or None."""
+    if isinstance(value, dict):
+        lat = value.get("lat", value.get("latitude"))
+        lng = value.get("lng", value.get("lon", value.get("longitude")))
+    elif isinstance(value, (list, tuple)) and len(value) == 2:
+        lat, lng = value
+    else:
+        return None
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlmb = phi2 - phi1, math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    def __init__(self, cell=CELL_DEGREES):
+        self.cell = cell
+        self.rows = math.ceil(180 / cell)
+        self.cols = math.ceil(360 / cell)
+        self.cells = defaultdict(dict)
+        self.where = {}
+
+    def __len__(self):
+        return len(self.where)
+
+    def _cell(self, lat, lng):
+        row = min(self.rows - 1, int((lat + 90) // self.cell))
+        col = int((lng + 180) // self.cell) % self.cols
+        return row, col
+
+    def put(self, key, lat, lng, item):
+        self.remove(key)
+        cell = self._cell(lat, lng)
+        self.cells[cell][key] = (lat, lng, item)
+        self.where[key] = cell
+
+    def remove(self, key):
+        cell = self.where.pop(key, None)
+        if cell is not None:
+            self.cells[cell].pop(key, None)
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+    def within(self, lat, lng, radius_km):
+        """``[(distance_km, item)]`` within ``radius_km``, nearest first."""
+        dlat = radius_km / KM_PER_DEGREE
+        lat_lo, lat_hi = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+        row_lo, row_hi = self._cell(lat_lo, 0)[0], self._cell(lat_hi, 0)[0]
+        widest = max(abs(lat_lo), abs(lat_hi))
+        if widest >= 89.9 or radius_km >= MAX_RADIUS_KM / 2:
+            cols = range(self.cols)
+        else:
+            dlng = dlat / math.cos(math.radians(widest))
+            if dlng >= 180:
+                cols = range(self.cols)
+            else:
+                first, last = self._cell(lat, lng - dlng)[1], self._cell(lat, lng + dlng)[1]
+                span = (last - first) % self.cols
+                cols = [(first + i) % self.cols for i in range(span + 1)]
+
+        hits = []
+        for row in range(row_lo, row_hi + 1):
+            for col in cols:
+                for p_lat, p_lng, item in self.cells.get((row, col), {}).values():
+                    distance = haversine_km(lat, lng, p_lat, p_lng)
+                    if distance <= radius_km:
+                        hits.append((distance, item))
+        hits.sort(key=lambda hit: hit[0])
+        return hits
+
+    def nearest(self, lat, lng, k, max_km=None):
+        """The ``k`` nearest ``[(distance_km, item)]``, optionally capped at ``max_km``."""
+        limit = min(max_km or MAX_RADIUS_KM, MAX_RADIUS_KM)
+        radius = min(self.cell * KM_PER_DEGREE, limit)
+        while True:
+            hits = self.within(lat, lng, radius)
+            if len(hits) >= k or radius >= limit:
+                return hits[:k]
+            radius = min(radius * 4, limit)
+
+
+# -- process-wide indexes ---------------------------------------------------
+_lock = threading.Lock()
+_state = {"version": None, "offices": None, "cities": None}
+
+
+def _office_rows(**filters):
+    from .models import Office
+
+    return (
+        Office.objects.filter(public=True, **filters)
+        .values_list("id", "name", "public_slug", "lat", "lng", "city__city", "city__lat", "city__lng")
+    )
+
+
+def _put_office(index, row):
+    office_id, name, slug, lat, lng, city, city_lat, city_lng = row
+    approximate = lat is None or lng is None
+    if approximate:
+        lat, lng = city_lat, city_lng
+    if lat is None or lng is None:
+        index.remove(office_id)
+        return
+    item = {
+        "id": office_id, "name": name, "public_slug": slug, "city": city,
+        "lat": lat, "lng": lng, "approximate": approximate,
+    }
+    index.put(office_id, lat, lng, item)
+
+
+def _put_city(index, city):
+    city_id, name, country, slug, lat, lng = city
+    if lat is None or lng is None:
+        index.remove(city_id)
+        return
+    index.put(city_id, lat, lng, {"id": city_id, "city": name, "country": country, "slug": slug, "lat": lat, "lng": lng})
+
+
+def _city_rows(**filters):
+    from .models import OfficeCity
+
+    return OfficeCity.objects.filter(**filters).values_list("id", "city", "country", "slug", "lat", "lng")
+
+
+def _rebuild(version):
+    offices, cities = GridIndex(), GridIndex()
+    for row in _office_rows():
+        _put_office(offices, row)
+    for row in _city_rows(lat__isnull=False, lng__isnull=False):
+        _put_city(cities, row)
+    _state.update(version=version, offices=offices, cities=cities)
+
+
+def get_index(kind):
+    """The current "offices" or "cities" GridIndex, rebuilt when another process changed data."""
+    version = cache.get(VERSION_KEY, 0)
+    with _lock:
+        if _state[kind] is None or _state["version"] != version:
+            _rebuild(version)
+        return _state[kind]
+
+
+def _bump(apply=None):
+    """Apply a local change and advance the shared version."""
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 0, None)
+        version = cache.incr(VERSION_KEY)
+    with _lock:
+        if apply is not None and _state["offices"] is not None and _state["version"] == version - 1:
+            apply(_state["offices"], _state["cities"])
+            _state["version"] = version
+        else:
+            _state["offices"] = _state["cities"] = None  # rebuild on next use
+
+
+def office_changed(office_id):
+    def apply(offices, cities):
+        rows = list(_office_rows(pk=office_id))
+        if rows:
+            _put_office(offices, rows[0])
+        else:
+            offices.remove(office_id)
+
+    _bump(apply)
+
+
+def city_changed(city_id, deleted=False):
+    if deleted:
+        _bump()  # its offices were detached without signals
+        return
+
+    def apply(offices, cities):
+        rows = list(_city_rows(pk=city_id))
+        if rows:
+            _put_city(cities, rows[0])
+        else:
+            cities.remove(city_id)
+        for row in _office_rows(city_id=city_id):
+            _put_office(offices, row)
+
+    _bump(apply)
+
+
+def nearby(kind, lat, lng, k=10, radius_km=None):
+    """Nearest ``k`` public offices or cities, optionally within ``radius_km``."""
+    index = get_index(kind)
+    hits = index.within(lat, lng, radius_km)[:k] if radius_km else index.nearest(lat, lng, k)
+    return [{**item, "distance_km": round(distance, 3)} for distance, item in hits]
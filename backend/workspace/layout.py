@@ -0,0 +1,121 @@
+"""
+Floor-plan saves.
+
+An editor posts every room of the plan with the office ``layout_version``
+it loaded. All referenced rooms are read in one query, only the fields that
+actually changed are written with a single ``bulk_update``, and the version
+is bumped with a compare-and-swap, so a save based on a stale plan is
+rejected instead of silently overwriting a co-editor. The diff is pushed to
+the office presence group once the transaction commits.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import F
+from . import access_tokens
+from .models import Office, Room
+
+LAYOUT_FIELDS = ("x", "y", "width", "height", "config", "access_policy", "access_config")
+
+
+class LayoutError(Exception):
+    pass
+
+
+class LayoutConflict(LayoutError):
+    def __init__(self, current_version):
+        super().__init__("Layout was changed by someone else; reload and try again.")
+        self.current_version = current_version
+
+
+def diff_rooms(rooms, rooms_data):
+    """(changed Room objects, {room_id: {field: new value}}) for ``rooms_data``."""
+    by_id = {room.pk: room for room in rooms}
+    changed, diff = [], {}
+    for data in rooms_data:
+        room = by_id.get(data.get("id"))
+        if room is None:
+            continue
+        fields = {
+            name: data[name] for name in LAYOUT_FIELDS
+            if name in data and data[name] != getattr(room, name)
+        }
+        if fields:
+            for name, value in fields.items():
+                setattr(room, name, value)
+            changed.append(room)
+            diff[room.pk] = fields
+    return changed, diff
+
+
+def save_layout(user, rooms_data, expected_version=None):
+    """
+    Apply a floor-plan save by ``user``. Rooms outside the user's offices are
+    ignored. Returns (office, new version, diff); raises LayoutConflict when
+    ``expected_version`` is not the current one.
+    """
+    ids = {r.get("id") for r in rooms_data if isinstance(r, dict)}
+    rooms = list(
+        Room.objects.filter(pk__in=ids, office__memberships__user=user)
+        .select_related("office__city")
+    )
+    offices = {room.office_id: room.office for room in rooms}
+    if not offices:
+        return None, None, {}
+    if len(offices) > 1:
+        raise LayoutError("A layout save must only contain rooms of one office.")
+    office = next(iter(offices.values()))
+
+    changed, diff = diff_rooms(rooms, [r for r in rooms_data if isinstance(r, dict)])
+    with transaction.atomic():
+        if not changed:
+            current = Office.objects.filter(pk=office.pk).values_list("layout_version", flat=True).first()
+            if expected_version is not None and expected_version != current:
+                raise LayoutConflict(current)
+            return office, current, {}
+
+        bump = Office.objects.filter(pk=office.pk)
+        if expected_version is not None:
+            bump = bump.filter(layout_version=expected_version)
+        if not bump.update(layout_version=F("layout_version") + 1):
+            raise LayoutConflict(
+                Office.objects.filter(pk=office.pk).values_list("layout_version", flat=True).first()
+            )
+        fields = {name for fields in diff.values() for name in fields}
+        policy_changed = [room for room in changed if "access_policy" in diff[room.pk]]
+        for room in policy_changed:
+            room.access_version = F("access_version") + 1
+        if policy_changed:
+            fields.add("access_version")
+        Room.objects.bulk_update(changed, sorted(fields))
+        version = Office.objects.filter(pk=office.pk).values_list("layout_version", flat=True).first()
+
+        # bulk_update skips the Room signals that keep the public directory fresh.
+        city_slug = office.city.slug if office.city_id else None
+        transaction.on_commit(lambda: _after_save(office, city_slug, version, diff, user))
+        if policy_changed:
+            transaction.on_commit(access_tokens.changed)
+    return office, version, diff
+
+
+def _after_save(office, city_slug, version, diff, user):
+    from .public_cache import invalidate_office
+
+    invalidate_office([city_slug], [office.public_slug])
+    broadcast_layout_diff(office.pk, version, diff, user)
+
+
+def broadcast_layout_diff(office_id, version, diff, user=None):
+    async_to_sync(get_channel_layer().group_send)(
+        f"presence_{office_id}",
+        {
+            "type": "broadcast",
+            "payload": {
+                "type": "layout.diff",
+                "office": office_id,
+                "layout_version": version,
+                "by": getattr(user, "username", None),
+                "rooms": [{"id": pk, **fields} for pk, fields in diff.items()],
+            },
+        },
+    )
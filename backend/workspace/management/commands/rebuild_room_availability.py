@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from workspace.availability import rebuild
+from workspace.models import Room
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-room free/busy bitmaps (RoomDayAvailability) from RoomBooking. "
+        "Run once after deploying them; afterwards booking signals keep them current."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--office", type=int, help="Only rooms of this office id")
+
+    def handle(self, *args, **options):
+        rooms = Room.objects.all()
+        if options["office"]:
+            rooms = rooms.filter(office_id=options["office"])
+        with transaction.atomic():
+            count = rebuild(rooms)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt availability for {count} rooms."))
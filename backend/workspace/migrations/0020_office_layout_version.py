@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0019_supportticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='office',
+            name='layout_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
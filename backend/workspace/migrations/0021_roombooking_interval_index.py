@@ -0,0 +1,73 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:55
+
+from django.db import migrations, models
+
+EXCLUSION = "roombooking_no_overlap"
+REPORT_LIMIT = 50
+
+OVERLAPS = """
+    SELECT a.room_id, a.id, a.start_time, a.end_time, b.id, b.start_time, b.end_time
+    FROM workspace_roombooking a
+    JOIN workspace_roombooking b
+      ON b.room_id = a.room_id AND b.id > a.id AND b.start_time < a.end_time AND a.start_time < b.end_time
+    ORDER BY a.room_id, a.start_time, a.id
+    LIMIT %s
+"""
+
+
+def check_no_overlaps(schema_editor):
+    """
+    The constraint cannot be added while double bookings exist, and which of
+    two customers keeps a room is not ours to decide here: list them so they
+    can be moved or cancelled, then rerun the migration.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(OVERLAPS, [REPORT_LIMIT + 1])
+        rows = cursor.fetchall()
+    if not rows:
+        return
+    lines = [
+        f"  room {room}: booking {a} ({a_start:%Y-%m-%d %H:%M}-{a_end:%H:%M}) overlaps "
+        f"booking {b} ({b_start:%Y-%m-%d %H:%M}-{b_end:%H:%M})"
+        for room, a, a_start, a_end, b, b_start, b_end in rows[:REPORT_LIMIT]
+    ]
+    if len(rows) > REPORT_LIMIT:
+        lines.append(f"  ... and more; only the first {REPORT_LIMIT} pairs are shown.")
+    raise RuntimeError(
+        f"Cannot add {EXCLUSION}: these room bookings overlap. Reschedule or delete one booking "
+        "of each pair (e.g. with workspace.booking.reschedule) and run the migration again.\n" + "\n".join(lines)
+    )
+
+
+def add_exclusion_constraint(apps, schema_editor):
+    # Only PostgreSQL can enforce non-overlapping intervals; other backends
+    # rely on the per-room lock taken by workspace.booking.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    check_no_overlaps(schema_editor)
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    schema_editor.execute(
+        f"ALTER TABLE workspace_roombooking ADD CONSTRAINT {EXCLUSION} "
+        "EXCLUDE USING gist (room_id WITH =, tstzrange(start_time, end_time, '[)') WITH &&)"
+    )
+
+
+def drop_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"ALTER TABLE workspace_roombooking DROP CONSTRAINT IF EXISTS {EXCLUSION}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0020_office_layout_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='roombooking',
+            index=models.Index(fields=['room', 'start_time', 'end_time'], name='roombooking_room_span_idx'),
+        ),
+        migrations.RunPython(add_exclusion_constraint, drop_exclusion_constraint),
+    ]
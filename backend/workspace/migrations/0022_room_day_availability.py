@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0021_roombooking_interval_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomDayAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('busy', models.BinaryField()),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_availability', to='workspace.room')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('room', 'day'), name='roomdayavailability_unique')],
+            },
+        ),
+    ]
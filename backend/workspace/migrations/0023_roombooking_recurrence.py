@@ -0,0 +1,63 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+EXCLUSION = "roombooking_no_overlap"
+
+
+def limit_exclusion_to_single_bookings(apps, schema_editor):
+    # A series row only holds its first occurrence; workspace.booking checks
+    # expanded series itself, so the constraint keeps to single bookings.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"ALTER TABLE workspace_roombooking DROP CONSTRAINT IF EXISTS {EXCLUSION}")
+    schema_editor.execute(
+        f"ALTER TABLE workspace_roombooking ADD CONSTRAINT {EXCLUSION} "
+        "EXCLUDE USING gist (room_id WITH =, tstzrange(start_time, end_time, '[)') WITH &&) "
+        "WHERE (recurrence = '')"
+    )
+
+
+def cover_all_bookings(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"ALTER TABLE workspace_roombooking DROP CONSTRAINT IF EXISTS {EXCLUSION}")
+    schema_editor.execute(
+        f"ALTER TABLE workspace_roombooking ADD CONSTRAINT {EXCLUSION} "
+        "EXCLUDE USING gist (room_id WITH =, tstzrange(start_time, end_time, '[)') WITH &&)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0022_room_day_availability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roombooking',
+            name='recurrence',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='roombooking',
+            name='recurrence_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RoomBookingException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_start', models.DateTimeField()),
+                ('start_time', models.DateTimeField(blank=True, null=True)),
+                ('end_time', models.DateTimeField(blank=True, null=True)),
+                ('series', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='workspace.roombooking')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('series', 'original_start'), name='roombookingexception_unique')],
+            },
+        ),
+        migrations.RunPython(limit_exclusion_to_single_bookings, cover_all_bookings),
+    ]
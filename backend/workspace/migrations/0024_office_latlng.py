@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _point(value):
+    if isinstance(value, dict):
+        lat = value.get("lat", value.get("latitude"))
+        lng = value.get("lng", value.get("lon", value.get("longitude")))
+    elif isinstance(value, (list, tuple)) and len(value) == 2:
+        lat, lng = value
+    else:
+        return None
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    return (lat, lng) if -90 <= lat <= 90 and -180 <= lng <= 180 else None
+
+
+def copy_coordinates(apps, schema_editor):
+    Office = apps.get_model("workspace", "Office")
+    batch = []
+    for office in Office.objects.exclude(coordinates=None).only("id", "coordinates").iterator(chunk_size=500):
+        point = _point(office.coordinates)
+        if point:
+            office.lat, office.lng = point
+            batch.append(office)
+        if len(batch) >= 500:
+            Office.objects.bulk_update(batch, ["lat", "lng"])
+            batch = []
+    Office.objects.bulk_update(batch, ["lat", "lng"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0023_roombooking_recurrence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='office',
+            name='lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='office',
+            name='lng',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='office',
+            index=models.Index(fields=['lat', 'lng'], name='office_latlng_idx'),
+        ),
+        migrations.RunPython(copy_coordinates, migrations.RunPython.noop),
+    ]
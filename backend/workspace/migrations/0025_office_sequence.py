@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0024_office_latlng'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfficeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sequences', to='workspace.office')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('office', 'name'), name='officesequence_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0025_office_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerPresenceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('in', 'Clock in'), ('out', 'Clock out')], max_length=3)),
+                ('at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='worker_presence_events', to='workspace.office')),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='presence_events', to='workspace.worker')),
+            ],
+            options={
+                'ordering': ['at', 'id'],
+                'indexes': [models.Index(fields=['office', 'at'], name='workerevent_office_at_idx'), models.Index(fields=['worker', 'at'], name='workerevent_worker_at_idx')],
+            },
+        ),
+    ]
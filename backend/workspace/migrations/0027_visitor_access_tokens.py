@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0026_worker_presence_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='access_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='visitoraccesssubmission',
+            index=models.Index(fields=['revoked', 'created_at'], name='visitoraccess_revoked_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0027_visitor_access_tokens'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visitoraccesssubmission',
+            index=models.Index(fields=['room', 'created_at'], name='visitoraccess_room_created_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 20:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_office(apps, schema_editor):
+    Room = apps.get_model("workspace", "Room")
+    Submission = apps.get_model("workspace", "VisitorAccessSubmission")
+    Submission.objects.filter(office__isnull=True).update(
+        office_id=Subquery(Room.objects.filter(pk=OuterRef("room_id")).values("office_id")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0028_export_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitoraccesssubmission',
+            name='office',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='access_submissions', to='workspace.office'),
+        ),
+        migrations.RunPython(copy_office, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='visitoraccesssubmission',
+            index=models.Index(fields=['office', 'approved', 'revoked', 'created_at'], name='visitoraccess_queue_idx'),
+        ),
+    ]
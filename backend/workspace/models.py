@@ -1,9 +1,12 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
 from django.utils.text import slugify
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.postgres.fields import JSONField 
+from .recurrence import series_until
 
 
 User = settings.AUTH_USER_MODEL
@@ -28,6 +31,9 @@ class OfficeCity(models.Model):
         return f"{self.city}, {self.country}"
   
         
+POINT_KEYS = ("lat", "lng", "latitude", "lon", "longitude")
+
+
 class Office(models.Model):
     name = models.CharField(max_length=120)
     city = models.ForeignKey(OfficeCity, on_delete=models.SET_NULL, null=True, blank=True, related_name="offices")
@@ -38,7 +44,11 @@ class Office(models.Model):
     public = models.BooleanField(default=False)
     public_slug = models.SlugField(max_length=50, unique=True, blank=True, null=True)
     services = models.JSONField(default=dict, blank=True)  # optional
-    coordinates = models.JSONField(blank=True, null=True)
+    coordinates = models.JSONField(blank=True, null=True)  # legacy; mirrors lat/lng on save
+    lat = models.FloatField(blank=True, null=True)
+    lng = models.FloatField(blank=True, null=True)
+    # Bumped by every floor-plan save; editors send the version they loaded (see workspace.layout).
+    layout_version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def save(self, *args, **kwargs):
@@ -48,11 +58,22 @@ class Office(models.Model):
         if not self.public:
             # optional: clear slug if made private
             self.public_slug = None
+        # lat/lng are authoritative: the legacy JSON only mirrors them, so
+        # clearing them clears the location instead of being refilled from it.
+        legacy = self.coordinates if isinstance(self.coordinates, dict) else {}
+        legacy = {k: v for k, v in legacy.items() if k not in POINT_KEYS}
+        if self.lat is not None and self.lng is not None:
+            self.coordinates = {**legacy, "lat": self.lat, "lng": self.lng}
+        else:
+            self.coordinates = legacy or None
         super().save(*args, **kwargs)
         
     def __str__(self): 
         return f"{self.name} ({self.city})"
 
+    class Meta:
+        indexes = [models.Index(fields=["lat", "lng"], name="office_latlng_idx")]
+
 class Membership(models.Model):
     ROLE_CHOICES = (("OWNER","Owner"), ("MEMBER","Member"), ("GUEST","Guest"))
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -78,6 +99,7 @@ class Room(models.Model):
     config = models.JSONField(default=dict, blank=True)
     access_policy = models.CharField(max_length=20, choices=ACCESS_POLICIES, default="free")
     access_config = models.JSONField(default=dict, blank=True)  
+    access_version = models.PositiveIntegerField(default=1)  # bumped when access_policy changes; see workspace.access_tokens
     def __str__(self): 
         return f"{self.office.name} / {self.name}"
 
@@ -89,6 +111,42 @@ class RoomBooking(models.Model):
     end_time = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
     confirmed = models.BooleanField(default=False)
+    # RRULE (e.g. "FREQ=WEEKLY;BYDAY=MO;COUNT=12"); start/end_time are then the first occurrence.
+    recurrence = models.CharField(max_length=255, blank=True, default="")
+    recurrence_until = models.DateTimeField(null=True, blank=True)  # end of the last occurrence; NULL = open-ended
+
+    def save(self, *args, **kwargs):
+        self.recurrence_until = series_until(self.recurrence, self.start_time, self.end_time)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "recurrence_until" not in update_fields:
+            kwargs["update_fields"] = [*update_fields, "recurrence_until"]
+        super().save(*args, **kwargs)
+
+    class Meta:
+        # Overlap lookups (workspace.booking). On PostgreSQL the migration also adds
+        # a GiST exclusion constraint over (room, tstzrange(start_time, end_time)).
+        indexes = [models.Index(fields=["room", "start_time", "end_time"], name="roombooking_room_span_idx")]
+
+class RoomBookingException(models.Model):
+    """One occurrence of a recurring booking cancelled (no times) or moved."""
+    series = models.ForeignKey(RoomBooking, on_delete=models.CASCADE, related_name="exceptions")
+    original_start = models.DateTimeField()
+    start_time = models.DateTimeField(null=True, blank=True)
+    end_time = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["series", "original_start"], name="roombookingexception_unique"),
+        ]
+
+class RoomDayAvailability(models.Model):
+    """Busy bitmap of one room for one UTC day, kept in sync by workspace.availability."""
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="day_availability")
+    day = models.DateField()
+    busy = models.BinaryField()  # bit i set = slot i (availability.SLOT_MINUTES long) is booked
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["room", "day"], name="roomdayavailability_unique")]
 
 class cityLobby(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -116,25 +174,28 @@ class Worker(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.worker_id:
-            # --- Generate prefix ---
-            words = self.office.name.upper().split()
-            if len(words) == 1:
-                prefix = words[0][:2]  # First 2 letters
-            else:
-                prefix = "".join(w[0] for w in words[:2])  # First letters of first 2 words
-
-            # --- Sequence count ---
-            count = Worker.objects.filter(office=self.office).count() + 1
-
-            # --- Final ID ---
-            self.worker_id = f"{prefix}{self.office.id}-{count:04d}"
+            from .sequences import WORKER_SEQUENCE, format_worker_id, reserve
 
+            with transaction.atomic():
+                self.worker_id = format_worker_id(self.office, reserve(self.office_id, WORKER_SEQUENCE))
+                super().save(*args, **kwargs)
+            return
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.worker_id} - {self.name} ({self.office.name})"
 
 
+class OfficeSequence(models.Model):
+    """Per-office counter handing out numbers such as Worker.worker_id (see workspace.sequences)."""
+    office = models.ForeignKey(Office, on_delete=models.CASCADE, related_name="sequences")
+    name = models.CharField(max_length=50)
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["office", "name"], name="officesequence_unique")]
+
+
 class WorkerPresence(models.Model):
     worker = models.OneToOneField("Worker", on_delete=models.CASCADE, related_name="presence")
     is_presence = models.BooleanField(default=False)
@@ -142,22 +203,45 @@ class WorkerPresence(models.Model):
     last_logout_at = models.DateTimeField(null=True, blank=True)
 
     def login(self):
-        self.is_online = True
+        self.is_presence = True
         self.last_login_time = timezone.now()
-        self.save()
+        self.save(update_fields=["is_presence", "last_login_time"])
 
     def logout(self):
-        self.is_online = False
+        self.is_presence = False
         self.last_logout_at = timezone.now()
-        self.save()
+        self.save(update_fields=["is_presence", "last_logout_at"])
 
     def __str__(self):
         return f"{self.worker.name} ({'Online' if self.is_presence else 'Offline'})"
 
+
+class WorkerPresenceEvent(models.Model):
+    """Append-only clock-in/out log; WorkerPresence keeps only the latest state."""
+    CLOCK_IN = "in"
+    CLOCK_OUT = "out"
+    KIND_CHOICES = [(CLOCK_IN, "Clock in"), (CLOCK_OUT, "Clock out")]
+
+    worker = models.ForeignKey("Worker", on_delete=models.CASCADE, related_name="presence_events")
+    office = models.ForeignKey(Office, on_delete=models.CASCADE, related_name="worker_presence_events")
+    kind = models.CharField(max_length=3, choices=KIND_CHOICES)
+    at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["at", "id"]
+        indexes = [
+            models.Index(fields=["office", "at"], name="workerevent_office_at_idx"),
+            models.Index(fields=["worker", "at"], name="workerevent_worker_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.worker_id} {self.kind} at {self.at}"
+
     
 
 class VisitorAccessSubmission(models.Model):
     room = models.ForeignKey("Room", on_delete=models.CASCADE, related_name="access_submissions")
+    office = models.ForeignKey(Office, null=True, blank=True, on_delete=models.CASCADE, related_name="access_submissions")  # room.office, for the approval queue
     visitor_id = models.CharField(max_length=255, null=True, blank=True)  # optional visitor token
     data = models.JSONField(default=dict)  # requires Django 3.1+ or use django.contrib.postgres JSONField
     name = models.CharField(max_length=255, null=True, blank=True, db_index=True)
@@ -169,6 +253,16 @@ class VisitorAccessSubmission(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["revoked", "created_at"], name="visitoraccess_revoked_idx"),
+            models.Index(fields=["room", "created_at"], name="visitoraccess_room_created_idx"),
+            models.Index(fields=["office", "approved", "revoked", "created_at"], name="visitoraccess_queue_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.office_id is None and self.room_id:
+            self.office_id = self.room.office_id
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Submission {self.id} for {self.room.name}"
@@ -191,3 +285,147 @@ class SupportTicket(models.Model):
 
     def __str__(self):
         return f"Ticket #{self.id} - {self.subject} ({self.status})"
+
+
+# ---------------------------------------------------------------------
+# Public directory cache invalidation (see workspace.public_cache)
+# ---------------------------------------------------------------------
+def _invalidate_public_directory(city_slugs, office_slugs):
+    from .public_cache import invalidate_office
+
+    city_slugs, office_slugs = set(city_slugs), set(office_slugs)
+    transaction.on_commit(lambda: invalidate_office(city_slugs, office_slugs))
+
+
+@receiver(pre_save, sender=Office)
+@receiver(pre_save, sender=OfficeCity)
+def _remember_public_keys(sender, instance, **kwargs):
+    """Slugs before the save, so a renamed/moved office drops its old keys too."""
+    previous = sender.objects.filter(pk=instance.pk) if instance.pk else sender.objects.none()
+    if sender is Office:
+        instance._public_cache_previous = previous.values_list("city__slug", "public_slug").first()
+    else:
+        instance._public_cache_previous = previous.values_list("slug", flat=True).first()
+
+
+@receiver(post_save, sender=Office)
+@receiver(post_delete, sender=Office)
+def _office_changed(sender, instance, **kwargs):
+    city = OfficeCity.objects.filter(pk=instance.city_id).values_list("slug", flat=True).first()
+    previous = getattr(instance, "_public_cache_previous", None) or (None, None)
+    _invalidate_public_directory([city, previous[0]], [instance.public_slug, previous[1]])
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def _room_changed(sender, instance, **kwargs):
+    keys = Office.objects.filter(pk=instance.office_id).values_list("city__slug", "public_slug").first()
+    if keys:
+        _invalidate_public_directory([keys[0]], [keys[1]])
+
+
+@receiver(post_save, sender=OfficeCity)
+@receiver(pre_delete, sender=OfficeCity)
+def _city_changed(sender, instance, **kwargs):
+    # Office payloads embed the city name; deleting a city detaches its offices.
+    office_slugs = Office.objects.filter(city_id=instance.pk, public=True).values_list("public_slug", flat=True)
+    previous = getattr(instance, "_public_cache_previous", None)
+    _invalidate_public_directory([instance.slug, previous], list(office_slugs))
+
+
+# ---------------------------------------------------------------------
+# Free/busy bitmaps (see workspace.availability)
+# ---------------------------------------------------------------------
+@receiver(pre_save, sender=RoomBooking)
+def _remember_booking_span(sender, instance, **kwargs):
+    previous = sender.objects.filter(pk=instance.pk) if instance.pk else sender.objects.none()
+    instance._availability_previous = previous.values_list("room_id", "start_time", "end_time").first()
+
+
+@receiver(post_save, sender=RoomBooking)
+@receiver(post_delete, sender=RoomBooking)
+def _booking_changed(sender, instance, **kwargs):
+    from .availability import refresh_for_spans
+
+    spans = [(instance.room_id, instance.start_time, instance.end_time)]
+    previous = getattr(instance, "_availability_previous", None)
+    if previous and previous != spans[0]:
+        spans.append(previous)
+    refresh_for_spans(spans)
+
+
+# ---------------------------------------------------------------------
+# Nearby search index (see workspace.geo)
+# ---------------------------------------------------------------------
+@receiver(post_save, sender=Office)
+@receiver(post_delete, sender=Office)
+def _office_moved(sender, instance, **kwargs):
+    from . import geo
+
+    office_id = instance.pk
+    transaction.on_commit(lambda: geo.office_changed(office_id))
+
+
+@receiver(post_save, sender=OfficeCity)
+def _city_moved(sender, instance, **kwargs):
+    from . import geo
+
+    city_id = instance.pk
+    transaction.on_commit(lambda: geo.city_changed(city_id))
+
+
+@receiver(post_delete, sender=OfficeCity)
+def _city_removed(sender, instance, **kwargs):
+    from . import geo
+
+    city_id = instance.pk
+    transaction.on_commit(lambda: geo.city_changed(city_id, deleted=True))
+
+
+# ---------------------------------------------------------------------
+# Visitor access tokens (see workspace.access_tokens)
+# ---------------------------------------------------------------------
+@receiver(pre_save, sender=Room)
+def _track_room_changes(sender, instance, **kwargs):
+    # One lookup for both post_save receivers below: a policy change bumps
+    # access_version, an office move re-points the room's submissions.
+    if not instance.pk:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list("access_policy", "access_version", "office_id").first()
+    if previous and previous[0] != instance.access_policy:
+        instance.access_version = previous[1] + 1
+        instance._access_policy_changed = True
+    instance._moved_from_office = previous[2] if previous and previous[2] != instance.office_id else None
+
+
+@receiver(post_save, sender=Room)
+def _room_access_changed(sender, instance, **kwargs):
+    if getattr(instance, "_access_policy_changed", False):
+        from . import access_tokens
+
+        instance._access_policy_changed = False
+        transaction.on_commit(access_tokens.changed)
+
+
+@receiver(post_save, sender=Room)
+def _room_office_changed(sender, instance, **kwargs):
+    # VisitorAccessSubmission.office is denormalised for the approval queue index.
+    if getattr(instance, "_moved_from_office", None):
+        instance._moved_from_office = None
+        VisitorAccessSubmission.objects.filter(room=instance).update(office_id=instance.office_id)
+
+
+@receiver(post_save, sender=VisitorAccessSubmission)
+def _submission_changed(sender, instance, created, **kwargs):
+    if not created:
+        from . import access_tokens
+
+        transaction.on_commit(access_tokens.changed)
+
+
+@receiver(post_delete, sender=VisitorAccessSubmission)
+def _submission_removed(sender, instance, **kwargs):
+    from . import access_tokens
+
+    submission_id = instance.pk
+    transaction.on_commit(lambda: access_tokens.forget(submission_id))
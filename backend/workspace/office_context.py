@@ -0,0 +1,65 @@
+"""
+Current-office context for public visitors, carried client-side.
+
+Opening a public office page used to write ``current_office_id`` into the
+DB-backed session on every view. The office id now travels in a signed
+cookie (and, for clients that cannot send cookies cross-site, the same
+signed value in the ``X-Office-Context`` header), so public browsing never
+creates or updates a session row.
+"""
+from django.conf import settings
+from django.core import signing
+from django.utils.cache import patch_cache_control
+
+SALT = "workspace.office_context"
+HEADER = "X-Office-Context"
+
+
+def cookie_name():
+    return getattr(settings, "OFFICE_CONTEXT_COOKIE_NAME", "office_context")
+
+
+def max_age():
+    return getattr(settings, "OFFICE_CONTEXT_MAX_AGE", 7 * 24 * 3600)
+
+
+def make_token(office_id):
+    return signing.dumps(int(office_id), salt=SALT, compress=False)
+
+
+def _load(token):
+    try:
+        return int(signing.loads(token, salt=SALT, max_age=max_age()))
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def get_office_id(request):
+    """Office id from the X-Office-Context header or the signed cookie, else None."""
+    token = request.META.get("HTTP_X_OFFICE_CONTEXT")
+    if token:
+        return _load(token)
+    token = request.COOKIES.get(cookie_name())
+    return _load(token) if token else None
+
+
+def set_office_id(request, response, office_id):
+    """
+    Point the client at ``office_id``. Nothing is written when the request
+    already carries that context, so repeat views stay cacheable.
+    """
+    if get_office_id(request) == office_id:
+        return response
+    token = make_token(office_id)
+    response.set_cookie(
+        cookie_name(),
+        token,
+        max_age=max_age(),
+        httponly=True,
+        secure=getattr(settings, "SESSION_COOKIE_SECURE", False),
+        samesite=getattr(settings, "SESSION_COOKIE_SAMESITE", "Lax"),
+    )
+    response[HEADER] = token
+    # Never let a shared cache replay this visitor's Set-Cookie.
+    patch_cache_control(response, private=True)
+    return response
@@ -0,0 +1,75 @@
+"""
+Rendered-response cache for the public directory (cities, offices per city,
+office detail).
+
+Each endpoint caches its JSON body and a strong ETag per city/slug; a hit
+serves the bytes (or a 304) without touching the database. Office, Room and
+OfficeCity signals drop the affected keys after commit (see models.py).
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+KEY_PREFIX = "public:dir"
+
+
+def cities_key():
+    return f"{KEY_PREFIX}:cities"
+
+
+def city_key(slug):
+    return f"{KEY_PREFIX}:city:{slug}"
+
+
+def office_key(slug):
+    return f"{KEY_PREFIX}:office:{slug}"
+
+
+def cache_timeout():
+    return getattr(settings, "PUBLIC_DIRECTORY_CACHE_TIMEOUT", 300)
+
+
+def cached_render(key, build):
+    """
+    (body, etag) for ``key``, rendering ``build()`` on a miss. ``build``
+    returns the response data, or None for "not found" (never cached).
+    """
+    entry = cache.get(key)
+    if entry is None:
+        data = build()
+        if data is None:
+            return None
+        body = JSONRenderer().render(data)
+        entry = (body, f'"{hashlib.sha256(body).hexdigest()}"')
+        cache.set(key, entry, cache_timeout())
+    return entry
+
+
+def respond(request, entry):
+    """200 with the cached body, or 304 when If-None-Match has the ETag."""
+    body, etag = entry
+    max_age = getattr(settings, "PUBLIC_DIRECTORY_MAX_AGE", 60)
+    if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    response["Cache-Control"] = f"public, max-age={max_age}"
+    return response
+
+
+def invalidate(*keys):
+    keys = [k for k in keys if k]
+    if keys:
+        cache.delete_many(keys)
+
+
+def invalidate_office(city_slugs=(), office_slugs=()):
+    invalidate(
+        cities_key(),
+        *(city_key(s) for s in city_slugs if s),
+        *(office_key(s) for s in office_slugs if s),
+    )
@@ -0,0 +1,140 @@
+"""
+RRULE recurrence for room bookings and meetings.
+
+A recurring row keeps its first occurrence in ``start_time``/``end_time`` and
+an RFC 5545 rule such as ``FREQ=WEEKLY;BYDAY=MO;COUNT=12`` in
+``recurrence``; ``recurrence_until`` caches when the last occurrence ends
+(NULL for open-ended series) so window queries skip finished series in SQL.
+Occurrences are never stored: they are generated lazily for the window
+being queried, and per-occurrence exceptions (cancelled or moved, keyed by
+the original start) are applied on top. Rules are checked on write
+(series_until): at most daily, at most MAX_OCCURRENCES_PER_DAY starts in
+any day, and no occurrence may overlap the next, so a window query never
+expands more than MAX_OCCURRENCES_PER_DAY occurrences per day of window.
+"""
+import re
+from collections import deque, namedtuple
+from datetime import timedelta
+from dateutil.rrule import rrulestr
+from django.db.models import Q
+
+MAX_OCCURRENCE_LENGTH = timedelta(days=1)
+MAX_SERIES_OCCURRENCES = 5000  # bounded series longer than this are rejected
+MAX_OCCURRENCES_PER_DAY = 24
+SUB_DAILY = ("HOURLY", "MINUTELY", "SECONDLY")
+CHECK_HORIZON = timedelta(days=366)  # how far open-ended series are checked
+
+Occurrence = namedtuple("Occurrence", "series original_start start end")
+
+
+def parse(rule, dtstart):
+    try:
+        return rrulestr(rule, dtstart=dtstart)
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"Invalid recurrence rule {rule!r}: {exc}") from exc
+
+
+def series_until(rule, start, end):
+    """
+    When the last occurrence of ``rule`` ends, or None for an open-ended
+    series. Raises ValueError for rules that repeat more often than daily,
+    start more than MAX_OCCURRENCES_PER_DAY occurrences within a day or
+    whose occurrences overlap each other.
+    """
+    if not rule:
+        return None
+    parsed = parse(rule, start)
+    length = (end - start) if end else timedelta(0)
+    if length > MAX_OCCURRENCE_LENGTH:
+        raise ValueError("Recurring occurrences can last at most one day.")
+    freq = re.search(r"FREQ=(\w+)", rule.upper())
+    if freq and freq.group(1) in SUB_DAILY:
+        raise ValueError("A series can repeat at most daily.")
+    bounded = "COUNT=" in rule.upper() or "UNTIL=" in rule.upper()
+    last = None
+    day = deque()
+    for i, occurrence in enumerate(parsed):
+        if i >= MAX_SERIES_OCCURRENCES:
+            if bounded:
+                raise ValueError(f"A series can have at most {MAX_SERIES_OCCURRENCES} occurrences.")
+            break
+        if not bounded and occurrence >= start + CHECK_HORIZON:
+            break
+        if last is not None and occurrence < last + length:
+            raise ValueError("Occurrences of a series must not overlap each other.")
+        day.append(occurrence)
+        while day[0] <= occurrence - timedelta(days=1):
+            day.popleft()
+        if len(day) > MAX_OCCURRENCES_PER_DAY:
+            raise ValueError(f"A series can start at most {MAX_OCCURRENCES_PER_DAY} occurrences a day.")
+        last = occurrence
+    return (last or start) + length if bounded else None
+
+
+def window_q(window_start, window_end, prefix="", default_length=None):
+    """
+    Rows, single or recurring, that may have an occurrence intersecting
+    ``[window_start, window_end)``. ``default_length`` covers rows without an
+    end time (meetings).
+    """
+    def f(name):
+        return f"{prefix}{name}"
+
+    single = Q(**{f("end_time__gt"): window_start})
+    if default_length:
+        single |= Q(**{f("end_time__isnull"): True, f("start_time__gt"): window_start - default_length})
+    series = Q(**{f("recurrence_until__isnull"): True}) | Q(**{f("recurrence_until__gt"): window_start})
+    return Q(**{f("start_time__lt"): window_end}) & (
+        (Q(**{f("recurrence"): ""}) & single) | (~Q(**{f("recurrence"): ""}) & series)
+    )
+
+
+def exceptions_q(window_start, window_end):
+    """Exceptions that affect ``[window_start, window_end)``: by original slot or by new slot."""
+    return Q(
+        original_start__gt=window_start - MAX_OCCURRENCE_LENGTH, original_start__lt=window_end,
+    ) | Q(start_time__lt=window_end, end_time__gt=window_start)
+
+
+def load_exceptions(exception_model, series_ids, window_start, window_end):
+    """``{(series_id, original_start): (start, end) or None}`` for the window."""
+    if not series_ids:
+        return {}
+    rows = (
+        exception_model.objects.filter(series_id__in=series_ids)
+        .filter(exceptions_q(window_start, window_end))
+        .values_list("series_id", "original_start", "start_time", "end_time")
+    )
+    return {(sid, original): (start, end) if start else None for sid, original, start, end in rows}
+
+
+def occurs_at(series, moment):
+    """Whether ``moment`` is an occurrence start of ``series``."""
+    if not series.recurrence:
+        return moment == series.start_time
+    return moment in parse(series.recurrence, series.start_time).between(moment, moment, inc=True)
+
+
+def expand(rows, window_start, window_end, exceptions=None, default_length=None):
+    """
+    Yield the Occurrences of the ``rows`` list (single rows and series alike) that
+    intersect ``[window_start, window_end)``, generating series occurrences
+    only for that window. ``exceptions`` is as returned by load_exceptions.
+    """
+    exceptions = exceptions or {}
+    for row in rows:
+        length = (row.end_time - row.start_time) if row.end_time else default_length or timedelta(0)
+        if not row.recurrence:
+            if row.start_time < window_end and row.start_time + length > window_start:
+                yield Occurrence(row, row.start_time, row.start_time, row.start_time + length)
+            continue
+        for start in parse(row.recurrence, row.start_time).xafter(window_start - length):
+            if start >= window_end:
+                break
+            if (row.pk, start) not in exceptions and start + length > window_start:
+                yield Occurrence(row, start, start, start + length)
+
+    by_pk = {row.pk: row for row in rows if getattr(row, "recurrence", "")}
+    for (pk, original), moved in exceptions.items():
+        if moved and pk in by_pk and moved[0] < window_end and moved[1] > window_start:
+            yield Occurrence(by_pk[pk], original, *moved)
@@ -0,0 +1,60 @@
+"""
+Per-office number sequences.
+
+Each (office, name) pair has an OfficeSequence counter row. ``reserve``
+hands out a block of numbers with a single ``UPDATE ... SET next_value =
+next_value + n``, which row-locks the counter until the caller's
+transaction ends, so concurrent creates never share a number and deleted
+numbers are never reused. The first use for an office seeds the counter
+from the numbers already issued.
+"""
+import re
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .models import OfficeSequence, Worker
+
+WORKER_SEQUENCE = "worker"
+WORKER_NUMBER_RE = re.compile(r"-(\d+)$")
+
+
+def worker_id_prefix(office):
+    words = office.name.upper().split()
+    if len(words) == 1:
+        return words[0][:2]  # First 2 letters
+    return "".join(w[0] for w in words[:2])  # First letters of first 2 words
+
+
+def format_worker_id(office, number):
+    return f"{worker_id_prefix(office)}{office.id}-{number:04d}"
+
+
+def _initial_value(office_id, name):
+    if name != WORKER_SEQUENCE:
+        return 1
+    issued = [
+        int(m.group(1))
+        for m in map(WORKER_NUMBER_RE.search, Worker.objects.filter(office_id=office_id).values_list("worker_id", flat=True))
+        if m
+    ]
+    return max(issued, default=0) + 1
+
+
+def reserve(office_id, name, count=1):
+    """
+    Reserve ``count`` consecutive numbers of the ``name`` sequence of an
+    office and return the first. Call inside the transaction that uses them.
+    """
+    if count < 1:
+        raise ValueError("count must be positive")
+    counter = OfficeSequence.objects.filter(office_id=office_id, name=name)
+    with transaction.atomic():
+        if not counter.update(next_value=F("next_value") + count):
+            try:
+                with transaction.atomic():
+                    OfficeSequence.objects.create(
+                        office_id=office_id, name=name, next_value=_initial_value(office_id, name) + count,
+                    )
+            except IntegrityError:
+                # Another process created the counter first.
+                counter.update(next_value=F("next_value") + count)
+        return counter.values_list("next_value", flat=True).get() - count
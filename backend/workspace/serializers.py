@@ -10,6 +10,7 @@ from .models import (
     VisitorAccessSubmission
     )
 from django.contrib.auth import get_user_model
+from .geo import parse_point
 
 User = get_user_model()
 
@@ -81,11 +82,22 @@ class OfficeSerializer(serializers.ModelSerializer):
         model = Office
         fields = [
             "id", "name", "city", "owner", "public",
-            "public_slug", "services", "coordinates",
-            "created_at", "preview_url",
+            "public_slug", "services", "coordinates", "lat", "lng",
+            "created_at", "preview_url", "layout_version",
             "rooms", "workers", "visitor_access", "visitorRooms"  # 👈 new
         ]
-        read_only_fields = ["public_slug", "preview_url", "owner", "created_at"]
+        read_only_fields = ["public_slug", "preview_url", "owner", "created_at", "layout_version"]
+
+    def validate(self, attrs):
+        # Older clients only send the free-form coordinates JSON.
+        if "coordinates" in attrs and "lat" not in attrs and "lng" not in attrs:
+            point = parse_point(attrs["coordinates"])
+            if attrs["coordinates"] and point is None:
+                raise serializers.ValidationError({"coordinates": "Expected {\"lat\": ..., \"lng\": ...}."})
+            attrs["lat"], attrs["lng"] = point or (None, None)
+        if ("lat" in attrs) != ("lng" in attrs) or (attrs.get("lat") is None) != (attrs.get("lng") is None):
+            raise serializers.ValidationError("lat and lng must be given together.")
+        return attrs
 
     def get_preview_url(self, obj):
         if obj.public_slug:
@@ -125,6 +137,6 @@ class PublicOfficeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Office
-        fields = ("id", "name", "city", "public_slug", "services", "coordinates", "rooms")
+        fields = ("id", "name", "city", "public_slug", "services", "coordinates", "lat", "lng", "rooms")
 
 
@@ -0,0 +1,125 @@
+"""
+Worker clock-in/out and shift history.
+
+``clock`` flips WorkerPresence for any number of workers in one transaction
+with set-based writes, appends a WorkerPresenceEvent per worker whose state
+actually changed, and after commit sends one presence_update per office.
+``shifts`` rebuilds who was on shift in a window from the event log: the
+state at the window start (latest earlier event per worker) plus the events
+inside it, both served by the (worker, at) / (office, at) indexes.
+"""
+from collections import defaultdict
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from .models import Worker, WorkerPresence, WorkerPresenceEvent
+from .utils.presence import broadcast_presence_many
+
+IN, OUT = WorkerPresenceEvent.CLOCK_IN, WorkerPresenceEvent.CLOCK_OUT
+ACTIONS = {"login": IN, "logout": OUT, IN: IN, OUT: OUT}
+MAX_BATCH = 1000
+
+
+class ShiftError(Exception):
+    pass
+
+
+def clock(work_ids, action, workers=None, at=None):
+    """
+    Clock the workers with ``work_ids`` (Worker.worker_id values) in or out;
+    ``workers`` optionally narrows the candidates (e.g. to the caller's offices).
+    Returns ``(changed, unchanged, missing)`` lists of worker IDs.
+    """
+    kind = ACTIONS.get(action)
+    if kind is None:
+        raise ShiftError("action must be 'login' or 'logout'")
+    if not isinstance(work_ids, list) or not work_ids:
+        raise ShiftError("work_ids must be a non-empty list")
+    if len(work_ids) > MAX_BATCH:
+        raise ShiftError(f"Clock at most {MAX_BATCH} workers at a time.")
+    work_ids = list(dict.fromkeys(str(w) for w in work_ids))
+    at = at or timezone.now()
+    online = kind == IN
+
+    workers = (Worker.objects.all() if workers is None else workers).filter(worker_id__in=work_ids)
+    with transaction.atomic():
+        found = {
+            w.pk: w for w in workers.select_related("office").only("id", "worker_id", "name", "office__public_slug")
+        }
+        WorkerPresence.objects.bulk_create([WorkerPresence(worker_id=pk) for pk in found], ignore_conflicts=True)
+        presences = WorkerPresence.objects.filter(worker_id__in=list(found))
+        if connection.features.has_select_for_update:
+            presences = presences.select_for_update()
+        changed = list(presences.exclude(is_presence=online).values_list("worker_id", flat=True))
+        stamp = {"last_login_time": at} if online else {"last_logout_at": at}
+        WorkerPresence.objects.filter(worker_id__in=changed).update(is_presence=online, **stamp)
+        WorkerPresenceEvent.objects.bulk_create([
+            WorkerPresenceEvent(worker_id=pk, office_id=found[pk].office_id, kind=kind, at=at) for pk in changed
+        ])
+        if changed:
+            moved = [found[pk] for pk in changed]
+            transaction.on_commit(lambda: _broadcast(moved, "login" if online else "logout"))
+
+    changed_ids = {found[pk].worker_id for pk in changed}
+    known = {w.worker_id for w in found.values()}
+    return (
+        [w for w in work_ids if w in changed_ids],
+        [w for w in work_ids if w in known and w not in changed_ids],
+        [w for w in work_ids if w not in known],
+    )
+
+
+def _broadcast(workers, action):
+    rooms = defaultdict(list)
+    links = Worker.rooms.through.objects.filter(worker_id__in=[w.pk for w in workers])
+    for worker_id, room_id in links.values_list("worker_id", "room_id"):
+        rooms[worker_id].append(room_id)
+    by_office = defaultdict(list)
+    for w in workers:
+        by_office[w.office.public_slug].append(
+            {"id": w.pk, "work_id": w.worker_id, "name": w.name, "rooms": rooms[w.pk]}
+        )
+    for slug, payload in by_office.items():
+        broadcast_presence_many(slug, action, payload)
+
+
+def shifts(office, start, end):
+    """
+    ``[{"worker": {...}, "intervals": [(clock_in, clock_out), ...]}]`` for the
+    workers of ``office`` on shift at any time in ``[start, end)``; intervals
+    are clipped to the window. Two queries.
+    """
+    if not start or not end or end <= start:
+        raise ShiftError("A start before the end is required.")
+    last_before = (
+        WorkerPresenceEvent.objects.filter(worker=OuterRef("pk"), at__lt=start)
+        .order_by("-at", "-id").values("kind")[:1]
+    )
+    info = {
+        pk: {"id": pk, "worker_id": worker_id, "name": name}
+        for pk, worker_id, name in Worker.objects.filter(office=office)
+        .annotate(state=Subquery(last_before)).filter(state=IN)
+        .values_list("pk", "worker_id", "name")
+    }
+    events = (
+        WorkerPresenceEvent.objects.filter(office=office, at__gte=start, at__lt=end)
+        .select_related("worker").only("kind", "at", "worker__id", "worker__worker_id", "worker__name")
+        .order_by("at", "id")
+    )
+
+    opened = {pk: start for pk in info}
+    intervals = defaultdict(list)
+    for event in events:
+        pk = event.worker_id
+        info.setdefault(pk, {"id": pk, "worker_id": event.worker.worker_id, "name": event.worker.name})
+        if event.kind == IN:
+            opened.setdefault(pk, event.at)
+        elif pk in opened:
+            intervals[pk].append((opened.pop(pk), event.at))
+    for pk, since in opened.items():
+        intervals[pk].append((since, end))
+
+    return [
+        {"worker": info[pk], "intervals": intervals[pk]}
+        for pk in sorted(intervals, key=lambda pk: (intervals[pk][0][0], pk))
+    ]
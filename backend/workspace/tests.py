@@ -1,3 +1,763 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from virtual_office.testing import OfficeAPITestCase, make_office
+from workspace import access_tokens, availability, booking, geo, office_context
+from workspace.models import (
+    Membership, Office, OfficeCity, OfficeSequence, Room, RoomBooking, RoomDayAvailability, VisitorAccessSubmission,
+    Worker, WorkerPresence, WorkerPresenceEvent,
+)
+
+
+class TestPublicDirectoryCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.city = OfficeCity.objects.create(country="Ghana", city="Accra")
+        owner, self.office = make_office(city=self.city, public=True)
+        Room.objects.create(office=self.office, name="Lobby")
+        Office.objects.create(name="Private", owner=owner, city=self.city)
+
+    def test_responses_are_cached_with_etags(self):
+        url = f"/api/public/offices/{self.office.public_slug}/"
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([r["name"] for r in first.json()["rooms"]], ["Lobby"])
+
+        self.client.get("/api/public/cities/")
+        self.client.get(f"/api/public/city/{self.city.slug}/")
+        with self.assertNumQueries(0):
+            cities = self.client.get("/api/public/cities/")
+            offices = self.client.get(f"/api/public/city/{self.city.slug}/")
+        with self.assertNumQueries(0):
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(cities.json()[0]["offices_count"], 1)
+        self.assertEqual([o["name"] for o in offices.json()["offices"]], ["HQ"])
+        self.assertEqual(again.status_code, 304)
+
+    def test_saves_invalidate_affected_keys(self):
+        url = f"/api/public/offices/{self.office.public_slug}/"
+        etag = self.client.get(url)["ETag"]
+        offices_etag = self.client.get(f"/api/public/city/{self.city.slug}/")["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.create(office=self.office, name="Boardroom")
+        fresh = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(len(fresh.json()["rooms"]), 2)
+
+        self.city.city = "Greater Accra"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city.save()
+        self.assertEqual(self.client.get(url).json()["city"], "Greater Accra, Ghana")
+        listing = self.client.get(f"/api/public/city/{self.city.slug}/")
+        self.assertNotEqual(listing["ETag"], offices_etag)
+
+        self.office.public = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.office.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get("/api/public/cities/").json(), [])
+
+
+class TestPublicOfficeContext(TestCase):
+    def setUp(self):
+        cache.clear()
+        _, self.office = make_office(city=OfficeCity.objects.create(country="Ghana", city="Accra"), public=True)
+        self.url = f"/api/public/offices/{self.office.public_slug}/"
+
+    def test_detail_sets_signed_context_without_a_session(self):
+        from django.contrib.sessions.models import Session
+
+        response = self.client.get(self.url)
+        self.assertIn(office_context.cookie_name(), response.cookies)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertEqual(Session.objects.count(), 0)
+
+        current = self.client.get("/api/public/receptionist/office/")
+        self.assertEqual(current.json()["id"], self.office.id)
+        # Same office again: nothing new to set, the response stays shareable.
+        again = self.client.get(self.url)
+        self.assertNotIn(office_context.cookie_name(), again.cookies)
+        self.assertIn("public", again["Cache-Control"])
+
+    def test_header_token_and_tampering(self):
+        from django.test import Client
+
+        token = self.client.get(self.url)[office_context.HEADER]
+        client = Client()
+        self.assertEqual(client.get("/api/public/receptionist/office/").status_code, 404)
+        current = client.get("/api/public/receptionist/office/", HTTP_X_OFFICE_CONTEXT=token)
+        self.assertEqual(current.json()["id"], self.office.id)
+
+        client.cookies[office_context.cookie_name()] = token[:-1] + ("A" if token[-1] != "A" else "B")
+        self.assertEqual(client.get("/api/public/receptionist/office/").status_code, 404)
+
+
+class TestSaveLayout(OfficeAPITestCase):
+    def setUp(self):
+        self.office_fields = {"city": OfficeCity.objects.create(country="Ghana", city="Accra"), "public": True}
+        super().setUp()
+        self.rooms = [Room.objects.create(office=self.office, name=f"Room {i}") for i in range(3)]
+
+    def save(self, rooms, version):
+        return self.client.post(
+            "/api/workspace/rooms/save_layout/", {"rooms": rooms, "layout_version": version}, format="json",
+        )
+
+    def test_bulk_save_writes_only_changes_and_broadcasts_diff(self):
+        payload = [{"id": r.id, "x": r.x, "y": r.y, "width": r.width} for r in self.rooms]
+        payload[0]["x"] = 40
+        payload[2]["width"] = 300
+        with mock.patch("workspace.layout.broadcast_layout_diff") as broadcast:
+            with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(6):
+                # rooms, savepoint, version bump, bulk update, version read, release
+                response = self.save(payload, 0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["layout_version"], 1)
+        self.assertEqual(sorted(response.json()["updated"]), [self.rooms[0].id, self.rooms[2].id])
+        office_id, version, diff, _ = broadcast.call_args.args
+        self.assertEqual((office_id, version), (self.office.id, 1))
+        self.assertEqual(diff, {self.rooms[0].id: {"x": 40}, self.rooms[2].id: {"width": 300}})
+        self.rooms[0].refresh_from_db()
+        self.assertEqual(self.rooms[0].x, 40)
+
+    def test_stale_version_is_rejected(self):
+        self.assertEqual(self.save([{"id": self.rooms[0].id, "x": 10}], 0).status_code, 200)
+        stale = self.save([{"id": self.rooms[0].id, "x": 99}], 0)
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(stale.json()["layout_version"], 1)
+        self.rooms[0].refresh_from_db()
+        self.assertEqual(self.rooms[0].x, 10)
+
+    def test_malformed_room_ids_are_rejected(self):
+        for rooms in ([{"id": [self.rooms[0].id], "x": 5}], [{"id": {"a": 1}}], [{"id": True}], [{"x": 5}], ["1"]):
+            self.assertEqual(self.save(rooms, 0).status_code, 400, rooms)
+        self.assertEqual(Office.objects.get(pk=self.office.pk).layout_version, 0)
+
+
+class TestBookingEngine(TestCase):
+    def setUp(self):
+        from datetime import datetime, timezone as dt_timezone
+
+        _, self.office = make_office(public=True)
+        self.a = Room.objects.create(office=self.office, name="A", capacity=4)
+        self.b = Room.objects.create(office=self.office, name="B", capacity=10)
+        self.day = datetime(2030, 1, 7, 8, tzinfo=dt_timezone.utc)
+
+    def at(self, hours):
+        from datetime import timedelta
+
+        return self.day + timedelta(hours=hours)
+
+    def test_overlaps_are_rejected(self):
+        first = booking.book(self.a, self.at(1), self.at(2), visitor_name="Ama", visitor_email="ama@example.com")
+        with self.assertRaises(booking.BookingConflict):
+            booking.book(self.a, self.at(1.5), self.at(3), visitor_name="Kofi", visitor_email="kofi@example.com")
+        # Touching intervals are fine, as is another room.
+        booking.book(self.a, self.at(2), self.at(3), visitor_name="Kofi", visitor_email="kofi@example.com")
+        booking.book(self.b, self.at(1), self.at(2), visitor_name="Esi", visitor_email="esi@example.com")
+        with self.assertRaises(booking.BookingConflict):
+            booking.reschedule(first, self.at(2.5), self.at(3.5))
+        booking.reschedule(first, self.at(0), self.at(1))
+        with self.assertRaises(booking.BookingError):
+            booking.book(self.a, self.at(5), self.at(4), visitor_name="X", visitor_email="x@example.com")
+
+    def test_free_slots_for_all_rooms_in_one_query(self):
+        from datetime import timedelta
+
+        booking.book(self.a, self.at(1), self.at(2), visitor_name="Ama", visitor_email="ama@example.com")
+        booking.book(self.a, self.at(2.25), self.at(4), visitor_name="Ama", visitor_email="ama@example.com")
+        with self.assertNumQueries(1):
+            rooms = booking.free_slots(self.office, self.at(0), self.at(6), duration=timedelta(minutes=30))
+        self.assertEqual(rooms[0]["slots"], [(self.at(0), self.at(1)), (self.at(4), self.at(6))])
+        self.assertEqual(rooms[1]["slots"], [(self.at(0), self.at(6))])
+
+        suggestions = booking.suggest(self.office, self.at(1), self.at(2))
+        self.assertEqual([(room["name"], start) for room, start, _ in suggestions], [("B", self.at(1)), ("A", self.at(4))])
+
+        response = self.client.get(
+            f"/api/public/offices/{self.office.public_slug}/availability/",
+            {"start": self.at(0).isoformat(), "end": self.at(6).isoformat(), "capacity": 5},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["name"] for r in response.json()["rooms"]], ["B"])
+        bad = self.client.get(f"/api/public/offices/{self.office.public_slug}/availability/", {"start": "soon"})
+        self.assertEqual(bad.status_code, 400)
+        huge = self.client.get(
+            f"/api/public/offices/{self.office.public_slug}/availability/",
+            {"start": self.at(0).isoformat(), "end": self.at(6).isoformat(), "duration": "9" * 15},
+        )
+        self.assertEqual(huge.status_code, 400)
+
+
+class TestRoomAvailabilityBitmaps(TestCase):
+    def setUp(self):
+        from datetime import datetime, timezone as dt_timezone
+
+        _, self.office = make_office(public=True)
+        self.small = Room.objects.create(office=self.office, name="Small", capacity=2)
+        self.large = Room.objects.create(office=self.office, name="Large", capacity=8)
+        self.day = datetime(2030, 1, 7, tzinfo=dt_timezone.utc)
+
+    def at(self, hours):
+        from datetime import timedelta
+
+        return self.day + timedelta(hours=hours)
+
+    def book(self, room, start, end):
+        return booking.book(room, self.at(start), self.at(end), visitor_name="Ama", visitor_email="ama@example.com")
+
+    def busy(self, room, day=None):
+        row = RoomDayAvailability.objects.filter(room=room, day=(day or self.day).date()).first()
+        return availability.from_bytes(row.busy) if row else 0
+
+    def test_bitmaps_follow_bookings(self):
+        first = self.book(self.small, 14, 15.25)
+        self.assertEqual(self.busy(self.small), availability.span_mask(self.day.date(), self.at(14), self.at(15.25)))
+        self.assertEqual(bin(self.busy(self.small)).count("1"), 5)
+
+        # Moving across midnight clears the old day and marks both new days.
+        booking.reschedule(first, self.at(23.5), self.at(24.5))
+        self.assertEqual(bin(self.busy(self.small)).count("1"), 2)
+        self.assertEqual(bin(self.busy(self.small, self.at(24))).count("1"), 2)
+        first.delete()
+        self.assertFalse(RoomDayAvailability.objects.exists())
+
+    def test_first_free_room_and_next_slot(self):
+        from datetime import timedelta
+
+        self.book(self.small, 14, 15)
+        with self.assertNumQueries(2):  # bitmaps, recurring series
+            room = availability.first_free_room(self.office, self.at(14), self.at(17))
+        self.assertEqual(room["name"], "Large")
+        self.assertEqual(availability.first_free_room(self.office, self.at(15), self.at(17))["name"], "Small")
+        self.assertIsNone(availability.first_free_room(self.office, self.at(14), self.at(17), min_capacity=10))
+
+        self.book(self.large, 13, 16)
+        room, start, end = availability.next_free_slot(self.office, self.at(14.1), timedelta(minutes=30))
+        self.assertEqual((room["name"], start, end), ("Small", self.at(15), self.at(15.5)))
+
+        response = self.client.get(
+            f"/api/public/offices/{self.office.public_slug}/free-room/",
+            {"start": self.at(14).isoformat(), "end": self.at(17).isoformat(), "capacity": 1},
+        )
+        self.assertIsNone(response.json()["room"])
+        for params in ({"duration": "9" * 12}, {"duration": "1441"}, {"after": "9999-12-31T23:00:00+00:00"}):
+            response = self.client.get(
+                f"/api/public/offices/{self.office.public_slug}/free-room/",
+                {"after": self.at(14).isoformat(), **params},
+            )
+            self.assertEqual(response.status_code, 400, params)
+        rebuilt = availability.rebuild()
+        self.assertEqual(rebuilt, 2)
+        self.assertEqual(bin(self.busy(self.large)).count("1"), 12)
+
+
+class TestRecurringBookings(TestCase):
+    def setUp(self):
+        from datetime import datetime, timezone as dt_timezone
+
+        _, self.office = make_office(public=True)
+        self.room = Room.objects.create(office=self.office, name="Stand-up", capacity=6)
+        self.monday = datetime(2030, 1, 7, 9, tzinfo=dt_timezone.utc)
+        self.series = booking.book(
+            self.room, self.monday, self.monday + timedelta(minutes=30), recurrence="FREQ=WEEKLY;BYDAY=MO",
+            visitor_name="Team", visitor_email="team@example.com",
+        )
+
+    def week(self, n, minutes=0):
+        return self.monday + timedelta(weeks=n, minutes=minutes)
+
+    def test_series_is_stored_once_and_expanded_for_conflicts(self):
+        self.assertEqual(RoomBooking.objects.count(), 1)
+        self.assertIsNone(self.series.recurrence_until)
+        with self.assertRaises(booking.BookingConflict):
+            booking.book(self.room, self.week(20, 15), self.week(20, 45), visitor_name="X", visitor_email="x@example.com")
+        with self.assertRaises(booking.BookingConflict):
+            booking.book(
+                self.room, self.week(-1, 10), self.week(-1, 20), recurrence="FREQ=WEEKLY;COUNT=3",
+                visitor_name="X", visitor_email="x@example.com",
+            )
+
+        booking.cancel_occurrence(self.series, self.week(20))
+        booking.book(self.room, self.week(20, 15), self.week(20, 45), visitor_name="X", visitor_email="x@example.com")
+        booking.move_occurrence(self.series, self.week(21), self.week(21, 60), self.week(21, 90))
+        booking.book(self.room, self.week(21), self.week(21, 30), visitor_name="Y", visitor_email="y@example.com")
+        with self.assertRaises(booking.BookingError):
+            booking.cancel_occurrence(self.series, self.week(21, 5))
+
+        slots = booking.free_slots(self.office, self.week(21, -60), self.week(21, 120))[0]["slots"]
+        self.assertEqual(slots, [
+            (self.week(21, -60), self.week(21)), (self.week(21, 30), self.week(21, 60)),
+            (self.week(21, 90), self.week(21, 120)),
+        ])
+        self.assertEqual(availability.first_free_room(self.office, self.week(30), self.week(30, 10)), None)
+        self.assertEqual(availability.first_free_room(self.office, self.week(20), self.week(20, 10))["name"], "Stand-up")
+
+    def test_finite_series_ends(self):
+        weekly = booking.book(
+            self.room, self.week(0, 60), self.week(0, 90), recurrence="FREQ=WEEKLY;COUNT=3",
+            visitor_name="X", visitor_email="x@example.com",
+        )
+        self.assertEqual(weekly.recurrence_until, self.week(2, 90))
+        occurrences = list(booking.occurrences([self.room.pk], self.week(0), self.week(10)))
+        self.assertEqual(sum(o.series.pk == weekly.pk for o in occurrences), 3)
+        self.assertEqual(sum(o.series.pk == self.series.pk for o in occurrences), 10)
+
+    def test_runaway_rules_are_rejected(self):
+        def book(rule, minutes=30):
+            return booking.book(
+                self.room, self.week(0, 120), self.week(0, 120 + minutes), recurrence=rule,
+                visitor_name="X", visitor_email="x@example.com",
+            )
+
+        for rule, minutes in [
+            ("FREQ=HOURLY", 30),
+            ("FREQ=MINUTELY;COUNT=10", 1),
+            ("FREQ=DAILY;BYHOUR=0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23;BYMINUTE=0,30", 10),
+            ("FREQ=DAILY;BYHOUR=11,12", 90),  # each occurrence runs into the next
+        ]:
+            with self.assertRaises(booking.BookingError, msg=rule):
+                book(rule, minutes)
+        self.assertEqual(RoomBooking.objects.count(), 1)
+        series = book("FREQ=DAILY;BYHOUR=11,13;BYMINUTE=0;COUNT=4", 90)  # Mon 11:00 ... Tue 13:00
+        self.assertEqual(series.recurrence_until, self.week(0, 24 * 60 + 5 * 60 + 30))
+
+
+class TestNearbySearch(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = get_user_model().objects.create_user(username="owner")
+        self.accra = OfficeCity.objects.create(country="Ghana", city="Accra", lat=5.6037, lng=-0.187)
+        self.kumasi = OfficeCity.objects.create(country="Ghana", city="Kumasi", lat=6.6885, lng=-1.6244)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.osu = Office.objects.create(
+                name="Osu", owner=self.owner, city=self.accra, public=True, lat=5.556, lng=-0.1817,
+            )
+            Office.objects.create(name="Adum", owner=self.owner, city=self.kumasi, public=True)
+            Office.objects.create(name="Hidden", owner=self.owner, city=self.accra, lat=5.6, lng=-0.19)
+
+    def test_grid_index_matches_brute_force(self):
+        import random
+
+        rng = random.Random(7)
+        index = geo.GridIndex(cell=5)
+        points = {i: (rng.uniform(-89, 89), rng.uniform(-180, 179.9)) for i in range(400)}
+        for i, (lat, lng) in points.items():
+            index.put(i, lat, lng, i)
+        for lat, lng in [(0, 179), (60, -179.5), (-85, 20), (5.6, -0.2)]:
+            brute = sorted((geo.haversine_km(lat, lng, *p), i) for i, p in points.items())
+            self.assertEqual([i for _, i in index.nearest(lat, lng, 5)], [i for _, i in brute[:5]])
+            within = {i for d, i in brute if d <= 1500}
+            self.assertEqual({i for _, i in index.within(lat, lng, 1500)}, within)
+
+    def test_nearby_api_and_incremental_updates(self):
+        self.assertEqual((self.osu.lat, self.osu.lng), (5.556, -0.1817))
+        url = "/api/public/nearby/"
+        results = self.client.get(url, {"lat": 5.6, "lng": -0.2, "k": 5}).json()["results"]
+        self.assertEqual([r["name"] for r in results], ["Osu", "Adum"])
+        self.assertTrue(results[1]["approximate"])
+        within = self.client.get(url, {"lat": 5.6, "lng": -0.2, "radius_km": 50}).json()["results"]
+        self.assertEqual([r["name"] for r in within], ["Osu"])
+        cities = self.client.get(url, {"lat": 6.7, "lng": -1.6, "kind": "cities", "k": 1}).json()["results"]
+        self.assertEqual(cities[0]["city"], "Kumasi")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kumasi.lat, self.kumasi.lng = 5.61, -0.21
+            self.kumasi.save()
+        with self.assertNumQueries(0):
+            results = self.client.get(url, {"lat": 5.6, "lng": -0.2, "radius_km": 50}).json()["results"]
+        self.assertEqual([r["name"] for r in results], ["Adum", "Osu"])
+        self.assertEqual(self.client.get(url, {"lat": 91, "lng": 0}).status_code, 400)
+
+    def test_clearing_lat_lng_clears_the_location(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = client.patch(f"/api/workspace/offices/{self.osu.id}/", {"lat": None, "lng": None}, format="json")
+        self.assertEqual(res.status_code, 200, res.content)
+        self.osu.refresh_from_db()
+        self.assertEqual((self.osu.lat, self.osu.lng, self.osu.coordinates), (None, None, None))
+        results = self.client.get("/api/public/nearby/", {"lat": 5.6, "lng": -0.2, "radius_km": 50}).json()["results"]
+        self.assertTrue(results[0]["approximate"])  # now placed at its city
+
+
+class TestWorkerIds(OfficeAPITestCase):
+    office_fields = {"name": "Blue Bay"}
+
+    def setUp(self):
+        super().setUp()
+        self.room = Room.objects.create(office=self.office, name="Desk")
+
+    def test_ids_are_sequential_and_never_reused(self):
+        first = Worker.objects.create(office=self.office, name="Ama", created_by=self.owner)
+        second = Worker.objects.create(office=self.office, name="Kofi", created_by=self.owner)
+        self.assertEqual((first.worker_id, second.worker_id), (f"BB{self.office.id}-0001", f"BB{self.office.id}-0002"))
+        second.delete()
+        third = Worker.objects.create(office=self.office, name="Esi", created_by=self.owner)
+        self.assertEqual(third.worker_id, f"BB{self.office.id}-0003")
+
+    def test_counter_is_seeded_from_existing_ids(self):
+        Worker.objects.create(office=self.office, name="Ama", created_by=self.owner)
+        OfficeSequence.objects.all().delete()
+        self.assertEqual(
+            Worker.objects.create(office=self.office, name="Kofi", created_by=self.owner).worker_id,
+            f"BB{self.office.id}-0002",
+        )
+
+    def test_bulk_import_uses_a_fixed_number_of_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def run(count, offset):
+            rows = [{"name": f"Worker {offset + i}", "rooms": [self.room.id]} for i in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    "/api/workspace/workers/bulk_import/", {"office": self.office.id, "workers": rows}, format="json",
+                )
+            self.assertEqual(response.status_code, 201)
+            return response.json()["created"], len(queries)
+
+        run(1, 0)  # the first import also seeds the office's counter
+        small, small_queries = run(3, 1)
+        large, large_queries = run(100, 4)
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(small[0]["worker_id"], f"BB{self.office.id}-0002")
+        self.assertEqual(large[-1]["worker_id"], f"BB{self.office.id}-0104")
+        self.assertEqual(self.room.workers.count(), 104)
+
+    def test_bulk_import_rejects_rooms_of_other_offices(self):
+        other = Room.objects.create(office=Office.objects.create(name="Other", owner=self.owner), name="X")
+        response = self.client.post(
+            "/api/workspace/workers/bulk_import/",
+            {"office": self.office.id, "workers": [{"name": "Ama", "rooms": [other.id]}]}, format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.office.workers.exists())
+
+    def test_bulk_import_rejects_malformed_office(self):
+        for office in ("abc", True, None):
+            response = self.client.post(
+                "/api/workspace/workers/bulk_import/", {"office": office, "workers": [{"name": "Ama"}]}, format="json",
+            )
+            self.assertEqual(response.status_code, 400, office)
+
+
+class TestWorkerShifts(OfficeAPITestCase):
+    office_fields = {"public": True}
+
+    def setUp(self):
+        super().setUp()
+        room = Room.objects.create(office=self.office, name="Desk")
+        self.workers = [Worker.objects.create(office=self.office, name=f"W{i}", created_by=self.owner) for i in range(3)]
+        for worker in self.workers:
+            worker.rooms.add(room)
+
+    def clock(self, workers, action):
+        return self.client.post(
+            "/api/workspace/workers/clock/",
+            {"work_ids": [w.worker_id for w in workers], "action": action}, format="json",
+        )
+
+    def test_bulk_clock_in_sends_one_broadcast_per_office(self):
+        with mock.patch("workspace.shifts.broadcast_presence_many") as broadcast:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.clock(self.workers, "login")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["changed"]), 3)
+        broadcast.assert_called_once()
+        slug, action, payload = broadcast.call_args.args
+        self.assertEqual((slug, action, len(payload)), (self.office.public_slug, "login", 3))
+        self.assertEqual(WorkerPresence.objects.filter(is_presence=True).count(), 3)
+
+        # Clocking in again changes nothing and logs nothing.
+        again = self.clock(self.workers[:1], "login").json()
+        self.assertEqual((again["changed"], again["unchanged"]), ([], [self.workers[0].worker_id]))
+        self.assertEqual(WorkerPresenceEvent.objects.count(), 3)
+
+    def test_public_login_sets_presence(self):
+        response = self.client.post("/api/public/worker/login/", {"work_id": self.workers[0].worker_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["is_presence"])
+        self.assertEqual(self.client.post("/api/public/worker/login/", {"work_id": "nope"}).status_code, 404)
+
+    def test_shift_range_query(self):
+        from django.utils import timezone
+        from workspace import shifts
+
+        t0 = timezone.now().replace(microsecond=0) - timedelta(hours=10)
+        hour = timedelta(hours=1)
+        a, b, c = self.workers
+        shifts.clock([a.worker_id], "login", at=t0)                    # on all through the window
+        shifts.clock([b.worker_id], "login", at=t0 + 3 * hour)
+        shifts.clock([b.worker_id], "logout", at=t0 + 4 * hour)
+        shifts.clock([c.worker_id], "login", at=t0 + 6 * hour)         # after the window
+
+        with self.assertNumQueries(2):
+            on_shift = shifts.shifts(self.office, t0 + 2 * hour, t0 + 5 * hour)
+        self.assertEqual(
+            [(entry["worker"]["id"], entry["intervals"]) for entry in on_shift],
+            [(a.id, [(t0 + 2 * hour, t0 + 5 * hour)]), (b.id, [(t0 + 3 * hour, t0 + 4 * hour)])],
+        )
+        response = self.client.get("/api/workspace/workers/shifts/", {
+            "office": self.office.id,
+            "start": (t0 + 2 * hour).isoformat(),
+            "end": (t0 + 5 * hour).isoformat(),
+        })
+        self.assertEqual([w["id"] for w in response.json()["workers"]], [a.id, b.id])
+        self.assertEqual(self.client.get("/api/workspace/workers/shifts/", {"office": "abc"}).status_code, 400)
+
+
+class TestVisitorAccessTokens(TestCase):
+    def setUp(self):
+        cache.clear()
+        _, office = make_office(public=True)
+        self.free = Room.objects.create(office=office, name="Lounge")
+        self.gated = Room.objects.create(office=office, name="Board", access_policy="approval")
+
+    def submit(self, room):
+        response = self.client.post(
+            f"/api/public/rooms/submit_access/{room.id}/", {"data": {"name": "Ama"}}, content_type="application/json",
+        )
+        return response.json()["submission"]["id"], response.json()["token"]
+
+    def validate(self, token):
+        return self.client.post("/api/public/rooms/validate_access/", {"token": token}, content_type="application/json")
+
+    def test_valid_token_needs_no_database(self):
+        _, token = self.submit(self.free)
+        self.validate(token)  # builds the cached snapshot
+        with self.assertNumQueries(0):
+            response = self.validate(token)
+        self.assertEqual(response.json(), {"valid": True, "room": self.free.id})
+
+    def test_concurrent_rebuild_falls_back_to_database(self):
+        _, token = self.submit(self.free)
+        self.validate(token)
+        access_tokens.changed()
+        cache.add(access_tokens.REBUILD_LOCK_KEY, 1)  # another worker is rebuilding
+        response = self.validate(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("token", response.json())
+        self.assertNotEqual(cache.get(access_tokens.SNAPSHOT_KEY)[0], cache.get(access_tokens.VERSION_KEY))
+        cache.delete(access_tokens.REBUILD_LOCK_KEY)
+        self.validate(token)
+        self.assertEqual(cache.get(access_tokens.SNAPSHOT_KEY)[0], cache.get(access_tokens.VERSION_KEY))
+
+    def test_revocation_is_seen_after_commit(self):
+        submission_id, token = self.submit(self.free)
+        self.assertEqual(self.validate(token).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            submission = VisitorAccessSubmission.objects.get(pk=submission_id)
+            submission.revoked = True
+            submission.save()
+        self.assertEqual(self.validate(token).status_code, 404)
+
+    def test_approval_reissues_token(self):
+        submission_id, token = self.submit(self.gated)
+        self.assertEqual(self.validate(token).status_code, 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            VisitorAccessSubmission.objects.filter(pk=submission_id).update(approved=True)
+        access_tokens.changed()  # as approvals.decide does after commit
+        fresh = self.validate(token).json()["token"]
+        with self.assertNumQueries(0):
+            self.assertEqual(self.validate(fresh).json(), {"valid": True, "room": self.gated.id})
+
+    def test_withdrawn_approval_rejects_approved_token(self):
+        submission_id, token = self.submit(self.gated)
+        with self.captureOnCommitCallbacks(execute=True):
+            VisitorAccessSubmission.objects.filter(pk=submission_id).update(approved=True)
+        access_tokens.changed()
+        approved = self.validate(token).json()["token"]
+        self.assertEqual(self.validate(approved).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            VisitorAccessSubmission.objects.filter(pk=submission_id).update(approved=False)
+        access_tokens.changed()
+        self.assertEqual(self.validate(approved).status_code, 403)
+
+    def test_policy_change_rechecks_old_tokens(self):
+        _, token = self.submit(self.free)
+        self.assertEqual(self.validate(token).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.free.access_policy = "approval"
+            self.free.save()
+        self.assertEqual(self.validate(token).status_code, 403)
+
+    def test_deleted_submission_is_rejected(self):
+        submission_id, token = self.submit(self.free)
+        with self.captureOnCommitCallbacks(execute=True):
+            VisitorAccessSubmission.objects.filter(pk=submission_id).delete()
+        self.assertEqual(self.validate(token).status_code, 404)
+
+
+class TestOfficeExports(OfficeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.rooms = [Room.objects.create(office=self.office, name=f"Room {i}") for i in range(2)]
+        VisitorAccessSubmission.objects.bulk_create([
+            VisitorAccessSubmission(room=self.rooms[i % 2], name=f"Visitor {i}", data={"n": i}) for i in range(50)
+        ])
+
+    def export(self, **params):
+        return self.client.get(f"/api/workspace/offices/{self.office.id}/export/", params)
+
+    def test_csv_streams_filtered_rows(self):
+        import csv
+
+        response = self.export(room=self.rooms[0].id)
+        self.assertTrue(response.streaming)
+        lines = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(lines[0][:3], ["id", "room_id", "room_name"])
+        self.assertEqual(len(lines), 26)
+        self.assertEqual({line[1] for line in lines[1:]}, {str(self.rooms[0].id)})
+
+    def test_csv_neutralises_formulas(self):
+        import csv
+
+        VisitorAccessSubmission.objects.create(room=self.rooms[0], name="=HYPERLINK(\"x\")", phone="+233200000000")
+        response = self.export(room=self.rooms[0].id)
+        last = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))[-1]
+        self.assertEqual(last[4], "'=HYPERLINK(\"x\")")
+        self.assertEqual(last[6], "'+233200000000")
+
+    def test_gzip_jsonl(self):
+        import gzip
+        import json
+
+        response = self.export(type="jsonl", gzip="1", dataset="submissions")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        rows = [json.loads(line) for line in gzip.decompress(b"".join(response.streaming_content)).splitlines()]
+        self.assertEqual(len(rows), 50)
+        self.assertEqual(rows[0]["data"], {"n": 0})
+
+    async def test_asgi_streams_without_buffering(self):
+        import warnings
+        from django.test import AsyncClient
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")  # Django warns when it must buffer a sync iterator
+            response = await AsyncClient().get(
+                f"/api/workspace/offices/{self.office.id}/export/", {"type": "jsonl"},
+                headers={"Authorization": f"Bearer {AccessToken.for_user(self.owner)}"},
+            )
+            self.assertTrue(response.is_async)
+            body = b"".join([block async for block in response.streaming_content])
+        self.assertEqual(len(body.splitlines()), 50)
+
+    def test_members_cannot_export(self):
+        member = get_user_model().objects.create_user(username="member")
+        Membership.objects.create(user=member, office=self.office, role="MEMBER")
+        self.client.force_authenticate(member)
+        self.assertEqual(self.export().status_code, 403)
+
+
+class TestApprovalQueue(OfficeAPITestCase):
+    office_fields = {"public": True}
+
+    def setUp(self):
+        super().setUp()
+        self.room = Room.objects.create(office=self.office, name="Board", access_policy="approval")
+        self.url = f"/api/workspace/offices/{self.office.id}/approvals/"
+
+    def submit(self, name):
+        with mock.patch("workspace.views_public.notify_staff"):
+            return self.client.post(
+                f"/api/public/rooms/submit_access/{self.room.id}/", {"data": {"name": name}}, format="json",
+            ).json()
+
+    def test_pending_submission_is_pushed_and_listed(self):
+        with mock.patch("workspace.approvals._send") as send, self.captureOnCommitCallbacks(execute=True):
+            submitted = self.submit("Ama")
+        group, event = send.call_args.args
+        self.assertEqual(group, f"approvals_{self.office.id}")
+        self.assertEqual(event["payload"]["submission"]["id"], submitted["submission"]["id"])
+        self.assertEqual([s["name"] for s in self.client.get(self.url).json()["submissions"]], ["Ama"])
+
+    def test_bulk_approve_notifies_staff_and_visitors(self):
+        ids = [self.submit(name)["submission"]["id"] for name in ("Ama", "Kofi", "Esi")]
+        token = self.submit("Yaw")["token"]
+        with mock.patch("workspace.approvals._send") as send, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {"action": "approve", "ids": ids}, format="json")
+        self.assertEqual(sorted(response.json()["changed"]), sorted(ids))
+        groups = [call.args[0] for call in send.call_args_list]
+        self.assertEqual(groups, [f"approvals_{self.office.id}", f"public_office_{self.office.public_slug}"])
+        self.assertEqual([s["name"] for s in self.client.get(self.url).json()["submissions"]], ["Yaw"])
+
+        # Stateless token validation sees a bulk approval and a bulk revocation straight away.
+        yaw = self.client.get(self.url).json()["submissions"][0]["id"]
+        with mock.patch("workspace.approvals._send"), self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {"action": "approve", "ids": [yaw]}, format="json")
+        self.assertEqual(self.client.post("/api/public/rooms/validate_access/", {"token": token}, format="json").status_code, 200)
+        with mock.patch("workspace.approvals._send"), self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {"action": "revoke", "ids": [yaw]}, format="json")
+        self.assertEqual(self.client.post("/api/public/rooms/validate_access/", {"token": token}, format="json").status_code, 404)
+
+    def test_moved_room_takes_its_queue_along(self):
+        submission_id = self.submit("Ama")["submission"]["id"]
+        owner, other = make_office("other", name="Annex", public=True)
+        self.room.office = other
+        self.room.save()
+        self.assertEqual(self.client.get(self.url).json()["submissions"], [])
+        self.client.force_authenticate(owner)
+        url = f"/api/workspace/offices/{other.id}/approvals/"
+        self.assertEqual([s["id"] for s in self.client.get(url).json()["submissions"]], [submission_id])
+        with mock.patch("workspace.approvals._send"):
+            response = self.client.post(url, {"action": "approve", "ids": [submission_id]}, format="json")
+        self.assertEqual(response.json()["changed"], [submission_id])
+
+    def test_guests_cannot_decide(self):
+        guest = get_user_model().objects.create_user(username="guest")
+        Membership.objects.create(user=guest, office=self.office, role="GUEST")
+        self.client.force_authenticate(guest)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_consumer_sends_queue_on_connect(self):
+        from asgiref.sync import async_to_sync
+        from channels.testing import WebsocketCommunicator
+        from communications.consumers import ApprovalQueueConsumer
+
+        self.submit("Ama")
+
+        async def run():
+            communicator = WebsocketCommunicator(
+                ApprovalQueueConsumer.as_asgi(), f"/ws/approvals/office/{self.office.id}/",
+            )
+            communicator.scope["user"] = self.owner
+            communicator.scope["url_route"] = {"kwargs": {"office_id": str(self.office.id)}}
+            connected, _ = await communicator.connect()
+            message = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return connected, message
+
+        connected, message = async_to_sync(run)()
+        self.assertTrue(connected)
+        self.assertEqual(message["type"], "approval.queue")
+        self.assertEqual([s["name"] for s in message["submissions"]], ["Ama"])
+
+    def test_consumer_rejects_non_object_frames(self):
+        from asgiref.sync import async_to_sync
+        from channels.testing import WebsocketCommunicator
+        from communications.consumers import ApprovalQueueConsumer
+
+        async def run():
+            communicator = WebsocketCommunicator(
+                ApprovalQueueConsumer.as_asgi(), f"/ws/approvals/office/{self.office.id}/",
+            )
+            communicator.scope["user"] = self.owner
+            communicator.scope["url_route"] = {"kwargs": {"office_id": str(self.office.id)}}
+            await communicator.connect()
+            await communicator.receive_json_from()
+            await communicator.send_json_to(["approve", 1])
+            message = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return message
 
-# Create your tests here.
+        self.assertEqual(async_to_sync(run)()["type"], "approval.error")
@@ -3,8 +3,11 @@ from . import views_public
 
 urlpatterns = [
     path("cities/", views_public.PublicCitiesView.as_view(), name="public-cities"),
+    path("nearby/", views_public.PublicNearbyView.as_view(), name="public-nearby"),
     path("city/<slug:slug>/", views_public.PublicCityOfficesView.as_view(), name="public-city-offices"),
     path("offices/<slug:slug>/", views_public.PublicOfficeDetailView.as_view(), name="public-office-detail"),
+    path("offices/<slug:slug>/availability/", views_public.PublicOfficeAvailabilityView.as_view(), name="public-office-availability"),
+    path("offices/<slug:slug>/free-room/", views_public.PublicOfficeFreeRoomView.as_view(), name="public-office-free-room"),
     path("rooms/", views_public.PublicRoomView.as_view(), name="public-office-rooms"),
     path("workers/", views_public.PublicWorkerView.as_view(), name="public-workers"),
     path("worker/login/", views_public.WorkerPresenceViewSet.as_view({"post": "login"}), name="worker-presence-login"),
@@ -2,20 +2,19 @@
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 
-def broadcast_presence(worker, action):
+
+def broadcast_presence_many(office_slug, action, workers):
+    """One presence_update event for many workers of one office; ``worker`` is kept for single updates."""
     channel_layer = get_channel_layer()
     payload = {
         "type": "presence_update",
         "action": action,  # "login" or "logout"
-        "worker": {
-            "id": worker.id,
-            "work_id": worker.worker_id,
-            "name": worker.name,
-            "rooms": list(worker.rooms.values_list("id", flat=True)),
-        }
+        "workers": workers,
     }
+    if len(workers) == 1:
+        payload["worker"] = workers[0]
     async_to_sync(channel_layer.group_send)(
-        f"public_office_{worker.office.public_slug}",
+        f"public_office_{office_slug}",
         {
             "type": "presence.broadcast",
             "payload": payload,
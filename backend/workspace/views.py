@@ -5,6 +5,18 @@ from django.db.models import Q, Count
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from .models import OfficeCity
+from django.utils.dateparse import parse_datetime
+from django.core.handlers.asgi import ASGIRequest
+from . import approvals, exports, layout, shifts, workers
+
+
+def _office_id(value):
+    """An office id sent as an integer or a string of digits, else None."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
 
 
 class CityViewSet(viewsets.ReadOnlyModelViewSet):
@@ -33,6 +45,52 @@ class OfficeViewSet(viewsets.ModelViewSet):
         Room.objects.create(office=office, name="Lobby")
         Room.objects.create(office=office, name="Meeting Room")
 
+    @action(detail=True, methods=["get"])
+    def export(self, request, pk=None):
+        """
+        Stream ``?dataset=submissions|bookings`` as ``&type=csv|jsonl``
+        (``&gzip=1`` to compress), filtered by ``&room=&since=&until=``. Owners only.
+        """
+        office = self.get_object()
+        is_owner = office.owner_id == request.user.id or office.memberships.filter(
+            user=request.user, role="OWNER"
+        ).exists()
+        if not is_owner:
+            return Response({"error": "Only office owners can export data"}, status=status.HTTP_403_FORBIDDEN)
+        params = request.query_params
+        filters = {"room": params.get("room")}
+        for name in ("since", "until"):
+            value = params.get(name)
+            if value:
+                filters[name] = parse_datetime(value)
+                if filters[name] is None:
+                    return Response({"error": f"{name} must be an ISO datetime"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return exports.response(
+                office, params.get("dataset", "submissions"), params.get("type", "csv"),
+                compress=params.get("gzip") in ("1", "true"),
+                asynchronous=isinstance(request._request, ASGIRequest), **filters,
+            )
+        except (ValueError, exports.ExportError) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=["get", "post"], url_path="approvals")
+    def approval_queue(self, request, pk=None):
+        """
+        GET: pending visitor submissions of the office's approval rooms.
+        POST ``{"action": "approve" | "revoke", "ids": [...]}`` decides them in bulk.
+        """
+        office = self.get_object()
+        if not approvals.is_staff(request.user, office):
+            return Response({"error": "Only office staff can manage approvals"}, status=status.HTTP_403_FORBIDDEN)
+        if request.method == "GET":
+            return Response({"submissions": approvals.pending(office)})
+        try:
+            changed = approvals.decide(office, request.data.get("ids"), request.data.get("action"), request.user)
+        except approvals.ApprovalError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"changed": changed})
+
     @action(detail=True, methods=["post"])
     def toggle_public(self, request, pk=None):
         office = self.get_object()
@@ -55,22 +113,29 @@ class RoomViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["post"])
     def save_layout(self, request):
         rooms_data = request.data.get("rooms", [])
-        for r in rooms_data:
-            try:
-                room = Room.objects.get(
-                    id=r["id"], office__memberships__user=request.user
-                )
-                room.x = r.get("x", room.x)
-                room.y = r.get("y", room.y)
-                room.width = r.get("width", room.width)
-                room.height = r.get("height", room.height)
-                room.config = r.get("config", room.config)
-                room.access_policy = r.get("access_policy", room.access_policy)
-                room.access_config = r.get("access_config", room.access_config)
-                room.save()
-            except Room.DoesNotExist:
-                continue
-        return Response({"status": "layout saved"}, status=status.HTTP_200_OK)
+        expected = request.data.get("layout_version")
+        try:
+            expected = int(expected) if expected is not None else None
+        except (TypeError, ValueError):
+            return Response({"error": "layout_version must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(rooms_data, list):
+            return Response({"error": "rooms must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+        if not all(
+            isinstance(r, dict) and isinstance(r.get("id"), int) and not isinstance(r["id"], bool) for r in rooms_data
+        ):
+            return Response({"error": "rooms must be objects with an integer id"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            office, version, diff = layout.save_layout(request.user, rooms_data, expected)
+        except layout.LayoutConflict as exc:
+            return Response(
+                {"error": str(exc), "layout_version": exc.current_version}, status=status.HTTP_409_CONFLICT
+            )
+        except layout.LayoutError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {"status": "layout saved", "layout_version": version, "updated": list(diff)},
+            status=status.HTTP_200_OK,
+        )
 
 
 class PresenceViewSet(viewsets.ModelViewSet):
@@ -100,4 +165,57 @@ class WorkerViewSet(viewsets.ModelViewSet):
         return super().update(request, *args, **kwargs)
 
     def partial_update(self, request, *args, **kwargs):
-        return super().partial_update(request, *args, **kwargs)
\ No newline at end of file
+        return super().partial_update(request, *args, **kwargs)
+
+    @action(detail=False, methods=["post"])
+    def bulk_import(self, request):
+        office_id = _office_id(request.data.get("office"))
+        if office_id is None:
+            return Response({"error": "office must be an office id"}, status=status.HTTP_400_BAD_REQUEST)
+        office = Office.objects.filter(pk=office_id, memberships__user=request.user).first()
+        if office is None:
+            return Response({"error": "Office not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            created = workers.import_workers(office, request.data.get("workers"), request.user)
+        except workers.WorkerImportError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {"created": [{"id": w.pk, "worker_id": w.worker_id, "name": w.name} for w in created]},
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=False, methods=["post"])
+    def clock(self, request):
+        """Clock many workers in or out: ``{"work_ids": [...], "action": "login" | "logout"}``."""
+        try:
+            changed, unchanged, missing = shifts.clock(
+                request.data.get("work_ids"), request.data.get("action"), workers=self.get_queryset(),
+            )
+        except shifts.ShiftError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"changed": changed, "unchanged": unchanged, "missing": missing})
+
+    @action(detail=False, methods=["get"], url_path="shifts")
+    def shift_report(self, request):
+        """Who was on shift in ``?office=&start=&end=``, with their clock-in/out intervals."""
+        params = request.query_params
+        office_id = _office_id(params.get("office"))
+        if office_id is None:
+            return Response({"error": "office must be an office id"}, status=status.HTTP_400_BAD_REQUEST)
+        office = Office.objects.filter(pk=office_id, memberships__user=request.user).first()
+        if office is None:
+            return Response({"error": "Office not found"}, status=status.HTTP_404_NOT_FOUND)
+        start, end = parse_datetime(params.get("start") or ""), parse_datetime(params.get("end") or "")
+        try:
+            on_shift = shifts.shifts(office, start, end)
+        except (ValueError, shifts.ShiftError) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "office": office.id,
+            "start": start,
+            "end": end,
+            "workers": [
+                {**entry["worker"], "intervals": [{"start": a, "end": b} for a, b in entry["intervals"]]}
+                for entry in on_shift
+            ],
+        })
\ No newline at end of file
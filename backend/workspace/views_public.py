@@ -4,14 +4,20 @@ from rest_framework.generics import ListAPIView
 from rest_framework.permissions import AllowAny
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
+from django.http import Http404
+from django.db.models import Count, Q
 from rest_framework.decorators import action
 from rest_framework import viewsets, status
 from django.utils.timezone import now, timedelta
+from django.utils.dateparse import parse_datetime
+import json
 import jwt
 from django.conf import settings
 
-from .utils.presence import broadcast_presence 
+from . import access_tokens, approvals, availability, booking, geo, office_context, shifts
+from .public_cache import cached_render, cities_key, city_key, office_key, respond
 from .models import OfficeCity, Office, Room, Worker, WorkerPresence, VisitorAccessSubmission
+from communications.notifications import notify_staff, office_staff
 from .serializers import (
     CitySerializer, 
     PublicOfficeSerializer, 
@@ -22,16 +28,30 @@ from .serializers import (
 )
 
 SECRET = settings.SECRET_KEY  # or a dedicated JWT secret
-OFFICE_SESSION_KEY= "current_office_id"
+
+def public_offices():
+    return (
+        Office.objects.filter(public=True)
+        .select_related("city")
+        .prefetch_related("rooms")
+        .order_by("id")
+    )
+
 
 class PublicCitiesView(APIView):
+    """Cities with public offices; cached, see workspace.public_cache."""
     authentication_classes = []
     permission_classes = [AllowAny]
 
     def get(self, request):
-        cities = OfficeCity.objects.filter(offices__public=True).distinct()
-        serializer = CitySerializer(cities, many=True)
-        return Response(serializer.data)
+        def build():
+            cities = (
+                OfficeCity.objects.annotate(offices_count=Count("offices", filter=Q(offices__public=True)))
+                .filter(offices_count__gt=0)
+            )
+            return CitySerializer(cities, many=True).data
+
+        return respond(request, cached_render(cities_key(), build))
 
 
 class PublicCityOfficesView(APIView):
@@ -39,40 +59,140 @@ class PublicCityOfficesView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, slug):
-        city = get_object_or_404(OfficeCity, slug=slug)
-        offices = city.offices.filter(public=True)
-        serializer = PublicOfficeSerializer(offices, many=True)
-        return Response({"city": city.city, "offices": serializer.data})
+        def build():
+            city = OfficeCity.objects.filter(slug=slug).first()
+            if city is None:
+                return None
+            offices = public_offices().filter(city=city)
+            return {"city": city.city, "offices": PublicOfficeSerializer(offices, many=True).data}
+
+        entry = cached_render(city_key(slug), build)
+        if entry is None:
+            raise Http404
+        return respond(request, entry)
 
 
 class PublicOfficeDetailView(APIView):
     authentication_classes = []
     permission_classes = [AllowAny]
     
+    def get(self, request, slug):
+        def build():
+            office = public_offices().filter(public_slug=slug).first()
+            return PublicOfficeSerializer(office).data if office else None
+
+        entry = cached_render(office_key(slug), build)
+        if entry is None:
+            raise Http404
+        office_id = json.loads(entry[0])["id"]
+        return office_context.set_office_id(request, respond(request, entry), office_id)
+
+class PublicOfficeAvailabilityView(APIView):
+    """
+    Free slots of every room of a public office, e.g.
+    ``?start=2025-05-01T08:00:00Z&end=2025-05-01T18:00:00Z&duration=30`` (minutes).
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
     def get(self, request, slug):
         office = get_object_or_404(Office, public_slug=slug, public=True)
-        self.request.session[OFFICE_SESSION_KEY] = office.id
-        self.request.session.modified = True
-        self.request.session.save()
-        serializer = PublicOfficeSerializer(office)
-        return Response(serializer.data)
+        start = parse_datetime(request.query_params.get("start") or "")
+        end = parse_datetime(request.query_params.get("end") or "")
+        try:
+            minutes = int(request.query_params.get("duration") or 0)
+            if not 0 <= minutes <= booking.MAX_SEARCH_DAYS * 24 * 60:
+                raise ValueError(f"duration must be 0 to {booking.MAX_SEARCH_DAYS * 24 * 60} minutes")
+            duration = timedelta(minutes=minutes)
+            min_capacity = int(request.query_params.get("capacity") or 0)
+            rooms = booking.free_slots(office, start, end, duration=duration, min_capacity=min_capacity)
+        except (ValueError, booking.BookingError) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "office": office.id,
+            "start": start,
+            "end": end,
+            "rooms": [
+                {**entry["room"], "slots": [{"start": a, "end": b} for a, b in entry["slots"]]}
+                for entry in rooms
+            ],
+        })
+
+
+class PublicOfficeFreeRoomView(APIView):
+    """
+    First room free for the whole of ``?start=&end=`` (optionally ``&capacity=``),
+    or with ``?after=&duration=`` (minutes) the earliest free slot of any room.
+    Answered from the free/busy bitmaps, see workspace.availability.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, slug):
+        office = get_object_or_404(Office, public_slug=slug, public=True)
+        params = request.query_params
+        try:
+            capacity = int(params.get("capacity") or 0)
+            if params.get("after"):
+                after = parse_datetime(params["after"])
+                duration = timedelta(minutes=int(params.get("duration") or 30))
+                if after is None or timezone.is_naive(after) or duration <= timedelta(0):
+                    raise ValueError("after must be a datetime with a timezone and duration positive")
+                found = availability.next_free_slot(office, after, duration, min_capacity=capacity)
+                room, start, end = found or (None, None, None)
+            else:
+                start, end = parse_datetime(params.get("start") or ""), parse_datetime(params.get("end") or "")
+                booking.validate_interval(start, end)
+                if end - start > timedelta(days=booking.MAX_SEARCH_DAYS):
+                    raise booking.BookingError(f"Search at most {booking.MAX_SEARCH_DAYS} days at a time.")
+                room = availability.first_free_room(office, start, end, min_capacity=capacity)
+        except OverflowError:
+            return Response({"error": "Dates out of range."}, status=status.HTTP_400_BAD_REQUEST)
+        except (ValueError, booking.BookingError) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"office": office.id, "room": room, "start": start, "end": end})
+
+
+class PublicNearbyView(APIView):
+    """
+    Public offices (``?kind=offices``, default) or cities near ``?lat=&lng=``:
+    the ``k`` nearest, or with ``radius_km`` those within the radius.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        params = request.query_params
+        kind = params.get("kind", "offices")
+        point = geo.parse_point({"lat": params.get("lat"), "lng": params.get("lng")})
+        k, radius_km = 10, None
+        try:
+            k = min(int(params.get("k") or 10), 100)
+            radius_km = float(params["radius_km"]) if params.get("radius_km") else None
+        except ValueError:
+            point = None
+        if kind not in ("offices", "cities") or point is None or k < 1 or (radius_km is not None and radius_km <= 0):
+            return Response(
+                {"error": "lat and lng are required; kind is offices or cities; k and radius_km must be positive"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response({"kind": kind, "results": geo.nearby(kind, *point, k=k, radius_km=radius_km)})
+
 
 class GetCurrentOffice(APIView):
+    authentication_classes = []
     permission_classes = [AllowAny]
 
     def get(self, request):
-        office_id = self.request.session.get(OFFICE_SESSION_KEY)
-        print("➡️ Session contents:", self.request.session.get('current_office_id'))
+        office_id = office_context.get_office_id(request)
         if not office_id:
             return Response({"detail": "no office set"}, status=404)
-        office = Office.objects.filter(id=office_id, public=True).first()
+        office = public_offices().filter(id=office_id).first()
         if not office:
             return Response({"detail": "no office found"}, status=404)
         serializer = PublicOfficeSerializer(office)
         return Response({"id": office.id, "office": serializer.data})
 
-        
-
 
 class PublicRoomView(ListAPIView):
     serializer_class = RoomSerializer
@@ -106,7 +226,7 @@ class RoomAccessView(APIView):
             return Response({"access": "granted"})
 
         elif policy == "approval":
-            # TODO: hook up to receptionist dashboard
+            # Visitors ask through rooms/submit_access/; staff decide on the live approval queue.
             return Response({"access": "pending", "message": "Approval required"})
 
         elif policy == "locked":
@@ -136,35 +256,24 @@ class WorkerPresenceViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["post"], url_path="login")
     def login(self, request):
-        work_id = request.data.get("work_id")
-        if not work_id:
-            return Response({"error": "Work ID required"}, status=status.HTTP_400_BAD_REQUEST)
-
-        worker = Worker.objects.filter(worker_id=work_id).first()
-        if not worker:
-            return Response({"error": "Worker not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        presence, _ = WorkerPresence.objects.get_or_create(worker=worker)
-        presence.login()  # should set is_online + timestamp
-        broadcast_presence(worker, "login")
-        return Response(WorkerPresenceSerializer(presence).data)
+        return self._clock(request, "login")
 
     @action(detail=False, methods=["post"], url_path="logout")
     def logout(self, request):
-        print("LOGOUT PAYLOAD:", request.data)
+        return self._clock(request, "logout")
+
+    def _clock(self, request, action):
         work_id = request.data.get("work_id")
         if not work_id:
             return Response({"error": "Work ID required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        worker = Worker.objects.filter(worker_id=work_id).first()
-        if not worker:
+        _, _, missing = shifts.clock([work_id], action)
+        if missing:
             return Response({"error": "Worker not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        presence, _ = WorkerPresence.objects.get_or_create(worker=worker)
-        presence.logout()
-        broadcast_presence(worker, "logout")
+        presence = WorkerPresence.objects.select_related("worker").get(worker__worker_id=work_id)
         return Response(WorkerPresenceSerializer(presence).data)
- 
+
 
 class PublicRoomAccessSubmit(APIView):
     authentication_classes = []
@@ -227,19 +336,18 @@ class PublicRoomAccessSubmit(APIView):
             phone=phone,
         )
 
-        # Expiry logic: approval lasts longer, others shorter
         if access_policy == "approval":
-            exp = now() + timedelta(days=7)
-        else:  # free, form, unlock
-            exp = now() + timedelta(hours=24)
-
-        payload = {
-            "submission_id": submission.id,
-            "room_id": room.id,
-            "exp": int(exp.timestamp()),
-        }
+            approvals.announce(submission)
+            notify_staff(
+                office_staff(room.office),
+                "approval_pending",
+                f"{name or 'A visitor'} is waiting for access to {room.name}",
+                "\n".join(f"{k}: {v}" for k, v in data.items()),
+                office=room.office,
+                data={"submission_id": submission.id, "room_id": room.id},
+            )
 
-        token = jwt.encode(payload, settings.SECRET_KEY, algorithm="HS256")
+        token = access_tokens.issue(submission, room)
 
         serializer = VisitorAccessSubmissionSerializer(submission)
         return Response(
@@ -262,18 +370,9 @@ class PublicRoomAccessValidate(APIView):
             return Response({"error": "Token required"}, status=400)
 
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-            sub = VisitorAccessSubmission.objects.filter(
-                id=payload["submission_id"], room_id=payload["room_id"], revoked=False
-            ).first()
-            if not sub:
-                return Response({"error": "Submission not found"}, status=404)
-
-            # Check approval if required
-            if sub.room.access_policy == "approval" and not sub.approved:
-                return Response({"detail": "Waiting for approval"}, status=403)
-
-            return Response({"valid": True, "room": sub.room.id})
+            return Response(access_tokens.validate(token))
+        except access_tokens.AccessDenied as exc:
+            return Response({exc.key: str(exc)}, status=exc.status)
         except jwt.ExpiredSignatureError:
             return Response({"error": "Token expired"}, status=401)
         except Exception:
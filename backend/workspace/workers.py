@@ -0,0 +1,74 @@
+"""
+Bulk worker import.
+
+``import_workers`` reserves one block of worker numbers from the office's
+sequence (workspace.sequences) and creates every worker and room link with
+two bulk inserts, so importing hundreds of workers costs a fixed number of
+queries inside one transaction.
+"""
+from django.db import transaction
+from .models import Room, Worker
+from .sequences import WORKER_SEQUENCE, format_worker_id, reserve
+
+MAX_IMPORT = 1000
+
+
+class WorkerImportError(Exception):
+    pass
+
+
+def _clean(office, rows):
+    if not isinstance(rows, list) or not rows:
+        raise WorkerImportError("workers must be a non-empty list")
+    if len(rows) > MAX_IMPORT:
+        raise WorkerImportError(f"Import at most {MAX_IMPORT} workers at a time.")
+    cleaned = []
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise WorkerImportError(f"workers[{i}] must be an object")
+        name = str(row.get("name") or "").strip()
+        if not name:
+            raise WorkerImportError(f"workers[{i}] needs a name")
+        if len(name) > Worker._meta.get_field("name").max_length:
+            raise WorkerImportError(f"workers[{i}] name is too long")
+        rooms = row.get("rooms") or []
+        if not isinstance(rooms, list):
+            raise WorkerImportError(f"workers[{i}].rooms must be a list")
+        try:
+            rooms = {int(room) for room in rooms}
+        except (TypeError, ValueError):
+            raise WorkerImportError(f"workers[{i}].rooms must be room ids")
+        cleaned.append((name, rooms))
+
+    wanted = set().union(*(rooms for _, rooms in cleaned))
+    if wanted:
+        found = set(Room.objects.filter(office=office, pk__in=wanted).values_list("pk", flat=True))
+        if wanted - found:
+            raise WorkerImportError(f"Rooms not in this office: {sorted(wanted - found)}")
+    return cleaned
+
+
+def import_workers(office, rows, created_by):
+    """
+    Create workers for ``office`` from ``[{"name": ..., "rooms": [room ids]}]``
+    and return them with their worker IDs, in input order.
+    """
+    cleaned = _clean(office, rows)
+    with transaction.atomic():
+        first = reserve(office.pk, WORKER_SEQUENCE, len(cleaned))
+        workers = Worker.objects.bulk_create([
+            Worker(office=office, name=name, created_by=created_by, worker_id=format_worker_id(office, first + i))
+            for i, (name, _) in enumerate(cleaned)
+        ])
+        if not all(worker.pk for worker in workers):
+            # Backends that don't return ids from bulk inserts.
+            ids = dict(Worker.objects.filter(worker_id__in=[w.worker_id for w in workers]).values_list("worker_id", "pk"))
+            for worker in workers:
+                worker.pk = ids[worker.worker_id]
+        Through = Worker.rooms.through
+        Through.objects.bulk_create([
+            Through(worker_id=worker.pk, room_id=room_id)
+            for worker, (_, rooms) in zip(workers, cleaned)
+            for room_id in sorted(rooms)
+        ])
+    return workers
@@ -310,6 +310,13 @@ const loadRooms = async (officeId) => {
         if (ev.type === "worker.presence" && Array.isArray(ev.workers)) {
           setWorkerPresence(ev.workers);
         }
+
+        if (ev.type === "layout.diff" && Array.isArray(ev.rooms)) {
+          const changes = {};
+          ev.rooms.forEach((r) => { changes[r.id] = r; });
+          setRooms((prev) => prev.map((r) => (changes[r.id] ? { ...r, ...changes[r.id] } : r)));
+          setSelected((prev) => (prev ? { ...prev, layout_version: ev.layout_version } : prev));
+        }
       },
       onOpen: () => {
         try {
@@ -447,15 +454,21 @@ const loadRooms = async (officeId) => {
         };
       });
   
-      await api.post("/workspace/rooms/save_layout/", {
+      const res = await api.post("/workspace/rooms/save_layout/", {
         rooms: normalizedRooms,
+        layout_version: selected?.layout_version,
       });
+      setSelected((prev) => (prev ? { ...prev, layout_version: res.data.layout_version } : prev));
       alert("Layout saved!");
       setLayoutDirty(false);
       setEditMode(false);
       setSelectedRoomId(null);
     } catch (err) {
       console.error("Error saving layout:", err);
+      if (err.response?.status === 409) {
+        alert("Someone else changed this layout. Reload the office and try again.");
+        return;
+      }
       alert("Failed to save layout.");
     }
   };
@@ -80,6 +80,7 @@ export default function PublicOffice() {
           if (!token) continue;
           try {
             const res = await publicApi.post(`/rooms/validate_access/`, { token });
+            if (res.data.token) localStorage.setItem(`access_token_room_${room.id}`, res.data.token);
             if (res.data.valid) {
               setCurrentRoom(allRooms.find((r) => r.id === res.data.room));
               break; // auto enter first valid room
@@ -117,6 +118,34 @@ export default function PublicOffice() {
     }
   }, [visitors]);
 
+  // Approval decisions for this visitor's pending requests
+  useWebSocket(
+    slug ? `ws://localhost:8000/ws/public/offices/${slug}/presence/` : null,
+    {
+      onMessage: async (ev) => {
+        if (ev.type !== "access.decision" || !Array.isArray(ev.submissions)) return;
+        for (const { id, room } of ev.submissions) {
+          const tokenKey = `access_token_room_${room}`;
+          const submissionKey = `access_submission_room_${room}`;
+          const token = localStorage.getItem(tokenKey);
+          if (!token || localStorage.getItem(submissionKey) !== String(id)) continue;
+          try {
+            // The token comes back re-issued with the decision in it
+            const res = await publicApi.post(`/rooms/validate_access/`, { token });
+            if (res.data.token) localStorage.setItem(tokenKey, res.data.token);
+            if (ev.outcome === "approved") alert("Your access request was approved.");
+          } catch (err) {
+            // Keep the token through network errors and 5xx; only a refusal withdraws it
+            if (![401, 403, 404].includes(err.response?.status)) continue;
+            console.log("Access withdrawn for room", room);
+            localStorage.removeItem(tokenKey);
+            localStorage.removeItem(submissionKey);
+          }
+        }
+      },
+    }
+  );
+
   // Public Presence WebSocket
    
   //const publicWS = useWebSocket(
@@ -263,6 +292,7 @@ const handleRoomClick = async (room) => {
   if (token) {
     try {
       const res = await publicApi.post(`/rooms/validate_access/`, { token });
+      if (res.data.token) localStorage.setItem(tokenKey, res.data.token);
       if (res.data.valid) {
         setCurrentRoom(room);
         return; // ✅ Visitor already has access
@@ -344,10 +374,12 @@ const handleVisitorAccessSubmit = async (room, extraData = {}) => {
       }
 
       const res = await publicApi.post(`/rooms/submit_access/${room.id}/`, payload);
-      const { token } = res.data;
+      const { token, submission } = res.data;
 
       if (token) {
         localStorage.setItem(`access_token_room_${room.id}`, token);
+        // Matched against access.decision events on the public socket
+        localStorage.setItem(`access_submission_room_${room.id}`, String(submission.id));
       }
     
     setAccessModal(null);